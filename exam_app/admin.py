@@ -1,6 +1,7 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from .models import EvaluationType, Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
+from . import item_analysis
 
 
 @admin.register(EvaluationType)
@@ -29,7 +30,7 @@ class EvaluationAdmin(admin.ModelAdmin):
     raw_id_fields = ['type', 'mission', 'user']
     date_hierarchy = 'create_at'
     list_editable = ['is_active', 'can_back']
-    readonly_fields = ['id', 'create_at', 'questions_count_display']
+    readonly_fields = ['id', 'create_at', 'questions_count_display', 'item_analysis_display']
     ordering = ['-create_at', '-id']
     
     fieldsets = (
@@ -46,6 +47,10 @@ class EvaluationAdmin(admin.ModelAdmin):
             'fields': ('questions_count_display', 'create_at'),
             'classes': ('collapse',)
         }),
+        ('تحلیل سوالات', {
+            'fields': ('item_analysis_display',),
+            'classes': ('collapse',)
+        }),
     )
     
     def questions_count(self, obj):
@@ -69,6 +74,40 @@ class EvaluationAdmin(admin.ModelAdmin):
         return 'هنوز ذخیره نشده'
     questions_count_display.short_description = 'تعداد سوالات'
 
+    def item_analysis_display(self, obj):
+        """سختی، ضریب تمیز و گزینه‌های انحرافی ناکارآمد هر سوال"""
+        if not obj.pk:
+            return 'هنوز ذخیره نشده'
+        if not item_analysis.is_available():
+            return 'numpy نصب نشده است'
+        
+        analysis = item_analysis.get_item_analysis(obj.pk)
+        if not analysis['questions']:
+            return 'هنوز کوئیز تمام‌شده‌ای وجود ندارد'
+        
+        rows = format_html_join(
+            '',
+            '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            (
+                (
+                    q['question_id'],
+                    q['responses'],
+                    q['difficulty'] if q['difficulty'] is not None else '-',
+                    q['discrimination'] if q['discrimination'] is not None else '-',
+                    ', '.join(str(d['option']) for d in q.get('distractors', []) if not d['functional']) or '-',
+                )
+                for q in analysis['questions']
+            ),
+        )
+        return format_html(
+            '<p>{} کوئیز، {} پاسخ</p><table><tr><th>سوال</th><th>پاسخ‌ها</th><th>سختی</th>'
+            '<th>ضریب تمیز</th><th>گزینه‌های انحرافی ناکارآمد</th></tr>{}</table>',
+            analysis['quizzes'],
+            analysis['responses'],
+            rows,
+        )
+    item_analysis_display.short_description = 'تحلیل سوالات'
+
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
@@ -0,0 +1,331 @@
+"""
+Write-behind buffer for in-progress (autosaved) answers.
+
+Autosave requests only update a per-quiz entry in the Django cache; repeated
+writes to the same (quiz, question) pair are coalesced there. Buffered
+answers reach QuizResponse in batches:
+- by `manage.py flush_answer_buffer` (run from cron or with --loop), which
+  flushes every quiz whose oldest buffered answer is older than
+  EXAM_ANSWER_BUFFER_FLUSH_INTERVAL, with one bulk UPDATE for all of them;
+- inline, when a quiz's buffer gets older than EXAM_ANSWER_BUFFER_MAX_AGE or
+  holds more than EXAM_ANSWER_BUFFER_MAX_ENTRIES answers;
+- before grading (grading.grade_quiz), so a late flush never overwrites
+  graded answers.
+
+A flush reads the buffered entries and only removes them once the UPDATE
+has committed (answers rewritten in the meantime stay buffered); if the
+UPDATE fails or its transaction is rolled back the answers stay buffered for
+the next flush. The flushed quizzes are locked (SELECT ... FOR UPDATE) and
+re-checked to be unfinished, so a flush never writes over a quiz graded by a
+concurrent submit.
+
+The buffer is disabled by default. Only enable it with a cache shared by all
+workers (e.g. Redis/Memcached): with the default per-process LocMemCache a
+submit handled by another worker would not see the buffered answers.
+"""
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Quiz, QuizResponse
+
+
+BUFFER_KEY = "exam:answer_buffer:{quiz_id}"
+INDEX_KEY = "exam:answer_buffer:index"
+LOCK_KEY = "{key}:lock"
+METRIC_KEY = "exam:answer_buffer:metric:{name}"
+
+METRIC_NAMES = ("buffered_writes", "flushes", "flushed_answers", "last_lag_ms", "max_lag_ms")
+
+LOCK_TIMEOUT = 5
+LOCK_ATTEMPTS = 50
+LOCK_WAIT = 0.02
+
+
+def is_enabled():
+    return getattr(settings, "EXAM_ANSWER_BUFFER_ENABLED", False)
+
+
+def _cache():
+    return caches[getattr(settings, "EXAM_ANSWER_BUFFER_CACHE", "default")]
+
+
+def _max_age():
+    return getattr(settings, "EXAM_ANSWER_BUFFER_MAX_AGE", 30)
+
+
+def _max_entries():
+    return getattr(settings, "EXAM_ANSWER_BUFFER_MAX_ENTRIES", 200)
+
+
+def _flush_interval():
+    return getattr(settings, "EXAM_ANSWER_BUFFER_FLUSH_INTERVAL", 5)
+
+
+def _ttl():
+    return getattr(settings, "EXAM_ANSWER_BUFFER_TTL", 86400)
+
+
+@contextmanager
+def _locked(key):
+    """
+    Short cache lock around a read-modify-write of key.
+    Yields False when the lock could not be taken.
+    """
+    cache = _cache()
+    lock_key = LOCK_KEY.format(key=key)
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                yield True
+            finally:
+                cache.delete(lock_key)
+            return
+        time.sleep(LOCK_WAIT)
+    yield False
+
+
+def _incr(name, delta=1):
+    cache = _cache()
+    key = METRIC_KEY.format(name=name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def _record_lag(lag_ms):
+    cache = _cache()
+    cache.set(METRIC_KEY.format(name="last_lag_ms"), lag_ms, None)
+    max_key = METRIC_KEY.format(name="max_lag_ms")
+    if lag_ms > (cache.get(max_key) or 0):
+        cache.set(max_key, lag_ms, None)
+
+
+def metrics():
+    """Counters since the last reset_metrics(), plus the current backlog."""
+    cache = _cache()
+    values = cache.get_many([METRIC_KEY.format(name=name) for name in METRIC_NAMES])
+    data = {name: values.get(METRIC_KEY.format(name=name), 0) for name in METRIC_NAMES}
+
+    index = cache.get(INDEX_KEY) or {}
+    data["pending_quizzes"] = len(index)
+    data["oldest_pending_age_ms"] = int((time.time() - min(index.values())) * 1000) if index else 0
+    return data
+
+
+def reset_metrics():
+    _cache().delete_many([METRIC_KEY.format(name=name) for name in METRIC_NAMES])
+
+
+def _update_index(added=None, removed=()):
+    """
+    Track buffered quizzes for the timed flush. added maps quiz ids to the
+    time of their oldest buffered answer; removed quizzes are only dropped
+    while nothing is buffered for them. Returns False, without changing the
+    index, when its lock could not be taken.
+    """
+    cache = _cache()
+    with _locked(INDEX_KEY) as acquired:
+        if not acquired:
+            return False
+        index = cache.get(INDEX_KEY) or {}
+        if removed:
+            buffered = cache.get_many([BUFFER_KEY.format(quiz_id=quiz_id) for quiz_id in removed])
+            for quiz_id in removed:
+                if BUFFER_KEY.format(quiz_id=quiz_id) not in buffered:
+                    index.pop(quiz_id, None)
+        for quiz_id, since in (added or {}).items():
+            index.setdefault(quiz_id, since)
+        cache.set(INDEX_KEY, index, _ttl())
+    return True
+
+
+def buffer_answers(quiz_id, answers):
+    """
+    Buffer {"question_id", "answer", "done"} entries of one quiz.
+
+    Callers have already checked that the questions belong to the quiz.
+    Returns False (nothing buffered) when the buffer is disabled or busy;
+    the caller then writes to the database directly. Only the write that
+    starts a quiz's buffer takes the index lock.
+    """
+    if not is_enabled():
+        return False
+
+    cache = _cache()
+    key = BUFFER_KEY.format(quiz_id=quiz_id)
+    now = time.time()
+
+    with _locked(key) as acquired:
+        if not acquired:
+            return False
+
+        entry = cache.get(key)
+        is_new = entry is None
+        if is_new:
+            entry = {"since": now, "answers": {}}
+        for item in answers:
+            answer = item.get("answer")
+            answer = answer if answer != "" else None
+            done = item.get("done")
+            if done is None and item["question_id"] in entry["answers"]:
+                # done is only changed when sent, as with a direct write
+                done = entry["answers"][item["question_id"]][1]
+            entry["answers"][item["question_id"]] = (answer, done)
+        cache.set(key, entry, _ttl())
+        # Indexed after the entry is set, so a concurrent flush does not drop it from the index
+        if is_new and not _update_index(added={quiz_id: now}):
+            cache.delete(key)
+            return False
+
+    _incr("buffered_writes", len(answers))
+    if now - entry["since"] >= _max_age() or len(entry["answers"]) > _max_entries():
+        flush_quizzes([quiz_id])
+    return True
+
+
+def pending_answers(quiz_id):
+    """Buffered {question_id: (answer, done)} of a quiz, not yet in the database."""
+    if not is_enabled():
+        return {}
+    entry = _cache().get(BUFFER_KEY.format(quiz_id=quiz_id))
+    return dict(entry["answers"]) if entry else {}
+
+
+def apply_pending(quiz_id, responses):
+    """Overlay buffered answers on loaded QuizResponse rows (in memory only)."""
+    pending = pending_answers(quiz_id)
+    for response in responses:
+        if response.question_id in pending:
+            answer, done = pending[response.question_id]
+            response.answer = answer
+            if done is not None:
+                response.done = done
+    return responses
+
+
+def _peek(quiz_id):
+    """
+    (acquired, entry) of a quiz's buffer. acquired is False when its lock
+    could not be taken; the entry is then left for the next flush.
+    """
+    cache = _cache()
+    key = BUFFER_KEY.format(quiz_id=quiz_id)
+    with _locked(key) as acquired:
+        return acquired, cache.get(key) if acquired else None
+
+
+def _discard(quiz_id, entry):
+    """
+    Remove the flushed answers of entry from the quiz's buffer, keeping the
+    ones rewritten since. Returns True when nothing is left buffered.
+    """
+    cache = _cache()
+    key = BUFFER_KEY.format(quiz_id=quiz_id)
+    with _locked(key) as acquired:
+        if not acquired:
+            # Left buffered: the next flush writes the same answers again
+            return False
+        current = cache.get(key)
+        if current is None:
+            return True
+        answers = {
+            q_id: value for q_id, value in current["answers"].items() if entry["answers"].get(q_id) != value
+        }
+        if not answers:
+            cache.delete(key)
+            return True
+        cache.set(key, {"since": current["since"], "answers": answers}, _ttl())
+        return False
+
+
+def _discard_flushed(entries):
+    flushed = [quiz_id for quiz_id, entry in entries.items() if _discard(quiz_id, entry)]
+    _update_index(removed=flushed)
+
+
+def flush_quizzes(quiz_ids):
+    """
+    Write the buffered answers of quiz_ids with one query and one bulk UPDATE.
+    Returns (answers, busy): the number of QuizResponse rows written and the
+    ids of quizzes whose buffer was locked by a concurrent write and was not
+    flushed.
+    """
+    if not is_enabled():
+        return 0, []
+
+    now = time.time()
+    entries = {}
+    empty = []
+    busy = []
+    for quiz_id in quiz_ids:
+        acquired, entry = _peek(quiz_id)
+        if not acquired:
+            busy.append(quiz_id)
+        elif entry and entry["answers"]:
+            entries[quiz_id] = entry
+        else:
+            empty.append(quiz_id)
+    if empty:
+        _update_index(removed=empty)
+    if not entries:
+        return 0, busy
+
+    question_ids = {q_id for entry in entries.values() for q_id in entry["answers"]}
+    to_update = []
+    with transaction.atomic():
+        # Answers of quizzes finished in the meantime are dropped, not written over the graded ones
+        open_quiz_ids = list(
+            Quiz.objects.select_for_update()
+            .filter(id__in=entries.keys(), end_at__isnull=True)
+            .values_list("id", flat=True)
+        )
+        for response in QuizResponse.objects.filter(
+            quiz_id__in=open_quiz_ids, question_id__in=question_ids
+        ).only("id", "quiz_id", "question_id", "answer", "done"):
+            buffered = entries[response.quiz_id]["answers"].get(response.question_id)
+            if buffered is None:
+                continue
+            response.answer, done = buffered
+            if done is not None:
+                response.done = done
+            to_update.append(response)
+
+        if to_update:
+            QuizResponse.objects.bulk_update(to_update, ["answer", "done"], batch_size=500)
+
+        transaction.on_commit(lambda: _discard_flushed(entries))
+
+    _incr("flushes")
+    _incr("flushed_answers", len(to_update))
+    _record_lag(int((now - min(entry["since"] for entry in entries.values())) * 1000))
+    return len(to_update), busy
+
+
+def flush_quiz(quiz_id):
+    """Flush one quiz; returns the number of QuizResponse rows written."""
+    return flush_quizzes([quiz_id])[0]
+
+
+def flush_due(max_age=None):
+    """
+    Flush every quiz whose oldest buffered answer is at least max_age seconds
+    old (EXAM_ANSWER_BUFFER_FLUSH_INTERVAL by default; 0 flushes everything).
+    Returns (quizzes, answers) flushed.
+    """
+    if not is_enabled():
+        return 0, 0
+
+    max_age = _flush_interval() if max_age is None else max_age
+    now = time.time()
+    index = _cache().get(INDEX_KEY) or {}
+    due = [quiz_id for quiz_id, since in index.items() if now - since >= max_age]
+    if not due:
+        return 0, 0
+    answers, busy = flush_quizzes(due)
+    return len(due) - len(busy), answers
@@ -0,0 +1,196 @@
+"""
+Versioned answer-key cache used by grading.
+
+An AnswerKey holds (type, correct, weight) of every question of one
+Evaluation in parallel arrays sorted by question id. Keys are kept in a
+process-local LRU and, optionally, in the Django cache so other workers can
+reuse them.
+
+Every evaluation has a version stamp in the Django cache. Signals on
+Question and Evaluation replace the stamp on save/delete (see signals.py),
+and a cached key is only used while its stamp matches. Stamps only reach
+other workers through a shared cache backend (CACHE_URL): with the default
+per-process cache a bump is seen by the process that made it, and other
+processes keep their key for up to EXAM_ANSWER_KEY_CACHE_TTL seconds.
+Queryset.update() and raw SQL bypass signals; the same TTL bounds how long
+such a change can go unnoticed.
+"""
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Question
+
+
+VERSION_KEY = "exam:answer_key_version:{evaluation_id}"
+SHARED_KEY = "exam:answer_key:{evaluation_id}"
+
+# Stored in the corrects array when Question.correct is NULL
+NO_CORRECT = -1
+
+# Same attribute names as Question, so grading.score_answer accepts both
+KeyEntry = namedtuple("KeyEntry", ["id", "type", "correct", "weight"])
+
+
+class AnswerKey:
+    """Compact, array-backed answer key of one evaluation."""
+
+    __slots__ = ("evaluation_id", "version", "question_ids", "types", "corrects", "weights")
+
+    def __init__(self, evaluation_id, version, rows):
+        """rows: (id, type, correct, weight) tuples ordered by id."""
+        self.evaluation_id = evaluation_id
+        self.version = version
+        self.question_ids = array("q")
+        self.types = array("b")
+        self.corrects = array("q")
+        self.weights = array("d")
+        for question_id, q_type, correct, weight in rows:
+            self.question_ids.append(question_id)
+            self.types.append(1 if q_type else 0)
+            self.corrects.append(NO_CORRECT if correct is None else correct)
+            self.weights.append(weight or 0.0)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __contains__(self, question_id):
+        return self._index(question_id) is not None
+
+    def _index(self, question_id):
+        i = bisect_left(self.question_ids, question_id)
+        if i < len(self.question_ids) and self.question_ids[i] == question_id:
+            return i
+        return None
+
+    def get(self, question_id):
+        """KeyEntry for question_id, or None if it is not in this evaluation."""
+        i = self._index(question_id)
+        if i is None:
+            return None
+        correct = self.corrects[i]
+        return KeyEntry(
+            id=question_id,
+            type=bool(self.types[i]),
+            correct=None if correct == NO_CORRECT else correct,
+            # weight 0/NULL is scored as 1.0 by grading, so 0.0 is a safe stand-in for NULL
+            weight=self.weights[i],
+        )
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class _LRU:
+    """Thread-safe LRU of (expires_at, AnswerKey) entries."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, evaluation_id):
+        with self._lock:
+            entry = self._data.get(evaluation_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[evaluation_id]
+                return None
+            self._data.move_to_end(evaluation_id)
+            return entry[1]
+
+    def set(self, evaluation_id, answer_key, ttl, max_size):
+        with self._lock:
+            self._data[evaluation_id] = (time.monotonic() + ttl, answer_key)
+            self._data.move_to_end(evaluation_id)
+            while len(self._data) > max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, evaluation_id):
+        with self._lock:
+            self._data.pop(evaluation_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_keys = _LRU()
+
+
+def _cache_size():
+    return getattr(settings, "EXAM_ANSWER_KEY_CACHE_SIZE", 256)
+
+
+def _cache_ttl():
+    return getattr(settings, "EXAM_ANSWER_KEY_CACHE_TTL", 300)
+
+
+def _shared_enabled():
+    return getattr(settings, "EXAM_ANSWER_KEY_SHARED_CACHE", False)
+
+
+def get_version(evaluation_id):
+    """Current version stamp of the evaluation's answer key."""
+    key = VERSION_KEY.format(evaluation_id=evaluation_id)
+    version = cache.get(key)
+    if version is None:
+        # Random stamps (not counters) so an evicted stamp never matches an old key
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(evaluation_id):
+    """Invalidate every cached answer key of the evaluation."""
+    if evaluation_id is None:
+        return
+    cache.set(VERSION_KEY.format(evaluation_id=evaluation_id), uuid.uuid4().hex, None)
+    _local_keys.discard(evaluation_id)
+
+
+def build_answer_key(evaluation_id, version=None):
+    """Load the answer key of an evaluation from the database (one query)."""
+    rows = (
+        Question.objects.filter(evaluation_id=evaluation_id)
+        .order_by("id")
+        .values_list("id", "type", "correct", "weight")
+    )
+    return AnswerKey(evaluation_id, version, rows)
+
+
+def get_answer_key(evaluation_id):
+    """
+    Answer key of an evaluation: process-local LRU first, then the shared
+    cache (if EXAM_ANSWER_KEY_SHARED_CACHE is on), then the database.
+    """
+    version = get_version(evaluation_id)
+
+    answer_key = _local_keys.get(evaluation_id)
+    if answer_key is not None and answer_key.version == version:
+        return answer_key
+
+    shared_key = SHARED_KEY.format(evaluation_id=evaluation_id)
+    answer_key = cache.get(shared_key) if _shared_enabled() else None
+    if answer_key is None or answer_key.version != version:
+        answer_key = build_answer_key(evaluation_id, version)
+        if _shared_enabled():
+            cache.set(shared_key, answer_key, _cache_ttl())
+
+    _local_keys.set(evaluation_id, answer_key, _cache_ttl(), _cache_size())
+    return answer_key
+
+
+def clear_local_cache():
+    """Drop all process-local answer keys (used by tests)."""
+    _local_keys.clear()
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ExamAppConfig(AppConfig):
     name = 'exam_app'
+
+    def ready(self):
+        # ثبت signal های نامعتبرسازی کش کلید پاسخ
+        from . import signals  # noqa: F401
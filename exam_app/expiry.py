@@ -0,0 +1,178 @@
+"""
+Server-side enforcement of Evaluation.duration (minutes).
+
+A quiz still open EXAM_EXPIRY_GRACE seconds after start_at + duration is
+expired: `manage.py expire_quizzes` submits it with the answers saved so
+far. Candidates are found through the partial index on quiz (startat,
+state) WHERE endat IS NULL (exam_app migration 0006), oldest first.
+
+Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED in its own
+short transaction, so the sweeper never blocks a student's own submit for
+long and several sweepers can share a backlog. A batch is graded with the
+normal scoring logic (answer key + grading.score_answer / final_state) and
+written in bulk: responses, quizzes, report cards, mission results, result
+summaries and the quizzes' open ExamLaunch rows, which are finalized like
+LaunchSubmitView does. Evaluations without a duration never expire.
+Quizzes whose answer buffer is locked by a concurrent autosave are skipped
+and expired by a later sweep, so no buffered answer is graded as missing.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, Q
+from django.utils import timezone
+
+from kebrit_api.models import ExamLaunch
+from .answer_buffer import flush_quizzes
+from .answer_keys import get_answer_key
+from .grading import final_state, score_answer
+from .grading_queue import enqueue, rules_configured, write_mission_results, write_report_cards
+from .item_analysis import invalidate as invalidate_item_analysis
+from .models import Quiz, QuizResponse
+from .quiz_assembly import ACTIVE_STATES
+from .result_summaries import build_summary, save_summaries
+
+
+def _grace():
+    return timedelta(seconds=getattr(settings, "EXAM_EXPIRY_GRACE", 60))
+
+
+@dataclass
+class SweepStats:
+    batches: int = 0
+    quizzes: int = 0
+    seconds: float = 0.0
+    backlog: int = 0
+
+    @property
+    def rate(self):
+        """Quizzes expired per second."""
+        return self.quizzes / self.seconds if self.seconds else 0.0
+
+
+def expired_quizzes(now=None):
+    """Open quizzes past their deadline, oldest first, annotated with `deadline`."""
+    now = now or timezone.now()
+    deadline = ExpressionWrapper(
+        F("start_at") + F("evaluation__duration") * timedelta(minutes=1), output_field=DateTimeField()
+    )
+    return (
+        Quiz.objects.filter(Q(state__in=ACTIVE_STATES) | Q(state__isnull=True), end_at__isnull=True)
+        # Range on the indexed column first; no evaluation lasts less than a minute
+        .filter(start_at__lt=now - _grace() - timedelta(minutes=1), evaluation__duration__gt=0)
+        .annotate(deadline=deadline)
+        .filter(deadline__lt=now - _grace())
+        .order_by("start_at")
+    )
+
+
+def _grade(quiz, responses):
+    """Score stored answers of one quiz in memory. Returns (percentage, descriptive answers)."""
+    answer_key = get_answer_key(quiz.evaluation_id)
+    multiple_choice = correct = descriptive = 0
+    total_score = 0.0
+    for response in responses:
+        entry = answer_key.get(response.question_id)
+        if entry is None:
+            continue
+        response.answer, response.score, is_correct = score_answer(entry, response.answer)
+        total_score += response.score
+        if entry.type:
+            multiple_choice += 1
+            if is_correct is True:
+                correct += 1
+        elif response.answer:
+            descriptive += 1
+
+    # فقط سوالات چندگزینه‌ای در محاسبه درصد در نظر گرفته می‌شوند (مانند grade_quiz)
+    percentage = (correct / multiple_choice * 100) if multiple_choice else 0
+    accept_score = quiz.evaluation.accept_score
+    quiz.end_at = quiz.deadline
+    quiz.score = total_score
+    quiz.is_accept = percentage >= accept_score if accept_score else False
+    quiz.state = final_state(quiz)
+    return percentage, descriptive
+
+
+def expire_batch(batch_size=100, now=None):
+    """Auto-submit up to batch_size expired quizzes. Returns the number submitted."""
+    with transaction.atomic():
+        quizzes = list(
+            expired_quizzes(now)
+            .select_related("evaluation")
+            .select_for_update(skip_locked=True, of=("self",))[:batch_size]
+        )
+        if not quizzes:
+            return 0
+        quiz_ids = [quiz.id for quiz in quizzes]
+
+        # Autosaved answers still in the write-behind buffer count as saved; a quiz
+        # whose buffer is being written to is left for the next sweep
+        _, busy = flush_quizzes(quiz_ids)
+        if busy:
+            quizzes = [quiz for quiz in quizzes if quiz.id not in busy]
+            if not quizzes:
+                return 0
+            quiz_ids = [quiz.id for quiz in quizzes]
+
+        responses_by_quiz = {}
+        for response in QuizResponse.objects.filter(quiz_id__in=quiz_ids).select_related("question").order_by("position", "id"):
+            responses_by_quiz.setdefault(response.quiz_id, []).append(response)
+
+        percentages = {}
+        descriptive = []
+        for quiz in quizzes:
+            percentage, descriptive_answers = _grade(quiz, responses_by_quiz.get(quiz.id, []))
+            percentages[quiz.id] = round(percentage, 2)
+            if descriptive_answers:
+                descriptive.append(quiz.id)
+
+        responses = [r for quiz_responses in responses_by_quiz.values() for r in quiz_responses]
+        QuizResponse.objects.bulk_update(responses, ["answer", "score"], batch_size=500)
+        Quiz.objects.bulk_update(quizzes, ["end_at", "score", "is_accept", "state"], batch_size=500)
+        write_report_cards(quizzes, percentages)
+        write_mission_results([quiz for quiz in quizzes if quiz.is_accept and quiz.evaluation.mission_id])
+        save_summaries(
+            [build_summary(quiz, responses_by_quiz.get(quiz.id, []), percentages[quiz.id]) for quiz in quizzes]
+        )
+        _finalize_launches(quizzes, percentages)
+        if descriptive and rules_configured():
+            enqueue(descriptive, apply_rules=True)
+
+    for evaluation_id in {quiz.evaluation_id for quiz in quizzes}:
+        invalidate_item_analysis(evaluation_id)
+    return len(quizzes)
+
+
+def _finalize_launches(quizzes, percentages):
+    """Cache the result on the quizzes' open launches, like LaunchSubmitView."""
+    quizzes_by_id = {quiz.id: quiz for quiz in quizzes}
+    launches = list(ExamLaunch.objects.filter(quiz_id__in=list(quizzes_by_id), completed_at__isnull=True))
+    for launch in launches:
+        quiz = quizzes_by_id[launch.quiz_id]
+        launch.completed_at = quiz.end_at
+        launch.percentage = percentages[quiz.id]
+        launch.total_score = round(quiz.score, 2)
+        launch.is_accept = bool(quiz.is_accept)
+        launch.state = quiz.state
+    ExamLaunch.objects.bulk_update(
+        launches, ["completed_at", "percentage", "total_score", "is_accept", "state"], batch_size=500
+    )
+
+
+def sweep(batch_size=100, max_batches=None, now=None):
+    """Expire batches until none is left (or max_batches). Returns SweepStats."""
+    stats = SweepStats()
+    started = time.monotonic()
+    while max_batches is None or stats.batches < max_batches:
+        expired = expire_batch(batch_size, now)
+        if not expired:
+            break
+        stats.batches += 1
+        stats.quizzes += expired
+    stats.seconds = time.monotonic() - started
+    stats.backlog = expired_quizzes(now).count()
+    return stats
@@ -0,0 +1,211 @@
+"""
+Batched grading shared by QuizViewSet.submit_quiz and LaunchSubmitView.
+
+A submit costs a fixed number of queries regardless of the number of
+questions: one for the quiz's QuizResponse rows (only the columns grading
+writes or returns), one bulk UPDATE for the scored responses, one for the
+questions shown in the result payload, plus the Quiz,
+QuizResponseEvaluation, MissionResult and result summary
+(result_summaries.py) writes. Scoring (type, correct answer, weight) reads
+the cached answer key (answer_keys.py), which only hits the database on a
+miss.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from roadmap_app.models import MissionResult
+from .answer_buffer import flush_quiz
+from .answer_keys import get_answer_key
+from .models import Question, QuizResponse, QuizResponseEvaluation
+from .result_summaries import store_summary
+from .serializers import QuizResponseSerializer
+
+
+# QuizResponse columns loaded for grading; all of them are in the result payload
+RESPONSE_FIELDS = ("id", "quiz", "question", "answer", "score", "done", "position")
+
+
+class GradingError(Exception):
+    """
+    The submitted answers cannot be graded.
+
+    code is "count_mismatch" when the number of submitted answers differs
+    from the number of questions in the quiz.
+    """
+
+    def __init__(self, code, submitted=0, expected=0):
+        super().__init__(code)
+        self.code = code
+        self.submitted = submitted
+        self.expected = expected
+
+
+@dataclass
+class GradingResult:
+    quiz: object
+    total_questions: int = 0
+    correct_count: int = 0
+    wrong_count: int = 0
+    percentage: float = 0.0
+    total_score: float = 0.0
+    is_accept: bool = False
+    # QuizResponse rows with .question attached (no re-fetch needed)
+    responses: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            "quiz_id": self.quiz.id,
+            "total_questions": self.total_questions,
+            "correct_answers": self.correct_count,
+            "wrong_answers": self.wrong_count,
+            "percentage": round(self.percentage, 2),
+            "total_score": round(self.total_score, 2),
+            "is_accept": bool(self.is_accept),
+            "responses": QuizResponseSerializer(self.responses, many=True).data,
+        }
+
+
+def score_answer(question, student_answer):
+    """
+    Score one answer. question is a Question or an answer_keys.KeyEntry.
+
+    Returns (stored_answer, score, is_correct). is_correct is None when the
+    answer does not count as right or wrong (descriptive or unanswered).
+    """
+    if not question.type:
+        # سوال تشریحی: نمره بعداً توسط مدرس تعیین می‌شود
+        return (student_answer if student_answer else None), 0.0, None
+
+    try:
+        answer_int = int(student_answer) if student_answer is not None and student_answer != "" else None
+    except (ValueError, TypeError):
+        answer_int = None
+
+    stored_answer = str(answer_int) if answer_int is not None else None
+    if answer_int is None or question.correct is None:
+        return stored_answer, 0.0, None
+    if answer_int == question.correct:
+        return stored_answer, (question.weight if question.weight else 1.0), True
+    return stored_answer, 0.0, False
+
+
+def attach_questions(responses):
+    """Set .question of responses (for the result payload) with one query."""
+    questions = Question.objects.in_bulk({r.question_id for r in responses})
+    for response in responses:
+        question = questions.get(response.question_id)
+        if question is not None:
+            response.question = question
+    return responses
+
+
+def final_state(quiz):
+    """Quiz state after submit, based on the evaluation type."""
+    type_id = quiz.evaluation.type_id
+    if type_id in (1, 3):
+        return "completed"
+    if type_id in (2, 4):
+        return "pending"
+    return quiz.state or "completed"
+
+
+def grade_quiz(quiz, responses_data):
+    """
+    Grade and finalize quiz with the submitted answers.
+
+    responses_data is a list of {"question_id", "answer", "done"} dicts as
+    validated by QuizSubmitSerializer / LaunchSubmitSerializer. quiz must
+    have its evaluation loaded. Raises GradingError before writing any
+    graded data.
+    """
+    # Autosaved answers still in the write-behind buffer must land first,
+    # otherwise a later timed flush would overwrite the graded rows.
+    flush_quiz(quiz.id)
+
+    existing = list(QuizResponse.objects.filter(quiz=quiz).only(*RESPONSE_FIELDS).order_by("position", "id"))
+    responses_by_question = {r.question_id: r for r in existing}
+
+    if len(responses_data) != len(responses_by_question):
+        raise GradingError("count_mismatch", submitted=len(responses_data), expected=len(responses_by_question))
+
+    submitted = {r["question_id"]: r for r in responses_data}
+    answer_key = get_answer_key(quiz.evaluation_id)
+
+    result = GradingResult(quiz=quiz, total_questions=len(responses_by_question))
+    multiple_choice_count = 0
+    descriptive_count = 0
+    to_update = []
+    to_create = []
+
+    for question_id, response_data in submitted.items():
+        question = answer_key.get(question_id)
+        if question is None:
+            continue
+
+        stored_answer, score, is_correct = score_answer(question, response_data.get("answer"))
+        if question.type:
+            multiple_choice_count += 1
+        else:
+            descriptive_count += 1
+        if is_correct is True:
+            result.correct_count += 1
+        elif is_correct is False:
+            result.wrong_count += 1
+
+        quiz_response = responses_by_question.get(question_id)
+        if quiz_response is None:
+            quiz_response = QuizResponse(quiz=quiz, question_id=question_id)
+            to_create.append(quiz_response)
+        else:
+            to_update.append(quiz_response)
+
+        quiz_response.answer = stored_answer
+        quiz_response.score = score
+        quiz_response.done = response_data.get("done", "completed")
+        result.total_score += score
+
+    # فقط سوالات چندگزینه‌ای در محاسبه درصد در نظر گرفته می‌شوند
+    result.percentage = (result.correct_count / multiple_choice_count * 100) if multiple_choice_count > 0 else 0
+    evaluation = quiz.evaluation
+    result.is_accept = result.percentage >= evaluation.accept_score if evaluation.accept_score else False
+
+    with transaction.atomic():
+        if to_update:
+            QuizResponse.objects.bulk_update(to_update, ["answer", "score", "done"])
+        if to_create:
+            QuizResponse.objects.bulk_create(to_create)
+
+        quiz.end_at = timezone.now()
+        quiz.score = result.total_score
+        quiz.is_accept = result.is_accept
+        quiz.state = final_state(quiz)
+        quiz.save(update_fields=["end_at", "score", "is_accept", "state"])
+
+        # کارنامه کلی آزمون (score به صورت percentage)
+        QuizResponseEvaluation.objects.update_or_create(
+            user_id=quiz.user_id,
+            quiz=quiz,
+            defaults={"score": round(result.percentage, 2)},
+        )
+
+        result.responses = attach_questions(existing + to_create)
+        store_summary(quiz, result.responses, round(result.percentage, 2))
+
+        if result.is_accept and evaluation.mission_id:
+            MissionResult.objects.update_or_create(
+                mission_id=evaluation.mission_id,
+                user_id=quiz.user_id,
+                quiz_id=quiz.id,
+                defaults={"state": "completed", "user_grant": None},
+            )
+
+        if descriptive_count:
+            # پاسخ‌های تشریحی با قوانین خودکار در صف نمره‌دهی تصحیح می‌شوند
+            from .grading_queue import enqueue, rules_configured
+
+            if rules_configured():
+                enqueue([quiz.id], apply_rules=True)
+
+    return result
@@ -0,0 +1,321 @@
+"""
+Database-backed queue for grading work that does not fit the submit request.
+
+Descriptive questions score 0 at submit and evaluation types 2/4 leave the
+quiz "pending". Grading jobs (kebrit_api.GradingJob) finish them off the
+request path:
+- graders post scores in bulk (QuizViewSet.grade -> post_scores);
+- submits with descriptive answers enqueue a job that runs the automatic
+  rules in EXAM_GRADING_RULES (when any are configured);
+- QuizViewSet.regrade re-queues finished quizzes, e.g. after an answer key fix.
+
+`manage.py grading_worker` claims jobs with SELECT ... FOR UPDATE SKIP
+LOCKED, so several worker processes can share the queue. A claimed batch is
+processed with a fixed number of queries: responses of all its quizzes are
+re-scored in memory and Quiz, QuizResponse, QuizResponseEvaluation,
+MissionResult and the result summaries are written with bulk statements.
+A quiz that fails to grade only fails (and later retries) its own jobs.
+
+A rule is a callable `rule(quiz, responses)` returning
+{question_id: score} for descriptive responses it can grade.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from kebrit_api.models import GradingJob
+from roadmap_app.models import MissionResult
+from .answer_keys import get_answer_key
+from .grading import score_answer
+from .item_analysis import invalidate as invalidate_item_analysis
+from .models import Quiz, QuizResponse, QuizResponseEvaluation
+from .result_summaries import build_summary, save_summaries
+
+
+def _max_attempts():
+    return getattr(settings, "EXAM_GRADING_MAX_ATTEMPTS", 3)
+
+
+def _job_timeout():
+    return getattr(settings, "EXAM_GRADING_JOB_TIMEOUT", 600)
+
+
+def _rules():
+    return [import_string(path) for path in getattr(settings, "EXAM_GRADING_RULES", [])]
+
+
+def rules_configured():
+    return bool(getattr(settings, "EXAM_GRADING_RULES", []))
+
+
+def enqueue(quiz_ids, scores=None, apply_rules=False, finalize=False):
+    """Queue one job per quiz id. scores maps quiz ids to {question_id: score}."""
+    scores = scores or {}
+    jobs = [
+        GradingJob(
+            quiz_id=quiz_id,
+            scores={str(q_id): score for q_id, score in scores.get(quiz_id, {}).items()},
+            apply_rules=apply_rules,
+            finalize=finalize,
+        )
+        for quiz_id in quiz_ids
+    ]
+    return GradingJob.objects.bulk_create(jobs, batch_size=1000)
+
+
+def post_scores(grades):
+    """
+    Queue grader-posted scores; grades maps quiz ids to {question_id: score}.
+    Graded quizzes are finalized (pending -> completed).
+    """
+    return enqueue(list(grades), scores=grades, finalize=True)
+
+
+def claim_jobs(batch_size):
+    """Mark up to batch_size queued jobs as running and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Jobs of a worker that died mid-batch go back to the queue
+        GradingJob.objects.filter(
+            state=GradingJob.STATE_RUNNING, started_at__lt=now - timedelta(seconds=_job_timeout())
+        ).update(state=GradingJob.STATE_QUEUED)
+
+        jobs = list(
+            GradingJob.objects.select_for_update(skip_locked=True)
+            .filter(state=GradingJob.STATE_QUEUED)
+            .order_by("id")[:batch_size]
+        )
+        for job in jobs:
+            job.state = GradingJob.STATE_RUNNING
+            job.attempts += 1
+            job.started_at = now
+        GradingJob.objects.bulk_update(jobs, ["state", "attempts", "started_at"])
+    return jobs
+
+
+def _percentage(responses, answer_key):
+    """
+    Percentage of a quiz, as in grading.grade_quiz: only multiple-choice
+    questions count. Quizzes with only descriptive questions use the
+    earned share of the total weight.
+    """
+    multiple_choice = correct = 0
+    total_weight = earned = 0.0
+    for response in responses:
+        entry = answer_key.get(response.question_id)
+        if entry is None:
+            continue
+        if entry.type:
+            multiple_choice += 1
+            if response.score and response.score > 0:
+                correct += 1
+        else:
+            total_weight += entry.weight if entry.weight else 1.0
+            earned += response.score or 0.0
+
+    if multiple_choice:
+        return correct / multiple_choice * 100
+    return (earned / total_weight * 100) if total_weight else 0
+
+
+def _grade(quiz, responses, jobs, rules):
+    """
+    Re-score responses of one quiz in memory. Returns (changed responses, finalize).
+    """
+    answer_key = get_answer_key(quiz.evaluation_id)
+    posted = {}
+    for job in jobs:
+        posted.update({int(q_id): score for q_id, score in job.scores.items()})
+
+    changed = []
+    for response in responses:
+        entry = answer_key.get(response.question_id)
+        if entry is None:
+            continue
+        if entry.type:
+            _, score, _ = score_answer(entry, response.answer)
+        elif response.question_id in posted:
+            score = posted[response.question_id]
+        else:
+            continue
+        if score != response.score:
+            response.score = score
+            changed.append(response)
+
+    if any(job.apply_rules for job in jobs):
+        ungraded = [
+            r for r in responses
+            if r.question_id not in posted and (entry := answer_key.get(r.question_id)) and not entry.type
+        ]
+        graded_by_rules = {}
+        for rule in rules:
+            if ungraded:
+                graded_by_rules.update(rule(quiz, ungraded) or {})
+                ungraded = [r for r in ungraded if r.question_id not in graded_by_rules]
+        for response in responses:
+            if response.question_id in graded_by_rules:
+                response.score = graded_by_rules[response.question_id]
+                changed.append(response)
+        # Rules that graded every descriptive answer finish the quiz
+        if graded_by_rules and not ungraded:
+            return changed, True
+
+    return changed, any(job.finalize for job in jobs)
+
+
+def _write_graded(graded, responses_by_quiz):
+    """Write graded (quiz, changed responses, percentage) items with bulk statements."""
+    to_update = [response for _, changed, _ in graded for response in changed]
+    quizzes = [quiz for quiz, _, _ in graded]
+    percentages = {quiz.id: percentage for quiz, _, percentage in graded}
+    with transaction.atomic():
+        if to_update:
+            QuizResponse.objects.bulk_update(to_update, ["score"], batch_size=500)
+        if quizzes:
+            Quiz.objects.bulk_update(quizzes, ["score", "is_accept", "state"], batch_size=500)
+            write_report_cards(quizzes, percentages)
+            write_mission_results([quiz for quiz in quizzes if quiz.is_accept and quiz.evaluation.mission_id])
+            save_summaries(
+                [build_summary(quiz, responses_by_quiz.get(quiz.id, []), percentages[quiz.id]) for quiz in quizzes]
+            )
+
+
+def process_jobs(jobs):
+    """
+    Grade the quizzes of claimed jobs and write the results in bulk.
+    A quiz whose grading or writing raises only fails its own jobs
+    (fail_jobs); the rest of the batch is finished. Returns the number of
+    quizzes graded.
+    """
+    jobs_by_quiz = {}
+    for job in sorted(jobs, key=lambda j: j.id):
+        jobs_by_quiz.setdefault(job.quiz_id, []).append(job)
+
+    quizzes = Quiz.objects.select_related("evaluation").in_bulk(list(jobs_by_quiz))
+    responses_by_quiz = {}
+    for response in (
+        QuizResponse.objects.filter(quiz_id__in=list(quizzes)).select_related("question").order_by("position", "id")
+    ):
+        responses_by_quiz.setdefault(response.quiz_id, []).append(response)
+
+    rules = _rules()
+    graded = []
+    errors = {}
+    for quiz_id, quiz_jobs in jobs_by_quiz.items():
+        quiz = quizzes.get(quiz_id)
+        if quiz is None or quiz.end_at is None:
+            # Nothing to grade: the quiz is gone or was never submitted
+            continue
+        try:
+            responses = responses_by_quiz.get(quiz_id, [])
+            changed, finalize = _grade(quiz, responses, quiz_jobs, rules)
+
+            percentage = _percentage(responses, get_answer_key(quiz.evaluation_id))
+            accept_score = quiz.evaluation.accept_score
+            quiz.score = sum(r.score or 0.0 for r in responses)
+            quiz.is_accept = percentage >= accept_score if accept_score else False
+            if finalize and quiz.state == "pending":
+                quiz.state = "completed"
+        except Exception as exc:
+            errors[quiz_id] = repr(exc)
+            continue
+        graded.append((quiz, changed, round(percentage, 2)))
+
+    try:
+        _write_graded(graded, responses_by_quiz)
+    except Exception:
+        # One bad row fails the whole bulk write: write quiz by quiz to isolate it
+        written = []
+        for item in graded:
+            try:
+                _write_graded([item], responses_by_quiz)
+            except Exception as exc:
+                errors[item[0].id] = repr(exc)
+            else:
+                written.append(item)
+        graded = written
+
+    for quiz_id, error in errors.items():
+        fail_jobs(jobs_by_quiz[quiz_id], error)
+    GradingJob.objects.filter(id__in=[job.id for job in jobs if job.quiz_id not in errors]).update(
+        state=GradingJob.STATE_DONE, finished_at=timezone.now(), error=None
+    )
+
+    # Item statistics read response scores, which may have changed
+    for evaluation_id in {quiz.evaluation_id for quiz, _, _ in graded}:
+        invalidate_item_analysis(evaluation_id)
+
+    return len(graded)
+
+
+def write_report_cards(quizzes, percentages):
+    """QuizResponseEvaluation (percentage) of each quiz, like grade_quiz."""
+    existing = {}
+    for qre in QuizResponseEvaluation.objects.filter(quiz_id__in=[q.id for q in quizzes]).order_by("id"):
+        existing[qre.quiz_id] = qre
+
+    to_update = []
+    to_create = []
+    for quiz in quizzes:
+        qre = existing.get(quiz.id)
+        if qre is None:
+            to_create.append(QuizResponseEvaluation(user_id=quiz.user_id, quiz=quiz, score=percentages[quiz.id]))
+        else:
+            qre.score = percentages[quiz.id]
+            to_update.append(qre)
+
+    if to_update:
+        QuizResponseEvaluation.objects.bulk_update(to_update, ["score"], batch_size=500)
+    if to_create:
+        QuizResponseEvaluation.objects.bulk_create(to_create, batch_size=500)
+
+
+def write_mission_results(accepted):
+    """Completed MissionResult for newly accepted quizzes, like grade_quiz."""
+    if not accepted:
+        return
+    existing = set(
+        MissionResult.objects.filter(quiz_id__in=[q.id for q in accepted]).values_list("quiz_id", flat=True)
+    )
+    MissionResult.objects.bulk_create(
+        [
+            MissionResult(
+                mission_id=quiz.evaluation.mission_id,
+                user_id=quiz.user_id,
+                quiz_id=quiz.id,
+                state="completed",
+                user_grant=None,
+            )
+            for quiz in accepted
+            if quiz.id not in existing
+        ],
+        batch_size=500,
+    )
+
+
+def fail_jobs(jobs, error):
+    """Re-queue jobs of a failed batch, or mark them failed after EXAM_GRADING_MAX_ATTEMPTS."""
+    for job in jobs:
+        job.state = GradingJob.STATE_FAILED if job.attempts >= _max_attempts() else GradingJob.STATE_QUEUED
+        job.error = error
+        job.finished_at = timezone.now() if job.state == GradingJob.STATE_FAILED else None
+    GradingJob.objects.bulk_update(jobs, ["state", "error", "finished_at"])
+
+
+def run_once(batch_size=100):
+    """
+    Claim and process one batch. Returns the number of jobs handled.
+    Per-quiz failures are handled in process_jobs; the whole batch is only
+    failed when the batch itself cannot be loaded.
+    """
+    jobs = claim_jobs(batch_size)
+    if not jobs:
+        return 0
+    try:
+        process_jobs(jobs)
+    except Exception as exc:
+        fail_jobs(jobs, repr(exc))
+    return len(jobs)
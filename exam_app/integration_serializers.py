@@ -19,6 +19,14 @@ class LaunchAnswerSerializer(serializers.Serializer):
     done = serializers.CharField(required=False, allow_null=True, allow_blank=True)
 
 
+class LaunchAnswersSerializer(serializers.Serializer):
+    """
+    Student -> API payload for autosaving several answers at once.
+    """
+
+    answers = LaunchAnswerSerializer(many=True, required=True, allow_empty=False)
+
+
 class LaunchSubmitSerializer(serializers.Serializer):
     """
     Student -> API payload for submitting the whole quiz at the end.
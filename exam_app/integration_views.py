@@ -1,25 +1,31 @@
-import random
 from urllib.parse import urlencode, urlparse, parse_qsl, urlunparse
 
 from django.db import IntegrityError, transaction
 from django.db.models import Q
-from django.http import HttpResponseRedirect
-from django.utils import timezone
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.conf import settings
 
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.test import APIClient
 
 from kebrit_api.authentication_client import ClientTokenAuthentication
 from kebrit_api.permissions import IsClientTokenAuthenticated
 from kebrit_api.models import ExamLaunch
 
 from users_app.models import User
-from .models import Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
-from .serializers import QuestionForQuizSerializer, QuizResponseSerializer
-from .integration_serializers import ClientExamLaunchSerializer, LaunchAnswerSerializer, LaunchSubmitSerializer
+from .models import Evaluation, Quiz, QuizResponse
+from . import launch_tokens
+from .answer_buffer import buffer_answers
+from .results_export import EXPORT_FORMATS, csv_stream, iter_result_rows, ndjson_stream
+from .grading import GradingError, grade_quiz
+from .quiz_assembly import QuizAssemblyError, quiz_questions_payload, start_quiz
+from .integration_serializers import (
+    ClientExamLaunchSerializer,
+    LaunchAnswerSerializer,
+    LaunchAnswersSerializer,
+    LaunchSubmitSerializer,
+)
 
 
 def _build_callback_url(callback_url: str, params: dict) -> str:
@@ -87,6 +93,35 @@ class ClientExamInfoView(APIView):
         return Response(data, status=status.HTTP_200_OK)
 
 
+class ClientExamResultsExportView(APIView):
+    """
+    Customer exports results of all finished quizzes of its students in one
+    evaluation (by numeric eurl), streamed as CSV (default) or NDJSON:
+    GET /api/integration/exams/<eurl>/results/export/?output=csv|ndjson
+    """
+
+    authentication_classes = [ClientTokenAuthentication]
+    permission_classes = [IsClientTokenAuthenticated]
+
+    def get(self, request, eurl: int):
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response({"error": "output باید csv یا ndjson باشد"}, status=status.HTTP_400_BAD_REQUEST)
+
+        company = request.auth_company
+        evaluation = _get_company_evaluation(company.id, eurl)
+        if not evaluation:
+            return Response({"error": "Evaluation یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
+
+        rows = iter_result_rows(evaluation.id, company.id)
+        if output == "ndjson":
+            response = StreamingHttpResponse(ndjson_stream(rows), content_type="application/x-ndjson; charset=utf-8")
+        else:
+            response = StreamingHttpResponse(csv_stream(rows), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="eurl-{evaluation.id}-results.{output}"'
+        return response
+
+
 class ClientExamLaunchView(APIView):
     """
     Customer starts an exam for a student:
@@ -148,40 +183,19 @@ class ClientExamLaunchView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-        # Resume active quiz if exists
-        active_quiz = (
-            Quiz.objects.filter(evaluation=evaluation, user=student, end_at__isnull=True)
-            .filter(state__in=["started", "in_progress", None])
-            .order_by("-start_at")
-            .prefetch_related("responses", "responses__question")
-            .first()
-        )
-
-        is_existing = bool(active_quiz)
-        if active_quiz:
-            quiz = active_quiz
-        else:
-            available_questions = Question.objects.filter(evaluation=evaluation)
-            if not available_questions.exists():
+        # Resume the active quiz or assemble a new one (same service as /api/quizzes/start/)
+        try:
+            # Launch does not return questions: the answers need not be loaded
+            started = start_quiz(evaluation, student, load_responses=False)
+        except QuizAssemblyError as e:
+            if e.code == "no_questions":
                 return Response({"error": "هیچ سوالی برای این آزمون وجود ندارد"}, status=status.HTTP_400_BAD_REQUEST)
-
-            n = evaluation.number_of_question
-            if available_questions.count() < n:
-                return Response(
-                    {"error": f"تعداد سوالات موجود کمتر از تعداد مورد نیاز است ({available_questions.count()} < {n})"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            selected_ids = random.sample(list(available_questions.values_list("id", flat=True)), n)
-
-            with transaction.atomic():
-                quiz = Quiz.objects.create(evaluation=evaluation, user=student, state="started")
-                QuizResponse.objects.bulk_create(
-                    [
-                        QuizResponse(quiz=quiz, question_id=q_id, answer=None, score=None, done=None)
-                        for q_id in selected_ids
-                    ]
-                )
+            return Response(
+                {"error": f"تعداد سوالات موجود کمتر از تعداد مورد نیاز است ({e.available} < {e.required})"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        quiz = started.quiz
+        is_existing = started.is_existing
 
         # Create or reuse launch for this quiz (idempotency)
         launch = (
@@ -204,38 +218,17 @@ class ClientExamLaunchView(APIView):
             launch.student_mobile = mobile
             launch.save(update_fields=["callback_url", "student_mobile"])
 
-        # Call /api/quizzes/start/ endpoint internally
-        quiz_id_from_start = quiz.id
-        try:
-            # Use APIClient to make internal API call
-            api_client = APIClient()
-            api_client.force_authenticate(user=student)
-            
-            # Make POST request to /api/quizzes/start/
-            response = api_client.post(
-                '/api/quizzes/start/',
-                {'evaluation_id': eurl},
-                format='json'
-            )
-            
-            # Extract quiz_id from response if successful
-            if response.status_code in [status.HTTP_200_OK, status.HTTP_201_CREATED]:
-                response_data = response.data
-                if 'quiz' in response_data and 'id' in response_data['quiz']:
-                    quiz_id_from_start = response_data['quiz']['id']
-        except Exception as e:
-            # If internal call fails, use the existing quiz_id
-            # Log the error but don't fail the launch
-            pass
-
+        # Signed token lets the student-facing reads skip the ExamLaunch lookup
+        launch_token = launch_tokens.issue(launch)
         base = getattr(settings, "EXAM_FRONT_BASE_URL", "") or ""
-        exam_url = f"{base}?launch={launch.uuid}" if base else None
+        exam_url = f"{base}?{urlencode({'launch': launch_token})}" if base else None
         
         return Response(
             {
                 "launch_id": str(launch.uuid),
+                "launch_token": launch_token,
                 "exam_url": exam_url,
-                "quiz_id": quiz_id_from_start,
+                "quiz_id": quiz.id,
                 "eurl": eurl,
                 "student": {"uuid": student_uuid, "mobile": mobile},
                 "is_existing_quiz": is_existing,
@@ -255,7 +248,7 @@ class LaunchDetailView(APIView):
 
     def get(self, request, quiz_id):
         try:
-            quiz = Quiz.objects.select_related("evaluation", "user").prefetch_related("responses", "responses__question").get(id=quiz_id)
+            quiz = Quiz.objects.select_related("evaluation", "user").prefetch_related("responses").get(id=quiz_id)
         except Quiz.DoesNotExist:
             return Response({"error": "Quiz یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -264,31 +257,26 @@ class LaunchDetailView(APIView):
         if not launch_id:
             return Response({"error": "پارامتر launch الزامی است"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Find active launch for this quiz and launch_id
-        launch = (
-            ExamLaunch.objects.filter(uuid=launch_id, quiz_id=quiz_id, completed_at__isnull=True)
-            .order_by("-created_at")
-            .first()
-        )
-        if not launch:
+        # Signed launch tokens are verified without a query; legacy UUIDs need an active launch
+        try:
+            launch = launch_tokens.resolve(launch_id, quiz_id, active_only=True)
+        except launch_tokens.InvalidLaunch:
             return Response({"error": "Launch یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
 
-        # Collect questions with current answers
-        questions = Question.objects.filter(quiz_responses__quiz=quiz).distinct()
-        questions_data = QuestionForQuizSerializer(questions, many=True).data
+        # active_only only covers legacy UUIDs; a token of a submitted quiz is refused here
+        if quiz.end_at is not None:
+            return Response({"error": "Launch یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
 
-        responses_dict = {r.question_id: {"answer": r.answer, "done": r.done} for r in quiz.responses.all()}
-        for q in questions_data:
-            qid = q["id"]
-            q["current_answer"] = responses_dict.get(qid, {}).get("answer")
-            q["done"] = responses_dict.get(qid, {}).get("done")
+        # Collect questions (from the fragment cache) with current answers
+        questions_data = quiz_questions_payload(quiz, quiz.responses.all())
 
         return Response(
             {
-                "launch_id": str(launch.uuid),
+                "launch_id": launch.launch_id,
                 "quiz_id": quiz.id,
-                "eurl": launch.eurl,
-                "student": {"uuid": launch.student_uuid, "mobile": launch.student_mobile},
+                # eurl is the evaluation id; the student is the quiz owner
+                "eurl": quiz.evaluation_id,
+                "student": {"uuid": quiz.user.uuid, "mobile": quiz.user.mobile},
                 "evaluation": {
                     "eurl": quiz.evaluation_id,
                     "title": quiz.evaluation.title,
@@ -344,6 +332,10 @@ class LaunchAnswerView(APIView):
         if not qr:
             return Response({"error": "این سوال متعلق به این آزمون نیست"}, status=status.HTTP_400_BAD_REQUEST)
 
+        # با فعال بودن بافر، پاسخ بعداً به صورت دسته‌ای در دیتابیس نوشته می‌شود
+        if buffer_answers(quiz.id, [serializer.validated_data]):
+            return Response({"message": "ذخیره شد"}, status=status.HTTP_200_OK)
+
         qr.answer = answer if answer != "" else None
         if done is not None:
             qr.done = done
@@ -352,6 +344,75 @@ class LaunchAnswerView(APIView):
         return Response({"message": "ذخیره شد"}, status=status.HTTP_200_OK)
 
 
+class LaunchAnswersView(APIView):
+    """
+    Student-facing: autosave many answers in one request.
+    Answers are checked against the quiz's responses in one query and
+    written with one bulk update; each item gets its own status.
+    """
+
+    authentication_classes = [ClientTokenAuthentication]
+    permission_classes = [IsClientTokenAuthenticated]
+
+    def post(self, request, quiz_id):
+        serializer = LaunchAnswersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            quiz = Quiz.objects.get(id=quiz_id)
+        except Quiz.DoesNotExist:
+            return Response({"error": "Quiz یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Find active launch for this quiz
+        launch = ExamLaunch.objects.filter(quiz_id=quiz_id, completed_at__isnull=True).order_by("-created_at").first()
+        if not launch:
+            return Response({"error": "Launch یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
+
+        # Ensure launch belongs to the same company as client token
+        if launch.company_id != request.auth_company.id:
+            return Response({"error": "دسترسی به این آزمون مجاز نیست"}, status=status.HTTP_403_FORBIDDEN)
+
+        if quiz.end_at is not None:
+            return Response({"error": "این آزمون قبلاً تمام شده است"}, status=status.HTTP_400_BAD_REQUEST)
+
+        answers = serializer.validated_data["answers"]
+        responses_by_question = {
+            qr.question_id: qr
+            for qr in QuizResponse.objects.filter(
+                quiz_id=quiz.id, question_id__in={a["question_id"] for a in answers}
+            )
+        }
+
+        results = []
+        changed = {}
+        for item in answers:
+            question_id = item["question_id"]
+            qr = responses_by_question.get(question_id)
+            if not qr:
+                results.append({"question_id": question_id, "status": "not_in_quiz"})
+                continue
+
+            # Later entries for the same question win
+            answer = item.get("answer")
+            qr.answer = answer if answer != "" else None
+            if item.get("done") is not None:
+                qr.done = item["done"]
+            changed[question_id] = qr
+            results.append({"question_id": question_id, "status": "saved"})
+
+        if changed and not buffer_answers(
+            quiz.id, [item for item in answers if item["question_id"] in responses_by_question]
+        ):
+            QuizResponse.objects.bulk_update(list(changed.values()), ["answer", "done"])
+
+        saved = sum(1 for r in results if r["status"] == "saved")
+        return Response(
+            {"message": "ذخیره شد", "saved": saved, "failed": len(results) - saved, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
 class LaunchSubmitView(APIView):
     """
     Student-facing: submit all answers, finalize quiz, compute score, and return redirect_url for callback.
@@ -376,9 +437,13 @@ class LaunchSubmitView(APIView):
         if not launch_id:
             return Response({"error": "پارامتر launch الزامی است"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Find active launch for this quiz and launch_id
+        # Find active launch for this quiz and launch_id (or signed launch token)
+        try:
+            launch_uuid = launch_tokens.launch_uuid(launch_id, quiz_id)
+        except launch_tokens.InvalidLaunch:
+            return Response({"error": "Launch یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
         launch = (
-            ExamLaunch.objects.filter(uuid=launch_id, quiz_id=quiz_id, completed_at__isnull=True)
+            ExamLaunch.objects.filter(uuid=launch_uuid, quiz_id=quiz_id, completed_at__isnull=True)
             .order_by("-created_at")
             .first()
         )
@@ -421,111 +486,26 @@ class LaunchSubmitView(APIView):
 
         responses_data = serializer.validated_data["responses"]
 
-        quiz_questions = Question.objects.filter(quiz_responses__quiz=quiz).distinct()
-        if len(responses_data) != quiz_questions.count():
-            return Response(
-                {"error": "تعداد پاسخ‌های ارسالی با تعداد سوالات مطابقت ندارد"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
         try:
             with transaction.atomic():
-                total_score = 0.0
-                correct_count = 0
-                wrong_count = 0
-                multiple_choice_count = 0
-
-                for r in responses_data:
-                    qid = r["question_id"]
-                    student_answer = r.get("answer")
-                    done = r.get("done", "completed")
-
-                    question = Question.objects.filter(id=qid, evaluation=quiz.evaluation).first()
-                    if not question:
-                        continue
-
-                    qr = QuizResponse.objects.filter(quiz=quiz, question=question).first()
-                    if not qr:
-                        qr = QuizResponse.objects.create(quiz=quiz, question=question, answer=None, score=None, done=None)
-
-                    score = 0.0
-                    if question.type:  # multiple choice
-                        multiple_choice_count += 1
-                        try:
-                            ans_int = int(student_answer) if student_answer is not None and student_answer != "" else None
-                        except (ValueError, TypeError):
-                            ans_int = None
-
-                        if ans_int is not None and question.correct is not None:
-                            if ans_int == question.correct:
-                                correct_count += 1
-                                score = question.weight if question.weight else 1.0
-                            else:
-                                wrong_count += 1
-
-                        qr.answer = str(ans_int) if ans_int is not None else None
-                    else:
-                        qr.answer = student_answer if student_answer else None
-                        score = 0.0
-
-                    qr.score = score
-                    qr.done = done
-                    qr.save()
-
-                    total_score += score
-
-                percentage = (correct_count / multiple_choice_count * 100) if multiple_choice_count > 0 else 0
-                is_accept = percentage >= quiz.evaluation.accept_score if quiz.evaluation.accept_score else False
-
-                quiz.end_at = timezone.now()
-                quiz.score = total_score
-                quiz.is_accept = is_accept
-                if quiz.evaluation.type_id in (1, 3):
-                    quiz.state = "completed"
-                elif quiz.evaluation.type_id in (2, 4):
-                    quiz.state = "pending"
-                else:
-                    quiz.state = quiz.state or "completed"
-                quiz.save()
-
-                QuizResponseEvaluation.objects.update_or_create(
-                    user=quiz.user,
-                    quiz=quiz,
-                    defaults={"score": round(percentage, 2)},
-                )
-
-                if is_accept and quiz.evaluation.mission:
-                    from roadmap_app.models import MissionResult
-
-                    MissionResult.objects.update_or_create(
-                        mission=quiz.evaluation.mission,
-                        user=quiz.user,
-                        quiz_id=quiz.id,
-                        defaults={"state": "completed", "user_grant": None},
-                    )
+                grading = grade_quiz(quiz, responses_data)
 
                 # Cache on launch
                 launch.completed_at = quiz.end_at
-                launch.percentage = round(percentage, 2)
-                launch.total_score = round(total_score, 2)
-                launch.is_accept = bool(is_accept)
+                launch.percentage = round(grading.percentage, 2)
+                launch.total_score = round(grading.total_score, 2)
+                launch.is_accept = bool(grading.is_accept)
                 launch.state = quiz.state
                 launch.save(update_fields=["completed_at", "percentage", "total_score", "is_accept", "state"])
 
-                final_responses = QuizResponse.objects.filter(quiz=quiz).select_related("question")
-
-                result = {
-                    "quiz_id": quiz.id,
-                    "total_questions": quiz_questions.count(),
-                    "correct_answers": correct_count,
-                    "wrong_answers": wrong_count,
-                    "percentage": round(percentage, 2),
-                    "total_score": round(total_score, 2),
-                    "is_accept": bool(is_accept),
-                    "state": quiz.state,
-                    "responses": QuizResponseSerializer(final_responses, many=True).data,
-                }
+                result = grading.as_dict()
+                result["state"] = quiz.state
 
+        except GradingError:
+            return Response(
+                {"error": "تعداد پاسخ‌های ارسالی با تعداد سوالات مطابقت ندارد"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         except Exception as e:
             return Response({"error": f"خطا در ثبت پاسخ‌ها: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
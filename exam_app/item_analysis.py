@@ -0,0 +1,229 @@
+"""
+Item analysis (question quality statistics) of an evaluation.
+
+Finished quizzes' QuizResponse rows (quiz, question, chosen option,
+correct) are read in chunks into NumPy arrays and all statistics are
+computed with vectorized bincount/argsort operations:
+- difficulty: share of correct responses per question;
+- discrimination index: difficulty in the upper 27% of quizzes (by number
+  of correct answers) minus difficulty in the lower 27%;
+- option distribution: how often each option (1-4) was chosen;
+- distractor effectiveness: for each wrong option, the share choosing it and
+  how much more often the lower group chose it than the upper group.
+
+The arrays are cached per evaluation (keyed by its answer-key version, so
+question edits start over). A refresh only loads responses of quizzes that
+finished after the cached watermark; regrades drop the cache
+(grading_queue.py).
+
+NumPy is an optional dependency: without it `is_available()` is False and
+the endpoints report the feature as unavailable.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .answer_keys import get_answer_key, get_version
+from .models import QuizResponse
+
+
+ANALYSIS_KEY = "exam:item_analysis:{evaluation_id}:{version}"
+
+OPTION_COUNT = 4
+# Upper/lower group size for the discrimination index
+GROUP_SHARE = 0.27
+# A distractor chosen by fewer respondents than this is not functional
+FUNCTIONAL_DISTRACTOR_SHARE = 0.05
+# Quizzes finishing this close to the watermark are re-read (and de-duplicated)
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def is_available():
+    return np is not None
+
+
+def _ttl():
+    return getattr(settings, "EXAM_ITEM_ANALYSIS_TTL", 86400)
+
+
+def _chunk_size():
+    return getattr(settings, "EXAM_ITEM_ANALYSIS_CHUNK_SIZE", 5000)
+
+
+def invalidate(evaluation_id):
+    cache.delete(ANALYSIS_KEY.format(evaluation_id=evaluation_id, version=get_version(evaluation_id)))
+
+
+def _option(answer):
+    """Chosen option 1..OPTION_COUNT, or 0 for unanswered/other answers."""
+    try:
+        option = int(answer)
+    except (TypeError, ValueError):
+        return 0
+    return option if 1 <= option <= OPTION_COUNT else 0
+
+
+def _load_rows(evaluation_id, since=None):
+    """
+    ((quiz ids, question ids, options, correct flags), latest end_at) of the
+    responses of finished quizzes, read in chunks.
+    """
+    queryset = QuizResponse.objects.filter(quiz__evaluation_id=evaluation_id, quiz__end_at__isnull=False)
+    if since is not None:
+        queryset = queryset.filter(quiz__end_at__gte=since)
+    rows = queryset.values_list("quiz_id", "question_id", "answer", "score", "quiz__end_at")
+
+    parts = []
+    latest = None
+    chunk = []
+    for row in rows.iterator(chunk_size=_chunk_size()):
+        chunk.append(row)
+        if latest is None or row[4] > latest:
+            latest = row[4]
+        if len(chunk) >= _chunk_size():
+            parts.append(_to_arrays(chunk))
+            chunk = []
+    if chunk:
+        parts.append(_to_arrays(chunk))
+
+    if not parts:
+        return _empty_arrays(), latest
+    return tuple(np.concatenate(column) for column in zip(*parts)), latest
+
+
+def _to_arrays(chunk):
+    return (
+        np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk)),
+        np.fromiter((r[1] for r in chunk), dtype=np.int64, count=len(chunk)),
+        np.fromiter((_option(r[2]) for r in chunk), dtype=np.int8, count=len(chunk)),
+        np.fromiter((bool(r[3] and r[3] > 0) for r in chunk), dtype=np.bool_, count=len(chunk)),
+    )
+
+
+def _empty_arrays():
+    return (
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int8),
+        np.empty(0, dtype=np.bool_),
+    )
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def compute_statistics(evaluation_id, quiz_ids, question_ids, options, correct):
+    """Per-question statistics from response arrays (one element per QuizResponse)."""
+    questions, qi = np.unique(question_ids, return_inverse=True)
+    quizzes, zi = np.unique(quiz_ids, return_inverse=True)
+    n_questions = len(questions)
+    correct_f = correct.astype(np.float64)
+
+    responses = np.bincount(qi, minlength=n_questions)
+    difficulty = _ratio(np.bincount(qi, weights=correct_f, minlength=n_questions), responses)
+
+    # Upper / lower groups by number of correct answers in the quiz
+    totals = np.bincount(zi, weights=correct_f, minlength=len(quizzes))
+    group_size = int(round(len(quizzes) * GROUP_SHARE))
+    group = np.zeros(len(quizzes), dtype=np.int8)
+    if group_size and len(quizzes) >= 2 * group_size:
+        order = np.argsort(totals, kind="stable")
+        group[order[:group_size]] = -1
+        group[order[-group_size:]] = 1
+    upper = (group[zi] == 1).astype(np.float64)
+    lower = (group[zi] == -1).astype(np.float64)
+
+    upper_n = np.bincount(qi, weights=upper, minlength=n_questions)
+    lower_n = np.bincount(qi, weights=lower, minlength=n_questions)
+    discrimination = (
+        _ratio(np.bincount(qi, weights=correct_f * upper, minlength=n_questions), upper_n)
+        - _ratio(np.bincount(qi, weights=correct_f * lower, minlength=n_questions), lower_n)
+    )
+
+    # Option counts as (question, option) matrices; column 0 is unanswered
+    width = OPTION_COUNT + 1
+    cells = qi * width + options
+    option_counts = np.bincount(cells, minlength=n_questions * width).reshape(n_questions, width)
+    upper_options = np.bincount(cells, weights=upper, minlength=n_questions * width).reshape(n_questions, width)
+    lower_options = np.bincount(cells, weights=lower, minlength=n_questions * width).reshape(n_questions, width)
+    option_share = _ratio(option_counts, responses[:, None])
+    distractor_discrimination = _ratio(lower_options, lower_n[:, None]) - _ratio(upper_options, upper_n[:, None])
+
+    answer_key = get_answer_key(evaluation_id)
+    results = []
+    for i, question_id in enumerate(questions.tolist()):
+        entry = answer_key.get(question_id)
+        item = {
+            "question_id": question_id,
+            "responses": int(responses[i]),
+            "difficulty": _round(difficulty[i]),
+            "discrimination": _round(discrimination[i]),
+        }
+        if entry is not None and entry.type:
+            item["options"] = {str(o): int(option_counts[i, o]) for o in range(1, width)}
+            item["unanswered"] = int(option_counts[i, 0])
+            item["distractors"] = [
+                {
+                    "option": o,
+                    "share": _round(option_share[i, o]),
+                    "discrimination": _round(distractor_discrimination[i, o]),
+                    "functional": bool(
+                        option_share[i, o] >= FUNCTIONAL_DISTRACTOR_SHARE and distractor_discrimination[i, o] > 0
+                    ),
+                }
+                for o in range(1, width)
+                if o != entry.correct
+            ]
+        results.append(item)
+
+    return {
+        "evaluation_id": evaluation_id,
+        "quizzes": int(len(quizzes)),
+        "responses": int(len(question_ids)),
+        "questions": results,
+    }
+
+
+def get_item_analysis(evaluation_id):
+    """
+    Item analysis of an evaluation, refreshed with quizzes finished since the
+    last call. Raises RuntimeError when NumPy is not installed.
+    """
+    if not is_available():
+        raise RuntimeError("numpy is required for item analysis")
+
+    key = ANALYSIS_KEY.format(evaluation_id=evaluation_id, version=get_version(evaluation_id))
+    state = cache.get(key)
+
+    if state is None:
+        arrays, watermark = _load_rows(evaluation_id)
+    else:
+        new, latest = _load_rows(evaluation_id, since=state["watermark"] - WATERMARK_OVERLAP)
+        # Quizzes inside the overlap window are already in the cached arrays
+        fresh = ~np.isin(new[0], state["arrays"][0])
+        if not fresh.any():
+            return state["statistics"]
+        arrays = tuple(np.concatenate([old, column[fresh]]) for old, column in zip(state["arrays"], new))
+        watermark = max(state["watermark"], latest) if latest else state["watermark"]
+
+    statistics = compute_statistics(evaluation_id, *arrays)
+    statistics["updated_at"] = timezone.now()
+    cache.set(
+        key,
+        {"arrays": arrays, "watermark": watermark or timezone.now(), "statistics": statistics},
+        _ttl(),
+    )
+    return statistics
@@ -0,0 +1,92 @@
+"""
+Signed launch tokens for the student-facing quiz endpoints.
+
+A launch token is an HMAC-signed (django.core.signing, keyed by
+SECRET_KEY), timestamped payload carrying the launch UUID, quiz id, company
+id and student id. It is issued by ClientExamLaunchView next to the launch
+UUID and accepted wherever a `launch` / `launch_id` query parameter is:
+verifying it needs no database access, so reads (LaunchDetailView,
+QuizViewSet.get_questions / get_result) are authorized without an ExamLaunch
+query. A token expires EXAM_LAUNCH_TOKEN_TTL seconds after it was issued.
+
+Plain launch UUIDs are still accepted and looked up in ExamLaunch. State
+transitions (submit) always load the ExamLaunch row.
+"""
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+
+from kebrit_api.models import ExamLaunch
+
+
+SALT = "exam_app.launch_token"
+
+LaunchClaims = namedtuple("LaunchClaims", ["launch_id", "quiz_id", "company_id", "student_id"])
+
+
+class InvalidLaunch(Exception):
+    """The launch credential is malformed, tampered with, expired or for another quiz."""
+
+
+def _ttl():
+    return getattr(settings, "EXAM_LAUNCH_TOKEN_TTL", 86400)
+
+
+def issue(launch):
+    """Signed token for an ExamLaunch."""
+    return signing.dumps(
+        {"l": str(launch.uuid), "q": launch.quiz_id, "c": launch.company_id, "s": launch.student_id},
+        salt=SALT,
+        compress=False,
+    )
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def read_token(token, quiz_id):
+    """Claims of a valid token for quiz_id, without database access; raises InvalidLaunch."""
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=_ttl())
+    except signing.BadSignature:
+        # SignatureExpired is a BadSignature too
+        raise InvalidLaunch(token)
+    claims = LaunchClaims(payload["l"], payload["q"], payload["c"], payload["s"])
+    if claims.quiz_id != int(quiz_id):
+        raise InvalidLaunch(token)
+    return claims
+
+
+def resolve(value, quiz_id, active_only=False):
+    """
+    Claims of a launch credential (signed token or legacy launch UUID) for
+    quiz_id. Only legacy UUIDs cost a query; active_only additionally
+    requires their launch not to be completed. active_only does not apply to
+    signed tokens, which stay valid until they expire: callers that must
+    refuse finished quizzes check quiz.end_at themselves. Raises InvalidLaunch.
+    """
+    launch_uuid = _parse_uuid(value)
+    if launch_uuid is None:
+        return read_token(value, quiz_id)
+
+    launches = ExamLaunch.objects.filter(uuid=launch_uuid, quiz_id=quiz_id)
+    if active_only:
+        launches = launches.filter(completed_at__isnull=True)
+    launch = launches.only("uuid", "quiz_id", "company_id", "student_id").first()
+    if launch is None:
+        raise InvalidLaunch(value)
+    return LaunchClaims(str(launch.uuid), launch.quiz_id, launch.company_id, launch.student_id)
+
+
+def launch_uuid(value, quiz_id):
+    """ExamLaunch UUID a credential refers to (for loading the row); raises InvalidLaunch."""
+    parsed = _parse_uuid(value)
+    if parsed is not None:
+        return parsed
+    return uuid.UUID(read_token(value, quiz_id).launch_id)
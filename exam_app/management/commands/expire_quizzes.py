@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam_app.expiry import sweep
+
+
+class Command(BaseCommand):
+    help = "Auto-submit quizzes that ran past their evaluation's duration"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Quizzes submitted per transaction")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches per sweep")
+        parser.add_argument("--loop", type=float, help="Keep running and sweep every LOOP seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = sweep(options["batch_size"], options["max_batches"])
+            if stats.quizzes or stats.backlog:
+                self.stdout.write(
+                    f"{stats.quizzes} quiz(zes) expired in {stats.batches} batch(es), "
+                    f"{stats.seconds:.1f}s ({stats.rate:.1f}/s), backlog {stats.backlog}"
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
+
+        self.stdout.write(self.style.SUCCESS("Done"))
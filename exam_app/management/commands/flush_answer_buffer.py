@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exam_app import answer_buffer
+
+
+class Command(BaseCommand):
+    help = "Flush autosaved answers from the write-behind buffer to QuizResponse"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Flush every buffered quiz, regardless of age")
+        parser.add_argument("--loop", type=float, help="Keep running and flush every LOOP seconds")
+        parser.add_argument("--stats", action="store_true", help="Print buffer metrics after flushing")
+
+    def handle(self, *args, **options):
+        if not answer_buffer.is_enabled():
+            self.stdout.write("Answer buffer is disabled (EXAM_ANSWER_BUFFER_ENABLED)")
+            return
+
+        max_age = 0 if options["all"] else None
+        while True:
+            quizzes, answers = answer_buffer.flush_due(max_age)
+            if quizzes:
+                self.stdout.write(f"{answers} answer(s) of {quizzes} quiz(zes) flushed")
+            if options["stats"]:
+                self.stdout.write(str(answer_buffer.metrics()))
+            if not options["loop"]:
+                break
+            time.sleep(options["loop"])
+
+        self.stdout.write(self.style.SUCCESS("Done"))
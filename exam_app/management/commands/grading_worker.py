@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from exam_app.grading_queue import run_once
+
+
+def _work(batch_size, sleep, once):
+    # Each process opens its own database connection
+    connections.close_all()
+    while True:
+        handled = run_once(batch_size)
+        if once and not handled:
+            break
+        if not handled:
+            time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = "Process queued grading jobs (manual scores, grading rules and regrades)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+        parser.add_argument("--batch-size", type=int, default=100, help="Jobs claimed per batch")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        batch_size, sleep, once = options["batch_size"], options["sleep"], options["once"]
+
+        if options["processes"] <= 1:
+            _work(batch_size, sleep, once)
+            self.stdout.write(self.style.SUCCESS("Done"))
+            return
+
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=_work, args=(batch_size, sleep, once), daemon=True)
+            for _ in range(options["processes"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"{len(workers)} grading worker(s) started")
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+        self.stdout.write(self.style.SUCCESS("Done"))
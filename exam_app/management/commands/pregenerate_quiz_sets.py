@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from kebrit_api.models import QuizPool
+from exam_app.quiz_pools import refill_pool
+
+
+class Command(BaseCommand):
+    help = "Pre-generate randomized question sets for evaluations with an active QuizPool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--evaluation", type=int, help="Only refill the pool of this evaluation id")
+
+    def handle(self, *args, **options):
+        pools = QuizPool.objects.filter(is_active=True).order_by("evaluation_id")
+        if options.get("evaluation"):
+            pools = pools.filter(evaluation_id=options["evaluation"])
+
+        total = 0
+        for pool in pools:
+            created = refill_pool(pool)
+            total += created
+            self.stdout.write(f"eurl={pool.evaluation_id}: {created} set(s) created")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} question set(s) created"))
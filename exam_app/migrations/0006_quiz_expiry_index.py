@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('exam_app', '0005_evaluationtype'),
+    ]
+
+    operations = [
+        # Models are unmanaged (managed=False): the index is created with SQL.
+        # Open quizzes by start time, for the expiry sweeper (exam_app/expiry.py).
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_quiz_startAt_state"
+                ON exam.quiz (startat, state)
+                WHERE endat IS NULL;
+            """,
+            reverse_sql="""
+                DROP INDEX CONCURRENTLY IF EXISTS exam."idx_quiz_startAt_state";
+            """
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('exam_app', '0006_quiz_expiry_index'),
+    ]
+
+    operations = [
+        # Models are unmanaged (managed=False): the index is created with SQL.
+        # Active (unfinished) quiz of a student on an evaluation, for
+        # quiz_assembly.resume_quiz (quiz start and launch).
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_quiz_active"
+                ON exam.quiz (evaluationid, userid)
+                WHERE endat IS NULL;
+            """,
+            reverse_sql="""
+                DROP INDEX CONCURRENTLY IF EXISTS exam."idx_quiz_active";
+            """
+        ),
+    ]
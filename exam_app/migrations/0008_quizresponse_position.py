@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('exam_app', '0007_quiz_active_index'),
+    ]
+
+    operations = [
+        # Models are unmanaged (managed=False): schema changes are done with SQL.
+        # Position of the question in its quiz, set when the quiz is assembled.
+        # Existing rows keep NULL and are ordered by id (their insertion order).
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE exam.quizresponse
+                ADD COLUMN IF NOT EXISTS position SMALLINT;
+            """,
+            reverse_sql="""
+                ALTER TABLE exam.quizresponse
+                DROP COLUMN IF EXISTS position;
+            """
+        ),
+        # Ordered scan of a quiz's responses (questions in quiz order)
+        migrations.RunSQL(
+            sql="""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_quizResponse_quizPosition"
+                ON exam.quizresponse (quizid, position, id);
+            """,
+            reverse_sql="""
+                DROP INDEX CONCURRENTLY IF EXISTS exam."idx_quizResponse_quizPosition";
+            """
+        ),
+    ]
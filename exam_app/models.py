@@ -89,6 +89,10 @@ class Quiz(models.Model):
         indexes = [
             models.Index(fields=['evaluation'], name='idx_quiz_evaluationId'),
             models.Index(fields=['user'], name='idx_quiz_userId'),
+            # Active quiz of a student (resume on start/launch), see migration 0007
+            models.Index(fields=['evaluation', 'user'], name='idx_quiz_active', condition=models.Q(end_at__isnull=True)),
+            # Open quizzes by start time (expiry sweeper), see migration 0006
+            models.Index(fields=['start_at', 'state'], name='idx_quiz_startAt_state', condition=models.Q(end_at__isnull=True)),
         ]
 
     def __str__(self):
@@ -102,6 +106,8 @@ class QuizResponse(models.Model):
     answer = models.TextField(null=True, blank=True)  # می‌تواند integer (برای چندگزینه‌ای) یا text (برای تشریحی) باشد
     score = models.FloatField(null=True, blank=True)
     done = models.CharField(max_length=255, null=True, blank=True)
+    # ترتیب سوال در کوئیز، هنگام ساخت کوئیز تعیین می‌شود (برای پاسخ‌های قدیمی null است و ترتیب id ملاک است)
+    position = models.PositiveSmallIntegerField(null=True, blank=True)
 
     class Meta:
         db_table = 'quizresponse'
@@ -110,6 +116,8 @@ class QuizResponse(models.Model):
         indexes = [
             models.Index(fields=['quiz'], name='idx_quizResponse_quizId'),
             models.Index(fields=['question'], name='idx_quizResponse_questionId'),
+            # Questions of a quiz in order, see migration 0008
+            models.Index(fields=['quiz', 'position', 'id'], name='idx_quizResponse_quizPosition'),
         ]
 
     def __str__(self):
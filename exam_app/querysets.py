@@ -0,0 +1,92 @@
+"""
+Queryset annotations for list endpoints.
+
+Values the serializers would otherwise query per row (question counts, the
+requesting student's last quiz) are computed by correlated subqueries in the
+page query itself, and nested blocks requested with ?expand= are loaded
+with one prefetch query per block for the whole page, so a page costs a
+fixed number of queries.
+"""
+from django.db.models import Count, FloatField, IntegerField, CharField, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users_app.models import User
+from .models import Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
+
+
+def annotate_evaluations(queryset, user):
+    """
+    Annotate Evaluation rows for EvaluationSerializer:
+    annotated_questions_count and, for a student user, annotated_last_score,
+    annotated_last_quiz_id and annotated_last_quiz_state (None otherwise).
+    """
+    queryset = queryset.annotate(annotated_questions_count=_count_subquery(Question, "evaluation"))
+
+    if not isinstance(user, User):
+        # Client tokens and anonymous requests have no "last quiz"
+        return queryset.annotate(
+            annotated_last_score=Value(None, output_field=FloatField()),
+            annotated_last_quiz_id=Value(None, output_field=IntegerField()),
+            annotated_last_quiz_state=Value(None, output_field=CharField()),
+        )
+
+    # Same lookups as EvaluationSerializer._get_last_evaluation_data / _get_last_quiz_data
+    last_report_card = QuizResponseEvaluation.objects.filter(
+        user=user, quiz__evaluation=OuterRef("pk"), quiz__end_at__isnull=False
+    ).order_by("-quiz__end_at")
+    last_quiz = Quiz.objects.filter(evaluation=OuterRef("pk"), user=user).order_by("-start_at")
+
+    return queryset.annotate(
+        annotated_last_score=Subquery(last_report_card.values("score")[:1]),
+        annotated_last_quiz_id=Subquery(last_report_card.values("quiz_id")[:1]),
+        annotated_last_quiz_state=Subquery(last_quiz.values("state")[:1]),
+    )
+
+
+def _count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        Value(0),
+    )
+
+
+def annotated_evaluations_prefetch(lookup, user):
+    return Prefetch(lookup, queryset=annotate_evaluations(Evaluation.objects.select_related("type"), user))
+
+
+def annotate_quizzes(queryset, user, expand=()):
+    """
+    Quiz rows for QuizListSerializer: annotated_responses_count, plus the
+    evaluation_details / questions blocks when expanded.
+    """
+    # Joins of the detail queryset are not needed by the slim representation
+    queryset = queryset.select_related(None).annotate(
+        annotated_responses_count=_count_subquery(QuizResponse, "quiz")
+    )
+    if "evaluation_details" in expand:
+        queryset = queryset.prefetch_related(annotated_evaluations_prefetch("evaluation", user))
+    if "questions" in expand:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                "responses",
+                queryset=QuizResponse.objects.select_related("question").order_by("position", "id"),
+                to_attr="prefetched_responses",
+            )
+        )
+    return queryset
+
+
+def annotate_report_cards(queryset, user, expand=()):
+    """QuizResponseEvaluation rows for QuizResponseEvaluationListSerializer."""
+    queryset = queryset.select_related(None).select_related("user")
+    if "quiz_details" in expand or "evaluation_details" in expand:
+        queryset = queryset.prefetch_related(Prefetch("quiz", queryset=annotate_quizzes(Quiz.objects.all(), user)))
+    if "evaluation_details" in expand:
+        queryset = queryset.prefetch_related(annotated_evaluations_prefetch("quiz__evaluation", user))
+    return queryset
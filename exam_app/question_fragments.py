@@ -0,0 +1,50 @@
+"""
+Cache of serialized QuestionForQuizSerializer fragments.
+
+Each question's student-facing representation is cached under its id and
+the evaluation's answer-key version stamp, so any Question write (which
+replaces the stamp, see signals.py) invalidates the fragments. Quiz
+payloads are then assembled from cached fragments plus the student's
+current answers, and Question rows are only read for cache misses.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .answer_keys import get_version
+from .models import Question
+from .serializers import QuestionForQuizSerializer
+
+
+FRAGMENT_KEY = "exam:question_fragment:{question_id}:{version}"
+
+
+def _fragment_ttl():
+    return getattr(settings, "EXAM_QUESTION_FRAGMENT_TTL", 3600)
+
+
+def get_question_fragments(evaluation_id, question_ids, questions=None):
+    """
+    Serialized fragments for question_ids, in the same order.
+
+    questions may hold already loaded Question rows; they are used for
+    misses instead of querying. Returned dicts are fresh copies and safe
+    to modify.
+    """
+    version = get_version(evaluation_id)
+    keys = {q_id: FRAGMENT_KEY.format(question_id=q_id, version=version) for q_id in question_ids}
+    cached = cache.get_many(list(keys.values()))
+    fragments = {q_id: cached[key] for q_id, key in keys.items() if key in cached}
+
+    missing = [q_id for q_id in question_ids if q_id not in fragments]
+    if missing:
+        loaded = {q.id: q for q in questions or ()}
+        to_load = [q_id for q_id in missing if q_id not in loaded]
+        if to_load:
+            loaded.update(Question.objects.only(*QuestionForQuizSerializer.Meta.fields).in_bulk(to_load))
+
+        rows = [loaded[q_id] for q_id in missing if q_id in loaded]
+        new_fragments = {item["id"]: dict(item) for item in QuestionForQuizSerializer(rows, many=True).data}
+        cache.set_many({keys[q_id]: fragment for q_id, fragment in new_fragments.items()}, _fragment_ttl())
+        fragments.update(new_fragments)
+
+    return [dict(fragments[q_id]) for q_id in question_ids if q_id in fragments]
@@ -0,0 +1,203 @@
+"""
+Quiz start and assembly shared by QuizViewSet.start_quiz and
+ClientExamLaunchView, which both call start_quiz() in-process.
+
+Sampling, quiz creation and the student-facing question payload are done
+with a fixed number of queries, independent of number_of_question:
+- claiming a pre-generated set (quiz_pools.py) or at most one query to
+  draw question ids (sampling.py)
+- one query for the selected question rows
+- one INSERT for the Quiz and one bulk INSERT for its QuizResponse rows
+
+The question payload is built from cached serialized fragments.
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import Q
+
+from .answer_buffer import apply_pending
+from .models import Question, Quiz, QuizResponse
+from .question_fragments import get_question_fragments
+from .quiz_pools import claim_question_set
+from .sampling import draw_question_ids
+from .serializers import QuestionForQuizSerializer
+
+
+# Only the columns needed to render a question for the student
+QUIZ_QUESTION_FIELDS = QuestionForQuizSerializer.Meta.fields
+
+# States of a quiz that can still be resumed (a NULL state counts as started)
+ACTIVE_STATES = ["started", "in_progress"]
+
+
+class QuizAssemblyError(Exception):
+    """
+    The evaluation cannot produce a quiz.
+
+    code is either "no_questions" or "not_enough_questions"; views map it to
+    their own error message.
+    """
+
+    def __init__(self, code, available=0, required=0):
+        super().__init__(code)
+        self.code = code
+        self.available = available
+        self.required = required
+
+
+@dataclass
+class AssembledQuiz:
+    quiz: Quiz
+    # Question rows in the order they were drawn for this quiz
+    questions: list = field(default_factory=list)
+
+
+@dataclass
+class StartedQuiz:
+    quiz: Quiz
+    is_existing: bool
+    # Question rows, in quiz order: drawn by assemble_quiz or loaded with the responses
+    questions: list = field(default_factory=list)
+    # Resumed quizzes: QuizResponse rows (current answers), when loaded
+    responses: list = None
+
+    def questions_payload(self):
+        """Student-facing questions with the current answers."""
+        if self.is_existing:
+            responses = self.responses if self.responses is not None else self.quiz.responses.all()
+            return quiz_questions_payload(self.quiz, responses, questions=self.questions)
+        return build_questions_payload(
+            self.quiz.evaluation_id, [question.id for question in self.questions], questions=self.questions
+        )
+
+
+def sample_question_ids(evaluation):
+    """Draw number_of_question random question ids from the evaluation's bank."""
+    required = evaluation.number_of_question
+    available, question_ids = draw_question_ids(evaluation.id, required)
+
+    if not available:
+        raise QuizAssemblyError("no_questions", available=0, required=required)
+    if available < required:
+        raise QuizAssemblyError("not_enough_questions", available=available, required=required)
+
+    return question_ids
+
+
+def assemble_quiz(evaluation, user, question_ids=None):
+    """
+    Create a started Quiz for user with one empty QuizResponse per question.
+
+    If question_ids is not given, a pre-generated set is claimed from the
+    evaluation's pool (quiz_pools.py) or, failing that, ids are sampled.
+    Returns an AssembledQuiz holding the quiz and the already loaded questions.
+    """
+    with transaction.atomic():
+        if question_ids is not None:
+            questions = _load_questions(question_ids)
+        else:
+            questions = None
+            claimed_ids = claim_question_set(evaluation)
+            if claimed_ids is not None:
+                questions = _load_questions(claimed_ids)
+                if len(questions) != len(claimed_ids):
+                    # Some questions were removed after the set was drawn
+                    questions = None
+            if questions is None:
+                questions = _load_questions(sample_question_ids(evaluation))
+
+        quiz = Quiz.objects.create(evaluation=evaluation, user=user, state="started")
+        QuizResponse.objects.bulk_create(
+            [
+                QuizResponse(quiz=quiz, question_id=question.id, answer=None, score=None, done=None, position=position)
+                for position, question in enumerate(questions)
+            ]
+        )
+
+    return AssembledQuiz(quiz=quiz, questions=questions)
+
+
+def resume_quiz(evaluation, user, load_responses=True):
+    """
+    Active (unfinished) quiz of user on evaluation as a StartedQuiz, or None.
+
+    The quiz is found through the partial index on quiz (evaluationid,
+    userid) WHERE endat IS NULL (exam_app migration 0007). With
+    load_responses its QuizResponse rows and their questions are loaded in
+    one more query, so the question payload needs no further reads.
+    """
+    quiz = (
+        Quiz.objects.filter(evaluation=evaluation, user=user, end_at__isnull=True)
+        .filter(Q(state__in=ACTIVE_STATES) | Q(state__isnull=True))
+        .order_by("-start_at")
+        .first()
+    )
+    if quiz is None:
+        return None
+    if not load_responses:
+        return StartedQuiz(quiz=quiz, is_existing=True)
+
+    responses = list(
+        QuizResponse.objects.filter(quiz=quiz)
+        .select_related("question")
+        .only(
+            "id", "quiz_id", "question_id", "answer", "done", "position",
+            *[f"question__{f}" for f in QUIZ_QUESTION_FIELDS],
+        )
+        .order_by("position", "id")
+    )
+    questions = list({r.question_id: r.question for r in responses}.values())
+    return StartedQuiz(quiz=quiz, is_existing=True, questions=questions, responses=responses)
+
+
+def start_quiz(evaluation, user, load_responses=True):
+    """
+    Resume the active quiz of user on evaluation or assemble a new one.
+    Returns a StartedQuiz; raises QuizAssemblyError.
+    """
+    started = resume_quiz(evaluation, user, load_responses)
+    if started is not None:
+        return started
+    assembled = assemble_quiz(evaluation, user)
+    return StartedQuiz(quiz=assembled.quiz, is_existing=False, questions=assembled.questions)
+
+
+def _load_questions(question_ids):
+    """Question rows for question_ids, in the same order."""
+    questions_by_id = Question.objects.only(*QUIZ_QUESTION_FIELDS).in_bulk(question_ids)
+    return [questions_by_id[q_id] for q_id in question_ids if q_id in questions_by_id]
+
+
+def build_questions_payload(evaluation_id, question_ids, responses=None, questions=None):
+    """
+    Student-facing question payload (without the correct answer) with
+    current_answer/done attached from the given QuizResponse rows.
+
+    Question representations come from the fragment cache
+    (question_fragments.py); questions may hold already loaded rows.
+    """
+    questions_data = get_question_fragments(evaluation_id, question_ids, questions)
+    responses_dict = {r.question_id: r for r in responses or ()}
+
+    for question_data in questions_data:
+        response = responses_dict.get(question_data["id"])
+        question_data["current_answer"] = response.answer if response else None
+        question_data["done"] = response.done if response else None
+
+    return questions_data
+
+
+def response_order(response):
+    """Sort key of a quiz's QuizResponse rows: position, then id (rows without a position last)."""
+    return (response.position is None, response.position or 0, response.id)
+
+
+def quiz_questions_payload(quiz, responses, questions=None):
+    """
+    Question payload of an existing quiz from its QuizResponse rows, with
+    answers still in the write-behind buffer (answer_buffer.py) applied.
+    """
+    responses = apply_pending(quiz.id, sorted(responses, key=response_order))
+    question_ids = list(dict.fromkeys(r.question_id for r in responses))
+    return build_questions_payload(quiz.evaluation_id, question_ids, responses, questions)
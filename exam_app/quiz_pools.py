@@ -0,0 +1,90 @@
+"""
+Pre-generated question sets for scheduled mass exam starts.
+
+Evaluations with an active QuizPool get their question sets drawn ahead of
+time by `manage.py pregenerate_quiz_sets` (run from cron before the exam
+window). Quiz assembly then claims one set with SELECT ... FOR UPDATE SKIP
+LOCKED and deletes it, so concurrent starts never share a set and the
+per-start cost does not depend on the bank size.
+"""
+import random
+
+from django.core.cache import cache
+
+from kebrit_api.models import QuizPool, QuizPoolSet
+from .models import Evaluation, Question
+
+
+POOLED_EVALUATIONS_KEY = "exam:pooled_evaluations"
+POOLED_EVALUATIONS_TTL = 60
+
+
+def pooled_evaluation_ids():
+    """Ids of evaluations with an active pool (cached; one query on a miss)."""
+    ids = cache.get(POOLED_EVALUATIONS_KEY)
+    if ids is None:
+        ids = frozenset(QuizPool.objects.filter(is_active=True).values_list("evaluation_id", flat=True))
+        cache.set(POOLED_EVALUATIONS_KEY, ids, POOLED_EVALUATIONS_TTL)
+    return ids
+
+
+def invalidate_pooled_evaluations():
+    cache.delete(POOLED_EVALUATIONS_KEY)
+
+
+def claim_question_set(evaluation):
+    """
+    Take one pre-generated question set of the evaluation, or None.
+
+    Must run inside the transaction that creates the quiz, so the set is
+    returned to the pool if quiz creation fails.
+    """
+    if evaluation.id not in pooled_evaluation_ids():
+        return None
+
+    question_set = (
+        QuizPoolSet.objects.select_for_update(skip_locked=True)
+        .filter(evaluation_id=evaluation.id)
+        .order_by("id")
+        .first()
+    )
+    if question_set is None:
+        return None
+
+    question_set.delete()
+    if len(question_set.question_ids) != evaluation.number_of_question:
+        # number_of_question changed after the set was drawn
+        return None
+    return list(question_set.question_ids)
+
+
+def discard_question_sets(evaluation_id):
+    """Drop unclaimed sets, e.g. after questions were removed from the bank."""
+    QuizPoolSet.objects.filter(evaluation_id=evaluation_id).delete()
+
+
+def refill_pool(pool, evaluation=None):
+    """
+    Top up a pool to pool.size unclaimed sets. Returns the number of sets created.
+    """
+    evaluation = evaluation or Evaluation.objects.filter(id=pool.evaluation_id).first()
+    if evaluation is None or not evaluation.is_active:
+        return 0
+
+    missing = pool.size - QuizPoolSet.objects.filter(pool=pool).count()
+    required = evaluation.number_of_question
+    if missing <= 0 or required <= 0:
+        return 0
+
+    question_ids = list(Question.objects.filter(evaluation_id=evaluation.id).values_list("id", flat=True))
+    if len(question_ids) < required:
+        return 0
+
+    QuizPoolSet.objects.bulk_create(
+        [
+            QuizPoolSet(pool=pool, evaluation_id=evaluation.id, question_ids=random.sample(question_ids, required))
+            for _ in range(missing)
+        ],
+        batch_size=500,
+    )
+    return missing
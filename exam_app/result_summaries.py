@@ -0,0 +1,129 @@
+"""
+Persisted result summaries of finished quizzes (kebrit_api.QuizResultSummary).
+
+The summary is written by grading.grade_quiz in the same transaction as the
+scores, so get_result and mission_student_report read one row instead of
+recomputing counts from every QuizResponse. With
+EXAM_RESULT_SUMMARY_RESPONSES the serialized response breakdown is frozen
+too. Manual grading (a QuizResponse score change, see signals.py) rebuilds
+the summary; quizzes graded before summaries existed get one on first read.
+"""
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from kebrit_api.models import QuizResultSummary
+from .models import Quiz, QuizResponseEvaluation
+from .serializers import QuizResponseSerializer
+
+
+SUMMARY_FIELDS = [
+    "user_id",
+    "evaluation_id",
+    "total_questions",
+    "correct_answers",
+    "wrong_answers",
+    "percentage",
+    "total_score",
+    "graded_percentage",
+    "responses",
+    "updated_at",
+]
+
+
+def _store_responses():
+    return getattr(settings, "EXAM_RESULT_SUMMARY_RESPONSES", True)
+
+
+def build_summary(quiz, responses, graded_percentage=None):
+    """
+    Unsaved summary of quiz from its QuizResponse rows (with .question
+    loaded when the breakdown is stored).
+    """
+    total_questions = len(responses)
+    correct_count = sum(1 for r in responses if r.score and r.score > 0)
+    total_score = sum(r.score or 0.0 for r in responses)
+
+    return QuizResultSummary(
+        quiz_id=quiz.id,
+        user_id=quiz.user_id,
+        evaluation_id=quiz.evaluation_id,
+        total_questions=total_questions,
+        correct_answers=correct_count,
+        wrong_answers=total_questions - correct_count,
+        percentage=(correct_count / total_questions * 100) if total_questions > 0 else 0,
+        total_score=total_score,
+        graded_percentage=graded_percentage,
+        responses=QuizResponseSerializer(responses, many=True).data if _store_responses() else None,
+    )
+
+
+def save_summaries(summaries):
+    """Create or replace summaries with a single INSERT ... ON CONFLICT (quiz_id) DO UPDATE."""
+    QuizResultSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["quiz_id"],
+        update_fields=SUMMARY_FIELDS,
+    )
+
+
+def store_summary(quiz, responses, graded_percentage=None):
+    """Create or replace the summary of quiz."""
+    summary = build_summary(quiz, responses, graded_percentage)
+    save_summaries([summary])
+    return summary
+
+
+def rebuild_summary(quiz):
+    """Recompute the summary of a finished quiz (quiz or quiz id); None if not finished."""
+    if not isinstance(quiz, Quiz):
+        quiz = Quiz.objects.filter(id=quiz).first()
+    if quiz is None or quiz.end_at is None:
+        return None
+
+    responses = list(quiz.responses.select_related("question").order_by("position", "id"))
+    qre = QuizResponseEvaluation.objects.filter(quiz_id=quiz.id).order_by("-id").only("score").first()
+    return store_summary(quiz, responses, qre.score if qre else None)
+
+
+def graded_percentage(quiz_ref="id"):
+    """
+    Expression for the graded percentage of the quiz at OuterRef(quiz_ref):
+    the stored summary, or the latest report card for quizzes without one.
+    """
+    return Coalesce(
+        Subquery(QuizResultSummary.objects.filter(quiz_id=OuterRef(quiz_ref)).values("graded_percentage")[:1]),
+        Subquery(
+            QuizResponseEvaluation.objects.filter(quiz_id=OuterRef(quiz_ref)).order_by("-id").values("score")[:1]
+        ),
+    )
+
+
+def get_summary(quiz):
+    """Stored summary of a finished quiz, built on first access if missing."""
+    summary = QuizResultSummary.objects.filter(quiz_id=quiz.id).first()
+    return summary or rebuild_summary(quiz)
+
+
+def result_payload(quiz, summary):
+    """get_result response body; quiz must have its evaluation loaded."""
+    responses = summary.responses
+    if responses is None:
+        responses = QuizResponseSerializer(
+            quiz.responses.select_related("question").order_by("position", "id"), many=True
+        ).data
+
+    return {
+        "quiz_id": quiz.id,
+        "total_questions": summary.total_questions,
+        "correct_answers": summary.correct_answers,
+        "wrong_answers": summary.wrong_answers,
+        "percentage": round(summary.percentage, 2),
+        "total_score": round(summary.total_score, 2),
+        "is_accept": quiz.is_accept,
+        "accept_score": quiz.evaluation.accept_score,
+        "start_at": quiz.start_at,
+        "end_at": quiz.end_at,
+        "responses": responses,
+    }
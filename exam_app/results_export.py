@@ -0,0 +1,72 @@
+"""
+Streaming export of an evaluation's quiz results (ClientExamResultsExportView).
+
+Rows come from a single query over a server-side cursor (QuerySet.iterator),
+read in chunks of EXAM_RESULTS_EXPORT_CHUNK_SIZE rows, and are encoded one
+by one as CSV or NDJSON, so memory use does not grow with the cohort size.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Quiz
+from .result_summaries import graded_percentage
+
+
+EXPORT_FIELDS = [
+    "quiz_id",
+    "student_uuid",
+    "mobile",
+    "name",
+    "start_at",
+    "end_at",
+    "state",
+    "score",
+    "percentage",
+    "is_accept",
+]
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+def _chunk_size():
+    return getattr(settings, "EXAM_RESULTS_EXPORT_CHUNK_SIZE", 2000)
+
+
+def iter_result_rows(evaluation_id, company_id):
+    """Finished quizzes of the company's students in an evaluation, as dicts."""
+    return (
+        Quiz.objects.filter(evaluation_id=evaluation_id, user__company_id=company_id, end_at__isnull=False)
+        .annotate(
+            quiz_id=F("id"),
+            student_uuid=F("user__uuid"),
+            mobile=F("user__mobile"),
+            name=F("user__name"),
+            percentage=graded_percentage(),
+        )
+        .order_by("id")
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=_chunk_size())
+    )
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_stream(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
@@ -0,0 +1,74 @@
+"""
+Random question sampling for quiz assembly.
+
+Two strategies, each costing at most one query per draw:
+- small banks: the evaluation's question ids are cached as a compact id
+  array and sampled in memory (no query on a cache hit);
+- large banks (more than EXAM_QUESTION_POOL_MAX_SIZE questions): the draw
+  runs in PostgreSQL with ORDER BY random() LIMIT n, and the same query
+  returns the bank size through a window count.
+
+Cache entries are keyed by the answer-key version stamp, so they are
+invalidated together with it when a Question or Evaluation changes.
+"""
+import random
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Window
+
+from .answer_keys import get_version
+from .models import Question
+
+
+POOL_KEY = "exam:question_pool:{evaluation_id}:{version}"
+SIZE_KEY = "exam:question_bank_size:{evaluation_id}:{version}"
+
+
+def _max_pool_size():
+    return getattr(settings, "EXAM_QUESTION_POOL_MAX_SIZE", 5000)
+
+
+def _pool_ttl():
+    return getattr(settings, "EXAM_QUESTION_POOL_TTL", 3600)
+
+
+def _draw_in_database(evaluation_id, count):
+    """Sample in PostgreSQL; returns (available, ids) from a single query."""
+    rows = list(
+        Question.objects.filter(evaluation_id=evaluation_id)
+        .annotate(bank_size=Window(expression=Count("id")))
+        .order_by("?")
+        .values_list("id", "bank_size")[:count]
+    )
+    available = rows[0][1] if rows else 0
+    return available, [row[0] for row in rows]
+
+
+def draw_question_ids(evaluation_id, count):
+    """
+    Draw count random question ids of an evaluation.
+
+    Returns (available, ids). ids is empty when the bank has fewer than
+    count questions; callers decide how to report that.
+    """
+    version = get_version(evaluation_id)
+    pool_key = POOL_KEY.format(evaluation_id=evaluation_id, version=version)
+    size_key = SIZE_KEY.format(evaluation_id=evaluation_id, version=version)
+
+    pool = cache.get(pool_key)
+    if pool is None:
+        bank_size = cache.get(size_key)
+        if bank_size is not None and bank_size > _max_pool_size():
+            available, ids = _draw_in_database(evaluation_id, count)
+            return available, (ids if available >= count else [])
+
+        pool = array("q", Question.objects.filter(evaluation_id=evaluation_id).values_list("id", flat=True))
+        cache.set(size_key, len(pool), _pool_ttl())
+        if len(pool) <= _max_pool_size():
+            cache.set(pool_key, pool, _pool_ttl())
+
+    if len(pool) < count:
+        return len(pool), []
+    return len(pool), random.sample(pool, count)
@@ -2,13 +2,31 @@ from rest_framework import serializers
 from .models import EvaluationType, Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
 
 
+class ExpandableFieldsMixin:
+    """
+    شکل‌دهی خروجی در endpointهای لیست (ExpandableViewSetMixin در views):
+    - fields: فقط این فیلدها برگردانده می‌شوند (?fields=id,score)
+    - expand: بخش‌های سنگین Meta.expandable_fields فقط با درخواست برگردانده می‌شوند (?expand=evaluation_details)
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = set(expand or ())
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                self.fields.pop(name, None)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class EvaluationTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = EvaluationType
         fields = '__all__'
 
 
-class EvaluationSerializer(serializers.ModelSerializer):
+class EvaluationSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     questions_count = serializers.SerializerMethodField()
     last_score = serializers.SerializerMethodField()
     last_quiz_id = serializers.SerializerMethodField()
@@ -21,6 +39,9 @@ class EvaluationSerializer(serializers.ModelSerializer):
     
     def get_questions_count(self, obj):
         """تعداد سوالات موجود در بانک سوالات این evaluation"""
+        # مقدار محاسبه‌شده در queryset (querysets.annotate_evaluations)
+        if hasattr(obj, 'annotated_questions_count'):
+            return obj.annotated_questions_count
         return obj.questions.count()
     
     def _get_last_quiz_data(self, obj):
@@ -64,6 +85,9 @@ class EvaluationSerializer(serializers.ModelSerializer):
     
     def get_last_score(self, obj):
         """نمره آخرین آزمون کاربر برای این evaluation (percentage)"""
+        if hasattr(obj, 'annotated_last_score'):
+            score = obj.annotated_last_score
+            return round(score, 2) if score is not None else None
         last_evaluation = self._get_last_evaluation_data(obj)
         if last_evaluation and last_evaluation.score is not None:
             return round(last_evaluation.score, 2)
@@ -71,6 +95,8 @@ class EvaluationSerializer(serializers.ModelSerializer):
     
     def get_last_quiz_id(self, obj):
         """شناسه آخرین کوئیز کاربر برای این evaluation"""
+        if hasattr(obj, 'annotated_last_quiz_id'):
+            return obj.annotated_last_quiz_id
         last_evaluation = self._get_last_evaluation_data(obj)
         if last_evaluation:
             return last_evaluation.quiz_id
@@ -78,13 +104,15 @@ class EvaluationSerializer(serializers.ModelSerializer):
     
     def get_last_quiz_state(self, obj):
         """وضعیت آخرین کوئیز کاربر برای این evaluation"""
+        if hasattr(obj, 'annotated_last_quiz_state'):
+            return obj.annotated_last_quiz_state or None
         last_quiz = self._get_last_quiz_data(obj)
         if last_quiz and last_quiz.state:
             return last_quiz.state
         return None
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class QuestionSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Question
         fields = '__all__'
@@ -115,17 +143,33 @@ class QuizSerializer(serializers.ModelSerializer):
     
     def get_questions(self, obj):
         """سوالات انتخاب شده برای این کوئیز"""
-        questions = Question.objects.filter(
-            quiz_responses__quiz=obj
-        ).distinct()
+        # پاسخ‌های از پیش بارگذاری‌شده صفحه (QuizViewSet با ?expand=questions)
+        if hasattr(obj, 'prefetched_responses'):
+            responses = obj.prefetched_responses
+        else:
+            # پیمایش مرتب پاسخ‌ها (ایندکس quiz, position) با یک join به سوال، بدون DISTINCT
+            responses = obj.responses.select_related('question').order_by('position', 'id')
+        questions = list({r.question_id: r.question for r in responses}.values())
         return QuestionForQuizSerializer(questions, many=True).data
     
     def get_responses_count(self, obj):
         """تعداد پاسخ‌های ثبت شده"""
+        if hasattr(obj, 'annotated_responses_count'):
+            return obj.annotated_responses_count
         return obj.responses.count()
 
 
-class QuizResponseSerializer(serializers.ModelSerializer):
+class QuizListSerializer(ExpandableFieldsMixin, QuizSerializer):
+    """
+    نمایش سبک کوئیز در لیست‌ها؛ جزئیات evaluation و سوالات فقط با
+    ?expand=evaluation_details,questions و به صورت دسته‌ای برای کل صفحه بارگذاری می‌شوند.
+    """
+    
+    class Meta(QuizSerializer.Meta):
+        expandable_fields = ['evaluation_details', 'questions']
+
+
+class QuizResponseSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     question_details = QuestionSerializer(source='question', read_only=True)
     
     class Meta:
@@ -147,6 +191,34 @@ class QuizSubmitSerializer(serializers.Serializer):
     responses = QuizResponseSubmitSerializer(many=True, required=True)
 
 
+class QuestionScoreSerializer(serializers.Serializer):
+    """نمره یک سوال تشریحی"""
+    question_id = serializers.IntegerField(required=True)
+    score = serializers.FloatField(required=True, min_value=0)
+
+
+class QuizGradeSerializer(serializers.Serializer):
+    """نمره‌های تصحیح‌کننده برای یک کوئیز"""
+    quiz_id = serializers.IntegerField(required=True)
+    scores = QuestionScoreSerializer(many=True, required=True, allow_empty=False)
+
+
+class QuizBulkGradeSerializer(serializers.Serializer):
+    """Serializer برای ثبت دسته‌ای نمره‌های تصحیح دستی"""
+    grades = QuizGradeSerializer(many=True, required=True, allow_empty=False)
+
+
+class QuizRegradeSerializer(serializers.Serializer):
+    """Serializer برای نمره‌دهی مجدد کوئیزهای تمام‌شده"""
+    evaluation_id = serializers.IntegerField(required=False)
+    quiz_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if not attrs.get('evaluation_id') and not attrs.get('quiz_ids'):
+            raise serializers.ValidationError('evaluation_id یا quiz_ids الزامی است')
+        return attrs
+
+
 class QuizResponseEvaluationSerializer(serializers.ModelSerializer):
     quiz_details = QuizSerializer(source='quiz', read_only=True)
     user_name = serializers.CharField(source='user.name', read_only=True)
@@ -157,6 +229,22 @@ class QuizResponseEvaluationSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'score']
 
 
+class QuizResponseEvaluationListSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    """
+    نمایش سبک کارنامه‌ها در لیست؛ کوئیز (quiz_details) و evaluation آن
+    (evaluation_details) فقط با ?expand= برگردانده می‌شوند.
+    """
+    quiz_details = QuizListSerializer(source='quiz', read_only=True)
+    evaluation_details = EvaluationSerializer(source='quiz.evaluation', read_only=True)
+    user_name = serializers.CharField(source='user.name', read_only=True)
+    
+    class Meta:
+        model = QuizResponseEvaluation
+        fields = '__all__'
+        read_only_fields = ['id', 'score']
+        expandable_fields = ['quiz_details', 'evaluation_details']
+
+
 class QuizResultSerializer(serializers.Serializer):
     """Serializer برای نمایش نتیجه نهایی کوئیز"""
     quiz_id = serializers.IntegerField()
@@ -0,0 +1,47 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from kebrit_api.models import QuizPool
+from .answer_keys import bump_version
+from .models import Evaluation, Question, QuizResponse
+from .quiz_pools import discard_question_sets, invalidate_pooled_evaluations
+from .result_summaries import rebuild_summary
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_answer_key_on_question_change(sender, instance, **kwargs):
+    """تغییر سوال، کلید پاسخ evaluation آن را نامعتبر می‌کند"""
+    bump_version(instance.evaluation_id)
+
+
+@receiver(post_save, sender=Evaluation)
+@receiver(post_delete, sender=Evaluation)
+def invalidate_answer_key_on_evaluation_change(sender, instance, **kwargs):
+    """تغییر evaluation، کلید پاسخ آن را نامعتبر می‌کند"""
+    bump_version(instance.id)
+
+
+@receiver(post_delete, sender=Question)
+def discard_question_sets_on_question_delete(sender, instance, **kwargs):
+    """مجموعه سوال‌های از پیش ساخته شده که شامل سوال حذف شده هستند دور ریخته می‌شوند"""
+    discard_question_sets(instance.evaluation_id)
+
+
+@receiver(post_save, sender=QuizPool)
+@receiver(post_delete, sender=QuizPool)
+def invalidate_pooled_evaluations_on_pool_change(sender, instance, **kwargs):
+    """فعال/غیرفعال شدن pool باید بلافاصله در شروع کوئیزها دیده شود"""
+    invalidate_pooled_evaluations()
+
+
+@receiver(post_save, sender=QuizResponse)
+@receiver(post_delete, sender=QuizResponse)
+def rebuild_result_summary_on_score_change(sender, instance, update_fields=None, **kwargs):
+    """تصحیح دستی نمره یک پاسخ، خلاصه نتیجه کوئیز تمام‌شده را دوباره می‌سازد"""
+    # ذخیره پاسخ در حین آزمون (answer/done) نمره را تغییر نمی‌دهد
+    if update_fields is not None and "score" not in update_fields:
+        return
+    quiz_id = instance.quiz_id
+    transaction.on_commit(lambda: rebuild_summary(quiz_id))
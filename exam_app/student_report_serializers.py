@@ -6,6 +6,23 @@ class MissionReportRequestSerializer(serializers.Serializer):
     erul = serializers.IntegerField(required=True, help_text="شناسه یکتای آزمون (eurl)")
 
 
+class MissionBulkReportRequestSerializer(serializers.Serializer):
+    erul = serializers.IntegerField(required=True, help_text="شناسه یکتای آزمون (eurl)")
+    mobiles = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        max_length=5000,
+        help_text="شماره تلفن دانشجویان",
+    )
+    all_students = serializers.BooleanField(required=False, default=False, help_text="همه دانشجویان شرکت‌کننده در ماموریت")
+
+    def validate(self, attrs):
+        if bool(attrs.get('mobiles')) == attrs['all_students']:
+            raise serializers.ValidationError('دقیقا یکی از mobiles یا all_students باید ارسال شود')
+        return attrs
+
+
 class MissionAttemptSerializer(serializers.Serializer):
     evaluation_id = serializers.IntegerField()
     quiz_id = serializers.IntegerField()
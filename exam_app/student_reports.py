@@ -0,0 +1,145 @@
+"""
+Mission student reports (mission_student_report / mission_students_report).
+
+Attempts of any number of students are read with one query over the
+finished quizzes of the mission's active evaluations, ordered by student,
+with the graded percentage of each quiz computed in the same query
+(result_summaries.graded_percentage). Reports are assembled while the rows
+are streamed, so one student and a whole class cost the same number of
+queries.
+"""
+import json
+from itertools import groupby
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from users_app.models import User
+from .models import Quiz
+from .result_summaries import graded_percentage
+
+
+ATTEMPT_FIELDS = [
+    "user_id",
+    "evaluation_id",
+    "quiz_id",
+    "percentage",
+    "total_score",
+    "is_accept",
+    "accept_score",
+    "start_at",
+    "end_at",
+]
+
+
+def _chunk_size():
+    return getattr(settings, "EXAM_STUDENT_REPORT_CHUNK_SIZE", 2000)
+
+
+def iter_attempt_rows(mission_id, user_ids=None, company_id=None):
+    """
+    Finished quizzes on the mission's active evaluations as dicts, ordered by
+    student and start time. Restricted to user_ids, or to the students of
+    company_id when no ids are given.
+    """
+    queryset = Quiz.objects.filter(
+        evaluation__mission_id=mission_id, evaluation__is_active=True, end_at__isnull=False
+    )
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    else:
+        queryset = queryset.filter(user__company_id=company_id)
+
+    return (
+        queryset.annotate(
+            quiz_id=F("id"),
+            percentage=graded_percentage(),
+            total_score=F("score"),
+            accept_score=F("evaluation__accept_score"),
+        )
+        .order_by("user_id", "start_at", "id")
+        .values(*ATTEMPT_FIELDS)
+        .iterator(chunk_size=_chunk_size())
+    )
+
+
+def _attempt(row):
+    percentage = row["percentage"]
+    total_score = row["total_score"]
+    return {
+        "evaluation_id": row["evaluation_id"],
+        "quiz_id": row["quiz_id"],
+        "percentage": round(percentage, 2) if percentage is not None else None,
+        "total_score": round(total_score, 2) if total_score is not None else None,
+        "is_accept": bool(row["is_accept"]) if row["is_accept"] is not None else None,
+        "accept_score": row["accept_score"],
+        "start_at": row["start_at"],
+        "end_at": row["end_at"],
+    }
+
+
+def student_attempts(mission_id, user_id):
+    """Attempts of one student on a mission."""
+    return [_attempt(row) for row in iter_attempt_rows(mission_id, user_ids=[user_id])]
+
+
+def iter_mission_reports(mission_id, company_id, mobiles=None):
+    """
+    Yield one report per student: {"mission_id", "mobile", "user_id", "attempts"}.
+
+    With mobiles, every requested mobile gets a report, in request order
+    (students without attempts get an empty list, unknown mobiles
+    {"mobile", "error": "not_found"}). Without, every student of the
+    company with at least one attempt is reported.
+    """
+    if mobiles is None:
+        users = None
+        user_ids = None
+    else:
+        users = {
+            mobile: user_id
+            for mobile, user_id in User.objects.filter(company_id=company_id, mobile__in=mobiles).values_list(
+                "mobile", "id"
+            )
+        }
+        user_ids = list(users.values())
+
+    rows = iter_attempt_rows(mission_id, user_ids=user_ids, company_id=company_id)
+
+    if users is None:
+        # Mobiles of the reported students, in one query
+        mobiles_by_id = dict(
+            User.objects.filter(company_id=company_id, quizzes__evaluation__mission_id=mission_id)
+            .distinct()
+            .values_list("id", "mobile")
+        )
+        for user_id, user_rows in groupby(rows, key=lambda row: row["user_id"]):
+            yield {
+                "mission_id": mission_id,
+                "mobile": mobiles_by_id.get(user_id),
+                "user_id": user_id,
+                "attempts": [_attempt(row) for row in user_rows],
+            }
+        return
+
+    attempts = {}
+    for user_id, user_rows in groupby(rows, key=lambda row: row["user_id"]):
+        attempts[user_id] = [_attempt(row) for row in user_rows]
+
+    for mobile in dict.fromkeys(mobiles):
+        user_id = users.get(mobile)
+        if user_id is None:
+            yield {"mission_id": mission_id, "mobile": mobile, "error": "not_found"}
+            continue
+        yield {
+            "mission_id": mission_id,
+            "mobile": mobile,
+            "user_id": user_id,
+            "attempts": attempts.get(user_id, []),
+        }
+
+
+def ndjson_stream(reports):
+    for report in reports:
+        yield json.dumps(report, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
@@ -1,11 +1,27 @@
+import json
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from unittest import skipUnless
+
+from django.test import override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 
 from users_app.models import Company, User
 from roadmap_app.models import Mission
-from exam_app.models import EvaluationType, Evaluation, Quiz, QuizResponseEvaluation
-from kebrit_api.models import ClientApiToken
+from exam_app.models import EvaluationType, Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
+from exam_app import answer_buffer, expiry, grading_queue, item_analysis, launch_tokens
+from exam_app.answer_keys import clear_local_cache, get_answer_key
+from exam_app.question_fragments import get_question_fragments
+from exam_app.quiz_assembly import assemble_quiz, resume_quiz
+from exam_app.quiz_pools import claim_question_set, refill_pool
+from exam_app.sampling import draw_question_ids
+from kebrit_api.models import ClientApiToken, ExamLaunch, GradingJob, QuizPool, QuizPoolSet, QuizResultSummary
 
 
 class MissionStudentReportAPITests(APITestCase):
@@ -126,6 +142,89 @@ class MissionStudentReportAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class MissionStudentsBulkReportAPITests(APITestCase):
+    """
+    کارنامه دسته‌ای دانشجویان یک ماموریت:
+    POST /api/mission-student-report/bulk/
+    """
+
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Bulk Report Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Bulk Report Token")
+        self.students = [
+            User.objects.create(
+                uuid=f"bulk-report-uuid-{i}",
+                username=f"bulk-report-student-{i}",
+                company=self.company,
+                mobile=f"0912000000{i}",
+            )
+            for i in range(4)
+        ]
+        self.mission = Mission.objects.create(
+            company=self.company,
+            user=self.students[0],
+            type="A",
+            title="Bulk Report Mission",
+            content="Test content",
+            mo=True,
+            point=100,
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Bulk Report Evaluation",
+            type=self.eval_type,
+            accept_score=60,
+            number_of_question=10,
+            mission=self.mission,
+            user=self.students[0],
+        )
+        # سه دانشجوی اول هر کدام دو کوئیز تمام‌شده دارند، دانشجوی چهارم هیچ
+        for student in self.students[:3]:
+            for score in (40.0, 80.0):
+                quiz = Quiz.objects.create(
+                    evaluation=self.evaluation, user=student, score=score / 5, is_accept=score >= 60, state="completed"
+                )
+                Quiz.objects.filter(id=quiz.id).update(end_at=quiz.start_at)
+                QuizResponseEvaluation.objects.create(user=student, quiz=quiz, score=score)
+
+        self.url = "/api/mission-student-report/bulk/"
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+
+    def test_mobiles_report_within_query_budget(self):
+        mobiles = [s.mobile for s in self.students] + ["09999999999"]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {"erul": self.evaluation.id, "mobiles": mobiles}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        data = response.json()
+        self.assertEqual(data["not_found"], ["09999999999"])
+        self.assertEqual([r["mobile"] for r in data["reports"]], [s.mobile for s in self.students])
+        self.assertEqual([a["percentage"] for a in data["reports"][0]["attempts"]], [40.0, 80.0])
+        self.assertEqual(data["reports"][3]["attempts"], [])
+
+    def test_all_students_streamed_as_ndjson(self):
+        response = self.client.post(
+            self.url + "?output=ndjson", {"erul": self.evaluation.id, "all_students": True}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({line["user_id"] for line in lines}, {s.id for s in self.students[:3]})
+        self.assertTrue(all(len(line["attempts"]) == 2 for line in lines))
+
+    def test_mobiles_and_all_students_are_exclusive(self):
+        response = self.client.post(
+            self.url, {"erul": self.evaluation.id, "mobiles": ["09120000000"], "all_students": True}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class UserMissionsAPITests(APITestCase):
     """
     تست ساده برای endpoint:
@@ -170,3 +269,1018 @@ class UserMissionsAPITests(APITestCase):
         self.assertIn("completed_missions", data)
         self.assertIn("available_missions", data)
         self.assertIn("stats", data)
+
+
+class QuizStartQueryBudgetTests(APITestCase):
+    """
+    تعداد query های شروع کوئیز نباید با تعداد سوالات رشد کند:
+    POST /api/quizzes/start/
+    """
+
+    # سقف ثابت query ها (نمونه‌گیری، ساخت کوئیز، bulk insert و serialize)
+    QUERY_BUDGET = 20
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Budget Company")
+        self.student = User.objects.create(
+            uuid="budget-uuid",
+            username="budget-student",
+            company=self.company,
+            mobile="09121111111",
+            name="Budget Student",
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Budget Evaluation",
+            type=self.eval_type,
+            accept_score=60,
+            number_of_question=30,
+            user=self.student,
+        )
+        for i in range(40):
+            Question.objects.create(
+                evaluation=self.evaluation,
+                description=f"Question {i}",
+                type=True,
+                c1="1", c2="2", c3="3", c4="4",
+                correct=1,
+            )
+
+        self.client.force_authenticate(user=self.student)
+        self.url = "/api/quizzes/start/"
+
+    def test_question_order_is_stable_across_reloads(self):
+        first = self.client.post(self.url, {"evaluation_id": self.evaluation.id}, format="json").json()
+        quiz_id = first["quiz"]["id"]
+
+        positions = list(QuizResponse.objects.filter(quiz_id=quiz_id).order_by("position").values_list("position", flat=True))
+        self.assertEqual(positions, list(range(self.evaluation.number_of_question)))
+
+        again = self.client.post(self.url, {"evaluation_id": self.evaluation.id}, format="json").json()
+        self.assertEqual([q["id"] for q in again["questions"]], [q["id"] for q in first["questions"]])
+
+    def test_resume_loads_quiz_questions_and_answers_in_two_queries(self):
+        first = self.client.post(self.url, {"evaluation_id": self.evaluation.id}, format="json").json()
+        response = QuizResponse.objects.filter(quiz_id=first["quiz"]["id"]).order_by("id").first()
+        QuizResponse.objects.filter(id=response.id).update(answer="2")
+
+        with CaptureQueriesContext(connection) as ctx:
+            started = resume_quiz(self.evaluation, self.student)
+            questions = started.questions_payload()
+
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(started.quiz.id, first["quiz"]["id"])
+        self.assertEqual(len(questions), self.evaluation.number_of_question)
+        self.assertEqual(questions[0]["current_answer"], "2")
+
+    def test_start_quiz_stays_within_query_budget(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {"evaluation_id": self.evaluation.id}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+
+        data = response.json()
+        self.assertEqual(len(data["questions"]), self.evaluation.number_of_question)
+        self.assertEqual(
+            QuizResponse.objects.filter(quiz_id=data["quiz"]["id"]).count(),
+            self.evaluation.number_of_question,
+        )
+        # پاسخ صحیح نباید در payload دانشجو باشد
+        self.assertNotIn("correct", data["questions"][0])
+
+
+class ClientExamLaunchTests(APITestCase):
+    """
+    شروع آزمون توسط مشتری بدون درخواست داخلی به /api/quizzes/start/:
+    POST /api/integration/exams/launch/
+    """
+
+    QUERY_BUDGET = 20
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Launch Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Launch Token")
+        self.owner = User.objects.create(
+            uuid="launch-owner-uuid", username="launch-owner", company=self.company, mobile="09120000001"
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Launch Evaluation", type=self.eval_type, accept_score=60, number_of_question=5, user=self.owner
+        )
+        for i in range(5):
+            Question.objects.create(evaluation=self.evaluation, description=f"Question {i}", type=True, correct=1)
+
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+        self.url = "/api/integration/exams/launch/"
+        self.payload = {
+            "student_uuid": "launch-student-uuid",
+            "mobile": "09120000002",
+            "eurl": self.evaluation.id,
+            "callback_url": "https://client.example.com/callback",
+        }
+
+    def test_launch_starts_quiz_once_and_resumes_it(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, self.payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        data = response.json()
+        self.assertFalse(data["is_existing_quiz"])
+        self.assertEqual(QuizResponse.objects.filter(quiz_id=data["quiz_id"]).count(), 5)
+
+        again = self.client.post(self.url, self.payload, format="json").json()
+        self.assertTrue(again["is_existing_quiz"])
+        self.assertEqual(again["quiz_id"], data["quiz_id"])
+        self.assertEqual(Quiz.objects.filter(evaluation=self.evaluation).count(), 1)
+
+
+class QuizSubmitGradingTests(APITestCase):
+    """
+    نمره‌دهی دسته‌ای در:
+    POST /api/quizzes/submit/
+    """
+
+    QUERY_BUDGET = 15
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Grading Company")
+        self.student = User.objects.create(
+            uuid="grading-uuid",
+            username="grading-student",
+            company=self.company,
+            mobile="09122222222",
+            name="Grading Student",
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Grading Evaluation",
+            type=self.eval_type,
+            accept_score=50,
+            number_of_question=20,
+            user=self.student,
+        )
+        self.quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+        self.questions = []
+        for i in range(20):
+            question = Question.objects.create(
+                evaluation=self.evaluation,
+                description=f"Question {i}",
+                type=True,
+                c1="1", c2="2", c3="3", c4="4",
+                correct=2,
+                weight=1.0,
+            )
+            QuizResponse.objects.create(quiz=self.quiz, question=question)
+            self.questions.append(question)
+
+        self.client.force_authenticate(user=self.student)
+        self.url = "/api/quizzes/submit/"
+
+    def test_submit_grades_in_fixed_number_of_queries(self):
+        # ۱۵ پاسخ درست و ۵ پاسخ غلط
+        responses = [
+            {"question_id": q.id, "answer": "2" if i < 15 else "3", "done": "completed"}
+            for i, q in enumerate(self.questions)
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {"quiz_id": self.quiz.id, "responses": responses}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+
+        result = response.json()["result"]
+        self.assertEqual(result["correct_answers"], 15)
+        self.assertEqual(result["wrong_answers"], 5)
+        self.assertEqual(result["percentage"], 75.0)
+        self.assertTrue(result["is_accept"])
+        self.assertEqual(len(result["responses"]), 20)
+
+        self.quiz.refresh_from_db()
+        self.assertIsNotNone(self.quiz.end_at)
+        self.assertEqual(self.quiz.score, 15.0)
+        self.assertEqual(QuizResponseEvaluation.objects.get(quiz=self.quiz).score, 75.0)
+
+    def test_result_summary_is_frozen_on_submit_and_rebuilt_on_manual_grading(self):
+        responses = [{"question_id": q.id, "answer": "2", "done": "completed"} for q in self.questions]
+        self.client.post(self.url, {"quiz_id": self.quiz.id, "responses": responses}, format="json")
+
+        summary = QuizResultSummary.objects.get(quiz_id=self.quiz.id)
+        self.assertEqual(summary.correct_answers, 20)
+        self.assertEqual(summary.graded_percentage, 100.0)
+        self.assertEqual(len(summary.responses), 20)
+
+        result = self.client.get(f"/api/quizzes/{self.quiz.id}/result/").json()
+        self.assertEqual(result["correct_answers"], 20)
+        self.assertEqual(len(result["responses"]), 20)
+
+        # تصحیح دستی نمره یک پاسخ
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz_response = QuizResponse.objects.get(quiz=self.quiz, question=self.questions[0])
+            quiz_response.score = 0.0
+            quiz_response.save()
+
+        summary.refresh_from_db()
+        self.assertEqual(summary.correct_answers, 19)
+        self.assertEqual(summary.total_score, 19.0)
+
+    def test_submit_with_missing_answers_returns_400(self):
+        responses = [{"question_id": self.questions[0].id, "answer": "2"}]
+
+        response = self.client.post(self.url, {"quiz_id": self.quiz.id, "responses": responses}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.quiz.refresh_from_db()
+        self.assertIsNone(self.quiz.end_at)
+
+
+class LaunchAnswersBatchTests(APITestCase):
+    """
+    ذخیره دسته‌ای پاسخ‌ها در:
+    POST /api/quiz/<quiz_id>/answers/
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Autosave Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Autosave Token")
+        self.student = User.objects.create(
+            uuid="autosave-uuid",
+            username="autosave-student",
+            company=self.company,
+            mobile="09123333333",
+            name="Autosave Student",
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Autosave Evaluation",
+            type=self.eval_type,
+            number_of_question=3,
+            user=self.student,
+        )
+        self.quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+        self.questions = []
+        for i in range(3):
+            question = Question.objects.create(evaluation=self.evaluation, description=f"Question {i}", type=True)
+            QuizResponse.objects.create(quiz=self.quiz, question=question)
+            self.questions.append(question)
+
+        ExamLaunch.objects.create(
+            company_id=self.company.id,
+            student_id=self.student.id,
+            student_uuid=self.student.uuid,
+            student_mobile=self.student.mobile,
+            eurl=self.evaluation.id,
+            quiz_id=self.quiz.id,
+            callback_url="https://example.com/callback",
+        )
+
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+        self.url = f"/api/quiz/{self.quiz.id}/answers/"
+
+    def test_batch_saves_answers_and_reports_per_item_status(self):
+        answers = [
+            {"question_id": self.questions[0].id, "answer": "1", "done": "in_progress"},
+            {"question_id": self.questions[1].id, "answer": ""},
+            {"question_id": self.questions[0].id, "answer": "3", "done": "completed"},
+            {"question_id": 999999, "answer": "2"},
+        ]
+
+        response = self.client.post(self.url, {"answers": answers}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["saved"], 3)
+        self.assertEqual(data["failed"], 1)
+        self.assertEqual(data["results"][3], {"question_id": 999999, "status": "not_in_quiz"})
+
+        first = QuizResponse.objects.get(quiz=self.quiz, question=self.questions[0])
+        self.assertEqual(first.answer, "3")
+        self.assertEqual(first.done, "completed")
+        self.assertIsNone(QuizResponse.objects.get(quiz=self.quiz, question=self.questions[1]).answer)
+
+    @override_settings(EXAM_ANSWER_BUFFER_ENABLED=True)
+    def test_buffered_answers_are_coalesced_and_flushed(self):
+        question = self.questions[0]
+        for answer in ("1", "2", "4"):
+            response = self.client.post(
+                self.url, {"answers": [{"question_id": question.id, "answer": answer}]}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # هنوز چیزی در دیتابیس نوشته نشده است
+        self.assertIsNone(QuizResponse.objects.get(quiz=self.quiz, question=question).answer)
+        self.assertEqual(answer_buffer.pending_answers(self.quiz.id), {question.id: ("4", None)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(answer_buffer.flush_quiz(self.quiz.id), 1)
+        self.assertEqual(QuizResponse.objects.get(quiz=self.quiz, question=question).answer, "4")
+        self.assertEqual(answer_buffer.pending_answers(self.quiz.id), {})
+
+    @override_settings(EXAM_ANSWER_BUFFER_ENABLED=True)
+    def test_buffered_answers_are_kept_when_flush_is_rolled_back(self):
+        question = self.questions[0]
+        self.client.post(self.url, {"answers": [{"question_id": question.id, "answer": "2"}]}, format="json")
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                answer_buffer.flush_quiz(self.quiz.id)
+                raise RuntimeError("rollback")
+
+        self.assertIsNone(QuizResponse.objects.get(quiz=self.quiz, question=question).answer)
+        self.assertEqual(answer_buffer.pending_answers(self.quiz.id), {question.id: ("2", None)})
+
+    @override_settings(EXAM_ANSWER_BUFFER_ENABLED=True)
+    def test_only_the_first_buffered_write_takes_the_index_lock(self):
+        question = self.questions[0]
+        index_lock = answer_buffer.LOCK_KEY.format(key=answer_buffer.INDEX_KEY)
+        self.client.post(self.url, {"answers": [{"question_id": question.id, "answer": "1"}]}, format="json")
+
+        cache.add(index_lock, 1, answer_buffer.LOCK_TIMEOUT)
+        try:
+            self.client.post(self.url, {"answers": [{"question_id": question.id, "answer": "2"}]}, format="json")
+            self.assertEqual(answer_buffer.pending_answers(self.quiz.id), {question.id: ("2", None)})
+
+            with self.captureOnCommitCallbacks(execute=True):
+                answer_buffer.flush_quiz(self.quiz.id)
+            # بافر جدید بدون قفل index ساخته نمی‌شود و پاسخ مستقیم در دیتابیس نوشته می‌شود
+            self.client.post(self.url, {"answers": [{"question_id": question.id, "answer": "3"}]}, format="json")
+        finally:
+            cache.delete(index_lock)
+
+        self.assertEqual(answer_buffer.pending_answers(self.quiz.id), {})
+        self.assertEqual(QuizResponse.objects.get(quiz=self.quiz, question=question).answer, "3")
+
+
+class LaunchTokenTests(APITestCase):
+    """
+    توکن امضاشده launch در:
+    GET /api/quiz/<quiz_id>/?launch=<token>
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Launch Token Company")
+        self.student = User.objects.create(
+            uuid="launch-token-uuid",
+            username="launch-token-student",
+            company=self.company,
+            mobile="09125555555",
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Launch Token Evaluation", type=self.eval_type, number_of_question=1, user=self.student
+        )
+        self.quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+        self.question = Question.objects.create(
+            evaluation=self.evaluation, description="Question", type=True, c1="1", c2="2", correct=1
+        )
+        QuizResponse.objects.create(quiz=self.quiz, question=self.question)
+        self.launch = ExamLaunch.objects.create(
+            company_id=self.company.id,
+            student_id=self.student.id,
+            student_uuid=self.student.uuid,
+            student_mobile=self.student.mobile,
+            eurl=self.evaluation.id,
+            quiz_id=self.quiz.id,
+            callback_url="https://example.com/callback",
+        )
+        self.token = launch_tokens.issue(self.launch)
+        self.url = f"/api/quiz/{self.quiz.id}/"
+
+    def test_token_is_verified_without_launch_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"launch": self.token})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["launch_id"], str(self.launch.uuid))
+        self.assertFalse(any("exam_launch" in q["sql"] for q in ctx.captured_queries))
+
+    def test_legacy_launch_uuid_still_accepted(self):
+        response = self.client.get(self.url, {"launch": str(self.launch.uuid)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tampered_expired_or_foreign_token_is_rejected(self):
+        other_quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+
+        self.assertEqual(self.client.get(self.url, {"launch": self.token + "x"}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            self.client.get(f"/api/quiz/{other_quiz.id}/", {"launch": self.token}).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        with override_settings(EXAM_LAUNCH_TOKEN_TTL=-1):
+            self.assertEqual(self.client.get(self.url, {"launch": self.token}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_token_is_rejected_after_submit(self):
+        responses = [{"question_id": self.question.id, "answer": "1", "done": "completed"}]
+        response = self.client.post(
+            f"{self.url}submit/?launch={self.token}", {"responses": responses}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.client.get(self.url, {"launch": self.token}).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GradingQueueTests(APITestCase):
+    """
+    صف نمره‌دهی سوالات تشریحی:
+    POST /api/quizzes/grade/ و grading_worker
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Grading Queue Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Grading Queue Token")
+        self.student = User.objects.create(
+            uuid="grading-queue-uuid",
+            username="grading-queue-student",
+            company=self.company,
+            mobile="09124444444",
+            name="Grading Queue Student",
+        )
+        self.eval_type = EvaluationType.objects.create(id=2, title="Descriptive")
+        self.evaluation = Evaluation.objects.create(
+            title="Descriptive Evaluation",
+            type=self.eval_type,
+            accept_score=50,
+            number_of_question=2,
+            user=self.student,
+        )
+        self.quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+        self.questions = []
+        for i in range(2):
+            question = Question.objects.create(
+                evaluation=self.evaluation, description=f"Question {i}", type=False, weight=2.0
+            )
+            QuizResponse.objects.create(quiz=self.quiz, question=question)
+            self.questions.append(question)
+
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+
+    def test_posted_scores_are_applied_by_worker(self):
+        student_client = APIClient()
+        student_client.force_authenticate(user=self.student)
+        responses = [{"question_id": q.id, "answer": "متن پاسخ", "done": "completed"} for q in self.questions]
+        student_client.post("/api/quizzes/submit/", {"quiz_id": self.quiz.id, "responses": responses}, format="json")
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.state, "pending")
+
+        grades = [{
+            "quiz_id": self.quiz.id,
+            "scores": [{"question_id": q.id, "score": 2.0} for q in self.questions],
+        }]
+        response = self.client.post("/api/quizzes/grade/", {"grades": grades}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        self.assertEqual(grading_queue.run_once(), 1)
+
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.state, "completed")
+        self.assertEqual(self.quiz.score, 4.0)
+        self.assertTrue(self.quiz.is_accept)
+        self.assertEqual(QuizResponseEvaluation.objects.get(quiz=self.quiz).score, 100.0)
+        self.assertEqual(QuizResultSummary.objects.get(quiz_id=self.quiz.id).total_score, 4.0)
+
+    def test_bad_job_only_fails_its_own_quiz(self):
+        self.quiz.end_at = timezone.now()
+        self.quiz.state = "pending"
+        self.quiz.save()
+        bad_quiz = Quiz.objects.create(
+            evaluation=self.evaluation, user=self.student, state="pending", end_at=timezone.now()
+        )
+        bad_question = self.questions[0]
+        QuizResponse.objects.create(quiz=bad_quiz, question=bad_question)
+
+        good_job, = grading_queue.enqueue(
+            [self.quiz.id], scores={self.quiz.id: {q.id: 2.0 for q in self.questions}}, finalize=True
+        )
+        # نمره غیرعددی: نمره‌دهی همین کوئیز خطا می‌دهد
+        bad_job, = grading_queue.enqueue([bad_quiz.id], scores={bad_quiz.id: {bad_question.id: "bad"}}, finalize=True)
+
+        self.assertEqual(grading_queue.run_once(), 2)
+
+        good_job.refresh_from_db()
+        bad_job.refresh_from_db()
+        self.assertEqual(good_job.state, GradingJob.STATE_DONE)
+        self.assertEqual(bad_job.state, GradingJob.STATE_QUEUED)
+        self.assertIn("TypeError", bad_job.error)
+        self.quiz.refresh_from_db()
+        self.assertEqual((self.quiz.state, self.quiz.score), ("completed", 4.0))
+
+    def test_grade_rejects_unfinished_quiz(self):
+        grades = [{"quiz_id": self.quiz.id, "scores": [{"question_id": self.questions[0].id, "score": 1.0}]}]
+
+        response = self.client.post("/api/quizzes/grade/", {"grades": grades}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ClientExamResultsExportTests(APITestCase):
+    """
+    خروجی stream نتایج:
+    GET /api/integration/exams/<eurl>/results/export/
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Export Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Export Token")
+        self.other_company = Company.objects.create(name="Other Company")
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        owner = User.objects.create(uuid="export-owner", username="export-owner", company=self.company, mobile="09125555550")
+        self.evaluation = Evaluation.objects.create(
+            title="Export Evaluation",
+            type=self.eval_type,
+            accept_score=50,
+            number_of_question=1,
+            user=owner,
+            is_active=True,
+        )
+
+        self.quizzes = []
+        for i, company in enumerate([self.company, self.company, self.other_company]):
+            student = User.objects.create(
+                uuid=f"export-{i}", username=f"export-{i}", company=company, mobile=f"0912555555{i + 1}"
+            )
+            quiz = Quiz.objects.create(evaluation=self.evaluation, user=student, state="completed", score=1.0, is_accept=True)
+            Quiz.objects.filter(id=quiz.id).update(end_at=quiz.start_at)
+            QuizResponseEvaluation.objects.create(user=student, quiz=quiz, score=100.0)
+            self.quizzes.append(quiz)
+
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+        self.url = f"/api/integration/exams/{self.evaluation.id}/results/export/"
+
+    def test_csv_export_streams_only_company_results(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b"".join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(lines[0].split(","), ["quiz_id", "student_uuid", "mobile", "name", "start_at", "end_at",
+                                               "state", "score", "percentage", "is_accept"])
+        self.assertEqual([int(line.split(",")[0]) for line in lines[1:]], [q.id for q in self.quizzes[:2]])
+
+    def test_ndjson_export(self):
+        response = self.client.get(self.url, {"output": "ndjson"})
+
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["percentage"], 100.0)
+
+
+class QuizExpiryTests(APITestCase):
+    """
+    پایان خودکار کوئیزهای منقضی (manage.py expire_quizzes)
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Expiry Company")
+        self.student = User.objects.create(
+            uuid="expiry-uuid", username="expiry-student", company=self.company, mobile="09126666666"
+        )
+        self.eval_type = EvaluationType.objects.create(id=1, title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Expiry Evaluation",
+            type=self.eval_type,
+            accept_score=50,
+            number_of_question=2,
+            duration=30,
+            user=self.student,
+        )
+        self.quiz = Quiz.objects.create(evaluation=self.evaluation, user=self.student, state="started")
+        for i in range(2):
+            question = Question.objects.create(evaluation=self.evaluation, description=f"Q{i}", type=True, correct=1)
+            QuizResponse.objects.create(quiz=self.quiz, question=question, answer="1" if i == 0 else None)
+        self.launch = ExamLaunch.objects.create(
+            company_id=self.company.id,
+            student_id=self.student.id,
+            student_uuid=self.student.uuid,
+            student_mobile=self.student.mobile,
+            eurl=self.evaluation.id,
+            quiz_id=self.quiz.id,
+            callback_url="https://example.com/callback",
+        )
+
+    def test_expired_quiz_is_submitted_with_saved_answers(self):
+        Quiz.objects.filter(id=self.quiz.id).update(start_at=timezone.now() - timedelta(hours=1))
+
+        stats = expiry.sweep(batch_size=10)
+
+        self.assertEqual(stats.quizzes, 1)
+        self.assertEqual(stats.backlog, 0)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.state, "completed")
+        self.assertEqual(self.quiz.end_at, self.quiz.start_at + timedelta(minutes=30))
+        self.assertEqual(self.quiz.score, 1.0)
+        self.launch.refresh_from_db()
+        self.assertEqual(self.launch.percentage, 50.0)
+        self.assertIsNotNone(self.launch.completed_at)
+
+    @override_settings(EXAM_ANSWER_BUFFER_ENABLED=True)
+    def test_quiz_with_busy_answer_buffer_is_left_for_next_sweep(self):
+        Quiz.objects.filter(id=self.quiz.id).update(start_at=timezone.now() - timedelta(hours=1))
+        unanswered = QuizResponse.objects.get(quiz=self.quiz, answer__isnull=True)
+        answer_buffer.buffer_answers(self.quiz.id, [{"question_id": unanswered.question_id, "answer": "1"}])
+
+        buffer_lock = answer_buffer.LOCK_KEY.format(key=answer_buffer.BUFFER_KEY.format(quiz_id=self.quiz.id))
+        cache.add(buffer_lock, 1, answer_buffer.LOCK_TIMEOUT)
+        try:
+            self.assertEqual(expiry.sweep().quizzes, 0)
+        finally:
+            cache.delete(buffer_lock)
+        self.quiz.refresh_from_db()
+        self.assertIsNone(self.quiz.end_at)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expiry.sweep().quizzes, 1)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.score, 2.0)
+
+    def test_quiz_within_duration_is_left_open(self):
+        self.assertEqual(expiry.sweep().quizzes, 0)
+        self.quiz.refresh_from_db()
+        self.assertIsNone(self.quiz.end_at)
+
+
+@skipUnless(item_analysis.is_available(), "numpy is not installed")
+class ItemAnalysisTests(APITestCase):
+    """
+    تحلیل سوالات:
+    GET /api/evaluations/<id>/item-analysis/
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Analysis Company")
+        self.owner = User.objects.create(uuid="analysis-owner", username="analysis-owner", company=self.company, mobile="09126666660")
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluation = Evaluation.objects.create(
+            title="Analysis Evaluation",
+            type=self.eval_type,
+            accept_score=50,
+            number_of_question=1,
+            user=self.owner,
+        )
+        self.question = Question.objects.create(
+            evaluation=self.evaluation, description="Q", type=True, c1="1", c2="2", c3="3", c4="4", correct=2
+        )
+        self.client.force_authenticate(user=self.owner)
+        self.url = f"/api/evaluations/{self.evaluation.id}/item-analysis/"
+
+    def _finish_quiz(self, index, answer):
+        student = User.objects.create(
+            uuid=f"analysis-{index}", username=f"analysis-{index}", company=self.company, mobile=f"0912666666{index}"
+        )
+        quiz = Quiz.objects.create(evaluation=self.evaluation, user=student, state="completed")
+        QuizResponse.objects.create(quiz=quiz, question=self.question, answer=answer, score=1.0 if answer == "2" else 0.0)
+        Quiz.objects.filter(id=quiz.id).update(end_at=quiz.start_at)
+
+    def test_statistics_are_refreshed_with_new_quizzes(self):
+        self._finish_quiz(1, "2")
+        self._finish_quiz(2, "3")
+
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["quizzes"], 2)
+        question = data["questions"][0]
+        self.assertEqual(question["difficulty"], 0.5)
+        self.assertEqual(question["options"], {"1": 0, "2": 1, "3": 1, "4": 0})
+
+        self._finish_quiz(3, "2")
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["quizzes"], 3)
+        self.assertEqual(data["questions"][0]["options"]["2"], 2)
+
+
+class EvaluationListQueryBudgetTests(APITestCase):
+    """
+    لیست ارزیابی‌ها بدون N+1:
+    GET /api/evaluations/
+    """
+
+    QUERY_BUDGET = 5
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Listing Company")
+        self.student = User.objects.create(
+            uuid="listing-uuid", username="listing-student", company=self.company, mobile="09127777777"
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.evaluations = []
+        for i in range(10):
+            evaluation = Evaluation.objects.create(
+                title=f"Listing Evaluation {i}",
+                type=self.eval_type,
+                accept_score=50,
+                number_of_question=2,
+                user=self.student,
+            )
+            for j in range(i % 3 + 1):
+                Question.objects.create(evaluation=evaluation, description=f"Q{j}", type=True, correct=1)
+            self.evaluations.append(evaluation)
+
+        self.quiz = Quiz.objects.create(evaluation=self.evaluations[0], user=self.student, state="completed")
+        Quiz.objects.filter(id=self.quiz.id).update(end_at=self.quiz.start_at)
+        QuizResponseEvaluation.objects.create(user=self.student, quiz=self.quiz, score=87.5)
+
+        self.client.force_authenticate(user=self.student)
+
+    def test_list_stays_within_query_budget(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/evaluations/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+
+        rows = {row["id"]: row for row in response.json()["results"]}
+        self.assertEqual(rows[self.evaluations[2].id]["questions_count"], 3)
+        first = rows[self.evaluations[0].id]
+        self.assertEqual(first["last_score"], 87.5)
+        self.assertEqual(first["last_quiz_id"], self.quiz.id)
+        self.assertEqual(first["last_quiz_state"], "completed")
+        self.assertIsNone(rows[self.evaluations[1].id]["last_quiz_id"])
+
+
+class QuizListExpandTests(APITestCase):
+    """
+    نمایش سبک لیست کوئیزها و ?expand= / ?fields=:
+    GET /api/quizzes/
+    """
+
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.company = Company.objects.create(name="Quiz List Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Quiz List Token")
+        self.student = User.objects.create(
+            uuid="quiz-list-uuid", username="quiz-list-student", company=self.company, mobile="09128888888"
+        )
+        self.eval_type = EvaluationType.objects.create(title="Quiz")
+        self.quizzes = []
+        for i in range(5):
+            evaluation = Evaluation.objects.create(
+                title=f"Quiz List Evaluation {i}",
+                type=self.eval_type,
+                accept_score=50,
+                number_of_question=2,
+                user=self.student,
+            )
+            quiz = Quiz.objects.create(evaluation=evaluation, user=self.student, state="started")
+            for j in range(2):
+                question = Question.objects.create(evaluation=evaluation, description=f"Q{j}", type=True, correct=1)
+                QuizResponse.objects.create(quiz=quiz, question=question)
+            self.quizzes.append(quiz)
+
+        self.client.credentials(HTTP_X_CLIENT_TOKEN=str(self.client_token.uuid))
+
+    def test_list_is_slim_by_default(self):
+        response = self.client.get("/api/quizzes/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        row = response.json()["results"][0]
+        self.assertNotIn("evaluation_details", row)
+        self.assertNotIn("questions", row)
+        self.assertEqual(row["responses_count"], 2)
+
+    def test_expanded_list_stays_within_query_budget(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/quizzes/?expand=evaluation_details,questions")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+
+        rows = {row["id"]: row for row in response.json()["results"]}
+        first = rows[self.quizzes[0].id]
+        self.assertEqual(first["evaluation_details"]["questions_count"], 2)
+        self.assertEqual(len(first["questions"]), 2)
+
+    def test_fields_limits_the_representation(self):
+        response = self.client.get("/api/quizzes/?fields=id,state")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()["results"][0]), {"id", "state"})
+
+
+class AnswerKeyCacheTests(APITestCase):
+    """
+    کش کلید پاسخ با ذخیره/حذف سوال نامعتبر می‌شود.
+    """
+
+    def setUp(self):
+        clear_local_cache()
+        self.company = Company.objects.create(name="Key Company")
+        self.owner = User.objects.create(
+            uuid="key-uuid",
+            username="key-owner",
+            company=self.company,
+            mobile="09123333333",
+            name="Key Owner",
+        )
+        self.evaluation = Evaluation.objects.create(
+            title="Key Evaluation",
+            accept_score=50,
+            number_of_question=1,
+            user=self.owner,
+        )
+        self.question = Question.objects.create(
+            evaluation=self.evaluation,
+            description="Question",
+            type=True,
+            correct=2,
+            weight=3.0,
+        )
+
+    def test_answer_key_is_cached_and_invalidated_on_question_save(self):
+        key = get_answer_key(self.evaluation.id)
+        entry = key.get(self.question.id)
+        self.assertEqual((entry.type, entry.correct, entry.weight), (True, 2, 3.0))
+        self.assertIsNone(key.get(self.question.id + 1000))
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_answer_key(self.evaluation.id), key)
+
+        self.question.correct = 4
+        self.question.save()
+
+        self.assertEqual(get_answer_key(self.evaluation.id).get(self.question.id).correct, 4)
+
+    def test_answer_key_drops_deleted_question(self):
+        get_answer_key(self.evaluation.id)
+        question_id = self.question.id
+        self.question.delete()
+
+        self.assertNotIn(question_id, get_answer_key(self.evaluation.id))
+
+
+class QuestionFragmentCacheTests(APITestCase):
+    """
+    fragment های سریال‌شده سوال کش می‌شوند و با ذخیره سوال نامعتبر می‌شوند.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Fragment Company")
+        self.owner = User.objects.create(
+            uuid="fragment-uuid",
+            username="fragment-owner",
+            company=self.company,
+            mobile="09124444444",
+            name="Fragment Owner",
+        )
+        self.evaluation = Evaluation.objects.create(
+            title="Fragment Evaluation",
+            accept_score=50,
+            number_of_question=1,
+            user=self.owner,
+        )
+        self.question = Question.objects.create(
+            evaluation=self.evaluation,
+            description="Old text",
+            type=True,
+            correct=1,
+        )
+
+    def test_fragments_are_cached_and_refreshed_on_question_save(self):
+        fragments = get_question_fragments(self.evaluation.id, [self.question.id])
+        self.assertEqual(fragments[0]["description"], "Old text")
+        self.assertNotIn("correct", fragments[0])
+
+        with self.assertNumQueries(0):
+            get_question_fragments(self.evaluation.id, [self.question.id])
+
+        self.question.description = "New text"
+        self.question.save()
+
+        fragments = get_question_fragments(self.evaluation.id, [self.question.id])
+        self.assertEqual(fragments[0]["description"], "New text")
+
+
+class QuestionSamplingTests(APITestCase):
+    """
+    انتخاب تصادفی سوالات (sampling.draw_question_ids) از حافظه و از دیتابیس.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Sampling Company")
+        self.owner = User.objects.create(
+            uuid="sampling-uuid",
+            username="sampling-owner",
+            company=self.company,
+            mobile="09125555556",
+            name="Sampling Owner",
+        )
+        self.evaluation = Evaluation.objects.create(
+            title="Sampling Evaluation",
+            accept_score=50,
+            number_of_question=3,
+            user=self.owner,
+        )
+        self.question_ids = [
+            Question.objects.create(evaluation=self.evaluation, description=f"Question {i}", type=True).id
+            for i in range(5)
+        ]
+
+    def test_draw_returns_required_distinct_ids(self):
+        available, ids = draw_question_ids(self.evaluation.id, 3)
+
+        self.assertEqual(available, 5)
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(set(ids) <= set(self.question_ids))
+
+        # بانک سوال کش شده است
+        with self.assertNumQueries(0):
+            self.assertEqual(len(set(draw_question_ids(self.evaluation.id, 5)[1])), 5)
+
+    def test_small_bank_reports_available(self):
+        self.assertEqual(draw_question_ids(self.evaluation.id, 8), (5, []))
+
+    @override_settings(EXAM_QUESTION_POOL_MAX_SIZE=2)
+    def test_large_bank_is_sampled_in_database(self):
+        # فراخوانی اول اندازه بانک را کش می‌کند، بعدی‌ها در دیتابیس انتخاب می‌کنند
+        draw_question_ids(self.evaluation.id, 3)
+
+        with self.assertNumQueries(1):
+            available, ids = draw_question_ids(self.evaluation.id, 3)
+        self.assertEqual(available, 5)
+        self.assertEqual(len(set(ids)), 3)
+        self.assertTrue(set(ids) <= set(self.question_ids))
+
+        self.assertEqual(draw_question_ids(self.evaluation.id, 8), (5, []))
+
+
+class QuizPoolTests(APITestCase):
+    """
+    مجموعه سوالات از پیش ساخته (quiz_pools): برداشت، بازگشت به انتخاب تصادفی و پر کردن دوباره.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Pool Company")
+        self.owner = User.objects.create(
+            uuid="pool-uuid",
+            username="pool-owner",
+            company=self.company,
+            mobile="09125555557",
+            name="Pool Owner",
+        )
+        self.evaluation = Evaluation.objects.create(
+            title="Pool Evaluation",
+            accept_score=50,
+            number_of_question=2,
+            user=self.owner,
+        )
+        self.question_ids = [
+            Question.objects.create(evaluation=self.evaluation, description=f"Question {i}", type=True).id
+            for i in range(4)
+        ]
+        self.pool = QuizPool.objects.create(evaluation_id=self.evaluation.id, size=2)
+
+    def test_refill_tops_pool_back_up(self):
+        self.assertEqual(refill_pool(self.pool), 2)
+        self.assertEqual(refill_pool(self.pool), 0)
+
+        for question_set in QuizPoolSet.objects.filter(pool=self.pool):
+            self.assertEqual(len(set(question_set.question_ids)), 2)
+            self.assertTrue(set(question_set.question_ids) <= set(self.question_ids))
+
+        with transaction.atomic():
+            claim_question_set(self.evaluation)
+        self.assertEqual(refill_pool(self.pool), 1)
+        self.assertEqual(QuizPoolSet.objects.filter(pool=self.pool).count(), 2)
+
+    def test_claimed_set_is_used_once(self):
+        refill_pool(self.pool)
+        drawn = [list(ids) for ids in QuizPoolSet.objects.order_by("id").values_list("question_ids", flat=True)]
+
+        with transaction.atomic():
+            claimed = [claim_question_set(self.evaluation) for _ in range(3)]
+
+        self.assertEqual(claimed, drawn + [None])
+        self.assertFalse(QuizPoolSet.objects.filter(pool=self.pool).exists())
+
+    def test_quiz_start_falls_back_to_sampling_when_pool_is_empty(self):
+        refill_pool(self.pool)
+        drawn = list(QuizPoolSet.objects.order_by("id").values_list("question_ids", flat=True)[0])
+
+        pooled = assemble_quiz(self.evaluation, self.owner)
+        self.assertEqual([question.id for question in pooled.questions], drawn)
+
+        QuizPoolSet.objects.filter(pool=self.pool).delete()
+        sampled = assemble_quiz(self.evaluation, self.owner)
+        self.assertEqual(len({question.id for question in sampled.questions}), 2)
+        self.assertEqual(QuizResponse.objects.filter(quiz=sampled.quiz).count(), 2)
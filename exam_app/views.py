@@ -1,30 +1,70 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.response import Response
-from django.utils import timezone
 from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.db.models import Q
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
-import random
 from .models import EvaluationType, Evaluation, Question, Quiz, QuizResponse, QuizResponseEvaluation
 from .serializers import (
     EvaluationTypeSerializer, EvaluationSerializer, QuestionSerializer, QuizSerializer,
     QuizResponseSerializer, QuizResponseEvaluationSerializer,
-    QuestionForQuizSerializer, QuizSubmitSerializer, QuizResultSerializer
+    QuizSubmitSerializer, QuizResultSerializer, QuizBulkGradeSerializer, QuizRegradeSerializer,
+    ExpandableFieldsMixin, QuizListSerializer, QuizResponseEvaluationListSerializer
 )
+from .grading import GradingError, grade_quiz
+from .grading_queue import enqueue, post_scores
+from . import item_analysis, launch_tokens
+from .querysets import annotate_evaluations, annotate_quizzes, annotate_report_cards
+from .quiz_assembly import QuizAssemblyError, quiz_questions_payload, start_quiz
+from .result_summaries import get_summary, result_payload
+from .student_reports import iter_mission_reports, ndjson_stream, student_attempts
 from .student_report_serializers import (
     MissionReportRequestSerializer,
+    MissionBulkReportRequestSerializer,
     MissionReportSerializer,
     MissionAttemptSerializer,
 )
 from users_app.permissions import CompanyPermission
+from users_app.principal import get_principal
 from kebrit_api.authentication_client import ClientTokenAuthentication
 from kebrit_api.permissions import IsClientTokenAuthenticated
+from kebrit_api.tracing import sampled, trace
 from users_app.models import User
 from roadmap_app.models import Mission
 
 
+class ExpandableViewSetMixin:
+    """
+    پشتیبانی از ?fields= و ?expand= در درخواست‌های GET برای serializerهای ExpandableFieldsMixin
+    و serializer جداگانه (سبک) برای action لیست.
+    """
+    list_serializer_class = None
+    
+    def _query_param_list(self, name):
+        value = self.request.query_params.get(name, '')
+        return [item.strip() for item in value.split(',') if item.strip()]
+    
+    def requested_fields(self):
+        return self._query_param_list('fields')
+    
+    def requested_expand(self):
+        return set(self._query_param_list('expand'))
+    
+    def get_serializer_class(self):
+        if self.action == 'list' and self.list_serializer_class is not None:
+            return self.list_serializer_class
+        return super().get_serializer_class()
+    
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if self.request.method == 'GET' and issubclass(serializer_class, ExpandableFieldsMixin):
+            kwargs.setdefault('fields', self.requested_fields())
+            kwargs.setdefault('expand', self.requested_expand())
+        return super().get_serializer(*args, **kwargs)
+
+
 @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'), name='list')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='POST'), name='create')
 @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'), name='retrieve')
@@ -49,7 +89,7 @@ class EvaluationTypeViewSet(viewsets.ModelViewSet):
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PUT'), name='update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PATCH'), name='partial_update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='DELETE'), name='destroy')
-class EvaluationViewSet(viewsets.ModelViewSet):
+class EvaluationViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = Evaluation.objects.select_related('type', 'mission', 'mission__company', 'user', 'user__company').all()
     serializer_class = EvaluationSerializer
     permission_classes = [CompanyPermission]
@@ -57,8 +97,11 @@ class EvaluationViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         # فیلتر فقط بر اساس شرکت توکن مشتری
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
+        # تعداد سوالات و آخرین کوئیز کاربر در همان query صفحه محاسبه می‌شوند (بدون N+1)
+        queryset = annotate_evaluations(queryset, self.request.user)
         # مرتب‌سازی برای جلوگیری از warning pagination
         queryset = queryset.order_by('-create_at', '-id')
         return queryset
@@ -101,6 +144,28 @@ class EvaluationViewSet(viewsets.ModelViewSet):
             'questions': serializer.data
         }, status=status.HTTP_200_OK)
 
+    
+    @action(detail=True, methods=['get'], url_path='item-analysis')
+    @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'))
+    def item_analysis(self, request, pk=None):
+        """
+        تحلیل کیفیت سوالات یک Evaluation بر اساس کوئیزهای تمام‌شده
+        
+        برای هر سوال: درجه سختی (difficulty)، ضریب تمیز (discrimination)،
+        توزیع گزینه‌ها و کارایی گزینه‌های انحرافی (distractors).
+        
+        URL: GET /api/evaluations/{id}/item-analysis/
+        """
+        evaluation = self.get_object()
+        
+        if not item_analysis.is_available():
+            return Response(
+                {'error': 'تحلیل سوالات در این سرور فعال نیست (numpy نصب نشده است)'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        
+        return Response(item_analysis.get_item_analysis(evaluation.id), status=status.HTTP_200_OK)
+
 
 @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'), name='list')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='POST'), name='create')
@@ -108,15 +173,16 @@ class EvaluationViewSet(viewsets.ModelViewSet):
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PUT'), name='update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PATCH'), name='partial_update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='DELETE'), name='destroy')
-class QuestionViewSet(viewsets.ModelViewSet):
+class QuestionViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = Question.objects.select_related('evaluation', 'evaluation__user', 'evaluation__user__company').all()
     serializer_class = QuestionSerializer
     permission_classes = [CompanyPermission]
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(evaluation__user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(evaluation__user__company_id=principal.company_id)
         return queryset
 
 
@@ -126,16 +192,21 @@ class QuestionViewSet(viewsets.ModelViewSet):
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PUT'), name='update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PATCH'), name='partial_update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='DELETE'), name='destroy')
-class QuizViewSet(viewsets.ModelViewSet):
+class QuizViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = Quiz.objects.select_related('evaluation', 'evaluation__user', 'evaluation__user__company', 'user', 'user__company').all()
     serializer_class = QuizSerializer
+    list_serializer_class = QuizListSerializer
     authentication_classes = [ClientTokenAuthentication]
     permission_classes = [CompanyPermission]
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
+        if self.action == 'list':
+            # نمایش سبک؛ بخش‌های درخواست‌شده با ?expand= برای کل صفحه یکجا بارگذاری می‌شوند
+            queryset = annotate_quizzes(queryset, self.request.user, self.requested_expand())
         # مرتب‌سازی به ترتیب جدیدترین به قدیمی‌ترین بر اساس start_at
         queryset = queryset.order_by('-start_at')
         return queryset
@@ -189,114 +260,47 @@ class QuizViewSet(viewsets.ModelViewSet):
             )
         
         # بررسی دسترسی کاربر
-        if hasattr(request.user, 'company_id'):
-            user_roles = request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                if evaluation.user and evaluation.user.company_id != request.user.company_id:
-                    return Response(
-                        {'error': 'دسترسی به این evaluation ندارید'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
+        principal = get_principal(request)
+        if principal.is_authenticated and not principal.is_admin:
+            if evaluation.user and evaluation.user.company_id != principal.company_id:
+                return Response(
+                    {'error': 'دسترسی به این evaluation ندارید'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
         
-        # بررسی اینکه آیا کوئیز فعال دیگری برای این کاربر و evaluation وجود دارد
-        active_quiz = Quiz.objects.filter(
-            evaluation=evaluation,
-            user=request.user,
-            state__in=['started', 'in_progress', None]
-        ).exclude(end_at__isnull=False).prefetch_related('responses', 'responses__question').first()
-        
-        # اگر کوئیز فعال وجود دارد، همان را برمی‌گردانیم
-        if active_quiz:
-            # دریافت سوالات کوئیز فعال
-            quiz_questions = Question.objects.filter(
-                quiz_responses__quiz=active_quiz
-            ).distinct()
-            
-            # دریافت پاسخ‌های فعلی کاربر
-            responses = active_quiz.responses.all()
-            responses_dict = {r.question_id: {'answer': r.answer, 'done': r.done} for r in responses}
+        # کوئیز فعال بازگردانده می‌شود؛ در غیر این صورت کوئیز جدید با تعداد ثابتی query ساخته می‌شود
+        try:
+            started = start_quiz(evaluation, request.user)
             
-            # آماده‌سازی سوالات با پاسخ‌های فعلی
-            questions_data = QuestionForQuizSerializer(quiz_questions, many=True).data
-            for question_data in questions_data:
-                question_id = question_data['id']
-                if question_id in responses_dict:
-                    question_data['current_answer'] = responses_dict[question_id]['answer']
-                    question_data['done'] = responses_dict[question_id]['done']
-                else:
-                    question_data['current_answer'] = None
-                    question_data['done'] = None
+            # سوالات (از کش fragment ها) همراه با پاسخ‌های فعلی کاربر
+            serializer = self.get_serializer(started.quiz)
+            if started.is_existing:
+                return Response({
+                    'quiz': serializer.data,
+                    'questions': started.questions_payload(),
+                    'message': 'کوئیز فعال شما بازگردانده شد',
+                    'is_existing': True
+                }, status=status.HTTP_200_OK)
             
-            # بازگرداندن کوئیز فعال
-            serializer = self.get_serializer(active_quiz)
             return Response({
                 'quiz': serializer.data,
-                'questions': questions_data,
-                'message': 'کوئیز فعال شما بازگردانده شد',
-                'is_existing': True
-            }, status=status.HTTP_200_OK)
-        
-        # دریافت سوالات مربوط به این evaluation
-        available_questions = Question.objects.filter(evaluation=evaluation)
-        
-        if not available_questions.exists():
-            return Response(
-                {'error': 'هیچ سوالی برای این evaluation وجود ندارد'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        number_of_questions = evaluation.number_of_question
-        
-        if available_questions.count() < number_of_questions:
+                'questions': started.questions_payload(),
+                'message': 'کوئیز با موفقیت ایجاد شد',
+                'is_existing': False
+            }, status=status.HTTP_201_CREATED)
+                
+        except QuizAssemblyError as e:
+            if e.code == 'no_questions':
+                return Response(
+                    {'error': 'هیچ سوالی برای این evaluation وجود ندارد'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
                 {
-                    'error': f'تعداد سوالات موجود ({available_questions.count()}) کمتر از تعداد مورد نیاز ({number_of_questions}) است'
+                    'error': f'تعداد سوالات موجود ({e.available}) کمتر از تعداد مورد نیاز ({e.required}) است'
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # انتخاب تصادفی سوالات
-        selected_questions = random.sample(
-            list(available_questions.values_list('id', flat=True)),
-            number_of_questions
-        )
-        
-        try:
-            with transaction.atomic():
-                # ایجاد کوئیز
-                quiz = Quiz.objects.create(
-                    evaluation=evaluation,
-                    user=request.user,
-                    state='started'
-                )
-                
-                # ایجاد رکوردهای QuizResponse برای هر سوال (بدون پاسخ)
-                quiz_responses = []
-                for question_id in selected_questions:
-                    question = Question.objects.get(id=question_id)
-                    quiz_response = QuizResponse.objects.create(
-                        quiz=quiz,
-                        question=question,
-                        answer=None,
-                        score=None
-                    )
-                    quiz_responses.append(quiz_response)
-                
-                # بازگرداندن کوئیز با سوالات
-                serializer = self.get_serializer(quiz)
-                questions_data = QuestionForQuizSerializer(
-                    Question.objects.filter(id__in=selected_questions),
-                    many=True
-                ).data
-                
-                return Response({
-                    'quiz': serializer.data,
-                    'questions': questions_data,
-                    'message': 'کوئیز با موفقیت ایجاد شد',
-                    'is_existing': False
-                }, status=status.HTTP_201_CREATED)
-                
         except Exception as e:
             return Response(
                 {'error': f'خطا در ایجاد کوئیز: {str(e)}'},
@@ -365,16 +369,14 @@ class QuizViewSet(viewsets.ModelViewSet):
             )
         
         # بررسی دسترسی به آزمون شرکت
-        if hasattr(request.user, 'company_id'):
-            user_roles = request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                # بررسی اینکه evaluation متعلق به همان شرکت باشد
-                if quiz.evaluation.user and quiz.evaluation.user.company_id != request.user.company_id:
-                    return Response(
-                        {'error': 'شما دسترسی به آزمون این شرکت ندارید'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
+        principal = get_principal(request)
+        if principal.is_authenticated and not principal.is_admin:
+            # بررسی اینکه evaluation متعلق به همان شرکت باشد
+            if quiz.evaluation.user and quiz.evaluation.user.company_id != principal.company_id:
+                return Response(
+                    {'error': 'شما دسترسی به آزمون این شرکت ندارید'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
         
         # بررسی اینکه کوئیز قبلاً تمام نشده باشد
         if quiz.end_at is not None:
@@ -383,153 +385,28 @@ class QuizViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # بررسی اینکه تمام سوالات کوئیز پاسخ داده شده باشند
-        quiz_questions = Question.objects.filter(
-            quiz_responses__quiz=quiz
-        ).distinct()
-        
-        if len(responses_data) != quiz_questions.count():
-            return Response(
-                {
-                    'error': f'تعداد پاسخ‌های ارسالی ({len(responses_data)}) با تعداد سوالات ({quiz_questions.count()}) مطابقت ندارد'
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
+        # نمره‌دهی دسته‌ای: بارگذاری کلید پاسخ و پاسخ‌ها در دو query و یک bulk_update
         try:
             with transaction.atomic():
-                total_score = 0.0
-                correct_count = 0
-                wrong_count = 0
-                multiple_choice_count = 0  # تعداد سوالات چندگزینه‌ای
-                
-                # پردازش هر پاسخ
-                for response_data in responses_data:
-                    question_id = response_data['question_id']
-                    student_answer = response_data.get('answer')
-                    done = response_data.get('done', 'completed')
-                    
-                    try:
-                        question = Question.objects.get(id=question_id, evaluation=quiz.evaluation)
-                    except Question.DoesNotExist:
-                        continue
-                    
-                    # پیدا کردن QuizResponse مربوطه
-                    quiz_response = QuizResponse.objects.filter(
-                        quiz=quiz,
-                        question=question
-                    ).first()
-                    
-                    # اگر QuizResponse وجود نداشته باشد، آن را ایجاد می‌کنیم
-                    if not quiz_response:
-                        quiz_response = QuizResponse.objects.create(
-                            quiz=quiz,
-                            question=question,
-                            answer=None,
-                            score=None,
-                            done=None
-                        )
-                    
-                    # محاسبه نمره بر اساس نوع سوال
-                    is_correct = False
-                    score = 0.0
-                    
-                    if question.type:  # سوال چندگزینه‌ای (type = True)
-                        multiple_choice_count += 1
-                        # تبدیل answer به integer برای مقایسه
-                        try:
-                            student_answer_int = int(student_answer) if student_answer is not None and student_answer != '' else None
-                        except (ValueError, TypeError):
-                            student_answer_int = None
-                        
-                        if student_answer_int is not None and question.correct is not None:
-                            if student_answer_int == question.correct:
-                                is_correct = True
-                                correct_count += 1
-                                # استفاده از weight اگر وجود داشته باشد، در غیر این صورت 1
-                                score = question.weight if question.weight else 1.0
-                            else:
-                                wrong_count += 1
-                        
-                        # ذخیره answer به صورت string (برای سازگاری)
-                        quiz_response.answer = str(student_answer_int) if student_answer_int is not None else None
-                    else:  # سوال تشریحی (type = False)
-                        # برای سوالات تشریحی، answer به صورت text ذخیره می‌شود
-                        # نمره به صورت دستی توسط مدرس داده می‌شود، پس فعلاً 0 می‌گذاریم
-                        quiz_response.answer = student_answer if student_answer else None
-                        score = 0.0  # نمره باید بعداً توسط مدرس تعیین شود
-                        # برای سوالات تشریحی، correct_count و wrong_count را افزایش نمی‌دهیم
-                    
-                    # به‌روزرسانی QuizResponse
-                    quiz_response.score = score
-                    quiz_response.done = done
-                    quiz_response.save()
-                    
-                    total_score += score
-                
-                # محاسبه درصد (فقط برای سوالات چندگزینه‌ای)
-                # اگر سوالات تشریحی وجود داشته باشند، فقط سوالات چندگزینه‌ای در محاسبه درصد در نظر گرفته می‌شوند
-                percentage = (correct_count / multiple_choice_count * 100) if multiple_choice_count > 0 else 0
-                
-                # تعداد کل سوالات
-                total_questions = quiz_questions.count()
-                
-                # بررسی قبولی
-                is_accept = percentage >= quiz.evaluation.accept_score if quiz.evaluation.accept_score else False
-                
-                # به‌روزرسانی کوئیز
-                quiz.end_at = timezone.now()
-                quiz.score = total_score
-                quiz.is_accept = is_accept
-                print(quiz.evaluation.type.id)
-                if (quiz.evaluation.type.id == 1 or quiz.evaluation.type.id == 3):
-                    quiz.state = 'completed'
-                elif (quiz.evaluation.type.id == 2 or quiz.evaluation.type.id == 4):
-                    quiz.state = 'pending'
-                quiz.save()
-                
-                # ایجاد QuizResponseEvaluation برای کل کوئیز (کارنامه کلی آزمون)
-                # score در اینجا percentage است
-                QuizResponseEvaluation.objects.update_or_create(
-                    user=request.user,
-                    quiz=quiz,
-                    defaults={'score': round(percentage, 2)}
-                )
-                
-                # اگر کاربر در آزمون قبول شده باشد، MissionResult را ثبت می‌کنیم
-                if is_accept and quiz.evaluation.mission:
-                    from roadmap_app.models import MissionResult
-                    MissionResult.objects.update_or_create(
-                        mission=quiz.evaluation.mission,
-                        user=request.user,
-                        quiz_id=quiz.id,
-                        defaults={
-                            'state': 'completed',
-                            'user_grant': None,
-                        }
-                    )
-                
-                # دریافت تمام پاسخ‌های به‌روزرسانی شده
-                quiz_responses = QuizResponse.objects.filter(quiz=quiz).select_related('question')
+                result = grade_quiz(quiz, responses_data)
                 
                 # آماده‌سازی نتیجه
-                result_data = {
-                    'quiz_id': quiz.id,
-                    'total_questions': total_questions,
-                    'correct_answers': correct_count,
-                    'wrong_answers': wrong_count,
-                    'percentage': round(percentage, 2),
-                    'total_score': round(total_score, 2),
-                    'is_accept': is_accept,
-                    'accept_score': quiz.evaluation.accept_score,
-                    'responses': QuizResponseSerializer(quiz_responses, many=True).data
-                }
+                result_data = result.as_dict()
+                result_data['accept_score'] = quiz.evaluation.accept_score
                 
                 return Response({
                     'message': 'پاسخ‌های کوئیز با موفقیت ثبت شد',
                     'result': result_data
                 }, status=status.HTTP_200_OK)
                 
+        except GradingError as e:
+            # تمام سوالات کوئیز باید پاسخ داده شده باشند
+            return Response(
+                {
+                    'error': f'تعداد پاسخ‌های ارسالی ({e.submitted}) با تعداد سوالات ({e.expected}) مطابقت ندارد'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
             return Response(
                 {'error': f'خطا در ثبت پاسخ‌ها: {str(e)}'},
@@ -542,41 +419,23 @@ class QuizViewSet(viewsets.ModelViewSet):
         """
         دریافت سوالات یک کوئیز فعال
         """
-        # #region agent log
-        import json
-        try:
-            with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                log_entry = json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "D",
-                    "location": "views.py:547",
-                    "message": "get_questions called",
-                    "data": {
-                        "quiz_id": pk,
-                        "has_launch_id": bool(request.GET.get('launch_id')),
-                        "launch_id": request.GET.get('launch_id'),
-                        "has_token_query": bool(request.GET.get('token')),
-                        "has_auth_header": bool(request.META.get('HTTP_AUTHORIZATION')),
-                        "auth_header_preview": request.META.get('HTTP_AUTHORIZATION', '')[:50] if request.META.get('HTTP_AUTHORIZATION') else None,
-                        "has_user": hasattr(request, 'user'),
-                        "user_type": type(request.user).__name__ if hasattr(request, 'user') else None,
-                        "user_id": getattr(request.user, 'id', None) if hasattr(request, 'user') else None,
-                        "user_has_id_attr": hasattr(request.user, 'id') if hasattr(request, 'user') else False,
-                        "is_authenticated": getattr(request.user, 'is_authenticated', False) if hasattr(request, 'user') else False,
-                        "has_auth_company": hasattr(request, 'auth_company') and bool(request.auth_company),
-                        "request_auth": str(type(request.auth)) if hasattr(request, 'auth') else None
-                    },
-                    "timestamp": int(__import__('time').time() * 1000)
-                }) + "\n"
-                f.write(log_entry)
-        except Exception:
-            pass
-        # #endregion
+        if sampled(request):
+            trace(
+                request,
+                "get_questions called",
+                quiz_id=pk,
+                has_launch_id=bool(request.GET.get('launch_id')),
+                has_token_query=bool(request.GET.get('token')),
+                has_auth_header=bool(request.META.get('HTTP_AUTHORIZATION')),
+                user_type=type(request.user).__name__,
+                user_id=getattr(request.user, 'id', None),
+                is_authenticated=getattr(request.user, 'is_authenticated', False),
+                has_auth_company=bool(getattr(request, 'auth_company', None)),
+            )
         
         try:
             quiz = Quiz.objects.select_related('evaluation', 'user', 'user__company').prefetch_related(
-                'responses', 'responses__question'
+                'responses'
             ).get(id=pk)
         except Quiz.DoesNotExist:
             return Response(
@@ -588,57 +447,20 @@ class QuizViewSet(viewsets.ModelViewSet):
         launch_id = request.GET.get('launch_id')
         if launch_id:
             try:
-                from kebrit_api.models import ExamLaunch
-                launch = ExamLaunch.objects.get(uuid=launch_id, quiz_id=quiz.id)
+                # توکن امضاشده launch بدون query بررسی می‌شود؛ UUID قدیمی از ExamLaunch خوانده می‌شود
+                launch = launch_tokens.resolve(launch_id, quiz.id)
                 # اگر launch پیدا شد و متعلق به این quiz است، اجازه دسترسی بده
-                # #region agent log
-                try:
-                    with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                        log_entry = json.dumps({
-                            "sessionId": "debug-session",
-                            "runId": "run1",
-                            "hypothesisId": "D",
-                            "location": "views.py:594",
-                            "message": "Launch-based access granted",
-                            "data": {
-                                "launch_id": str(launch_id),
-                                "quiz_id": quiz.id,
-                                "launch_quiz_id": launch.quiz_id
-                            },
-                            "timestamp": int(__import__('time').time() * 1000)
-                        }) + "\n"
-                        f.write(log_entry)
-                except Exception:
-                    pass
-                # #endregion
+                trace(request, "Launch-based access granted", quiz_id=quiz.id, launch_quiz_id=launch.quiz_id)
                 # اگر launch پیدا شد، نیازی به بررسی احراز هویت نیست - مستقیماً به ادامه برو
             except Exception as e:
-                # #region agent log
-                try:
-                    with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                        log_entry = json.dumps({
-                            "sessionId": "debug-session",
-                            "runId": "run1",
-                            "hypothesisId": "D",
-                            "location": "views.py:616",
-                            "message": "Launch not found, checking auth",
-                            "data": {
-                                "launch_id": str(launch_id),
-                                "quiz_id": quiz.id,
-                                "error": str(e)
-                            },
-                            "timestamp": int(__import__('time').time() * 1000)
-                        }) + "\n"
-                        f.write(log_entry)
-                except Exception:
-                    pass
-                # #endregion
+                trace(request, "Launch not found, checking auth", quiz_id=quiz.id, error=str(e))
                 # اگر launch پیدا نشد، به بررسی‌های معمول برو
                 # بررسی دسترسی - پشتیبانی از هر دو نوع احراز هویت (JWT و ClientToken)
                 # اگر با ClientToken احراز هویت شده باشد
-                if hasattr(request, 'auth_company') and request.auth_company:
+                principal = get_principal(request)
+                if principal.is_client:
                     # بررسی اینکه کوئیز متعلق به همان شرکت مشتری باشد
-                    if quiz.user.company_id != request.auth_company.id:
+                    if quiz.user.company_id != principal.company_id:
                         return Response(
                             {'error': 'دسترسی به این کوئیز ندارید'},
                             status=status.HTTP_403_FORBIDDEN
@@ -647,14 +469,11 @@ class QuizViewSet(viewsets.ModelViewSet):
                 elif hasattr(request.user, 'id'):
                     # بررسی دسترسی کاربر عادی
                     if quiz.user_id != request.user.id:
-                        if hasattr(request.user, 'company_id'):
-                            user_roles = request.user.user_roles.all()
-                            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-                            if not is_admin:
-                                return Response(
-                                    {'error': 'دسترسی به این کوئیز ندارید'},
-                                    status=status.HTTP_403_FORBIDDEN
-                                )
+                        if principal.is_authenticated and not principal.is_admin:
+                            return Response(
+                                {'error': 'دسترسی به این کوئیز ندارید'},
+                                status=status.HTTP_403_FORBIDDEN
+                            )
                 else:
                     # اگر هیچ نوع احراز هویتی وجود نداشت
                     return Response(
@@ -664,9 +483,10 @@ class QuizViewSet(viewsets.ModelViewSet):
         else:
             # بررسی دسترسی - پشتیبانی از هر دو نوع احراز هویت (JWT و ClientToken)
             # اگر با ClientToken احراز هویت شده باشد
-            if hasattr(request, 'auth_company') and request.auth_company:
+            principal = get_principal(request)
+            if principal.is_client:
                 # بررسی اینکه کوئیز متعلق به همان شرکت مشتری باشد
-                if quiz.user.company_id != request.auth_company.id:
+                if quiz.user.company_id != principal.company_id:
                     return Response(
                         {'error': 'دسترسی به این کوئیز ندارید'},
                         status=status.HTTP_403_FORBIDDEN
@@ -675,14 +495,11 @@ class QuizViewSet(viewsets.ModelViewSet):
             elif hasattr(request.user, 'id'):
                 # بررسی دسترسی کاربر عادی
                 if quiz.user_id != request.user.id:
-                    if hasattr(request.user, 'company_id'):
-                        user_roles = request.user.user_roles.all()
-                        is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-                        if not is_admin:
-                            return Response(
-                                {'error': 'دسترسی به این کوئیز ندارید'},
-                                status=status.HTTP_403_FORBIDDEN
-                            )
+                    if principal.is_authenticated and not principal.is_admin:
+                        return Response(
+                            {'error': 'دسترسی به این کوئیز ندارید'},
+                            status=status.HTTP_403_FORBIDDEN
+                        )
             else:
                 # اگر هیچ نوع احراز هویتی وجود نداشت
                 return Response(
@@ -690,26 +507,8 @@ class QuizViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
         
-        # دریافت سوالات کوئیز
-        questions = Question.objects.filter(
-            quiz_responses__quiz=quiz
-        ).distinct()
-        
-        questions_data = QuestionForQuizSerializer(questions, many=True).data
-        
-        # دریافت پاسخ‌های فعلی (اگر وجود داشته باشند)
-        responses = quiz.responses.all()
-        responses_dict = {r.question_id: {'answer': r.answer, 'done': r.done} for r in responses}
-        
-        # اضافه کردن وضعیت پاسخ به هر سوال
-        for question_data in questions_data:
-            question_id = question_data['id']
-            if question_id in responses_dict:
-                question_data['current_answer'] = responses_dict[question_id]['answer']
-                question_data['done'] = responses_dict[question_id]['done']
-            else:
-                question_data['current_answer'] = None
-                question_data['done'] = None
+        # سوالات کوئیز (از کش fragment ها) همراه با پاسخ‌های فعلی
+        questions_data = quiz_questions_payload(quiz, quiz.responses.all())
         
         return Response({
             'quiz_id': quiz.id,
@@ -720,6 +519,66 @@ class QuizViewSet(viewsets.ModelViewSet):
             'questions': questions_data
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['post'], url_path='grade')
+    @method_decorator(ratelimit(key='ip', rate='50/h', method='POST'))
+    def grade(self, request):
+        """
+        ثبت دسته‌ای نمره سوالات تشریحی توسط تصحیح‌کننده
+        
+        نمره‌ها در صف نمره‌دهی قرار می‌گیرند و grading_worker نمره کل، قبولی،
+        کارنامه و نتیجه ماموریت را محاسبه می‌کند؛ کوئیز pending به completed تغییر می‌کند.
+        
+        Body:
+        {
+            "grades": [
+                {"quiz_id": 1, "scores": [{"question_id": 10, "score": 0.5}, ...]},
+                ...
+            ]
+        }
+        """
+        serializer = QuizBulkGradeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        grades = {}
+        for item in serializer.validated_data['grades']:
+            scores = grades.setdefault(item['quiz_id'], {})
+            scores.update({s['question_id']: s['score'] for s in item['scores']})
+        
+        finished_ids = set(
+            self.get_queryset().filter(id__in=list(grades), end_at__isnull=False).values_list('id', flat=True)
+        )
+        unknown = sorted(set(grades) - finished_ids)
+        if unknown:
+            return Response(
+                {'error': 'کوئیز یافت نشد یا هنوز تمام نشده است', 'quiz_ids': unknown},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        jobs = post_scores(grades)
+        return Response({'message': 'نمره‌ها در صف نمره‌دهی قرار گرفتند', 'queued': len(jobs)}, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['post'], url_path='regrade')
+    @method_decorator(ratelimit(key='ip', rate='20/h', method='POST'))
+    def regrade(self, request):
+        """
+        نمره‌دهی مجدد کوئیزهای تمام‌شده (مثلاً پس از اصلاح پاسخ صحیح سوالات)
+        
+        Body: {"evaluation_id": 1} یا {"quiz_ids": [1, 2, 3]}
+        """
+        serializer = QuizRegradeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        quizzes = self.get_queryset().filter(end_at__isnull=False)
+        if serializer.validated_data.get('evaluation_id'):
+            quizzes = quizzes.filter(evaluation_id=serializer.validated_data['evaluation_id'])
+        if serializer.validated_data.get('quiz_ids'):
+            quizzes = quizzes.filter(id__in=serializer.validated_data['quiz_ids'])
+        
+        jobs = enqueue(list(quizzes.order_by().values_list('id', flat=True)), apply_rules=True)
+        return Response({'message': 'کوئیزها در صف نمره‌دهی قرار گرفتند', 'queued': len(jobs)}, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=True, methods=['get'], url_path='result', authentication_classes=[], permission_classes=[permissions.AllowAny])
     @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'))
     def get_result(self, request, pk=None):
@@ -727,9 +586,7 @@ class QuizViewSet(viewsets.ModelViewSet):
         دریافت نتیجه نهایی کوئیز
         """
         try:
-            quiz = Quiz.objects.select_related('evaluation', 'user').prefetch_related(
-                'responses', 'responses__question'
-            ).get(id=pk)
+            quiz = Quiz.objects.select_related('evaluation', 'user').get(id=pk)
         except Quiz.DoesNotExist:
             return Response(
                 {'error': 'کوئیز یافت نشد'},
@@ -740,8 +597,8 @@ class QuizViewSet(viewsets.ModelViewSet):
         launch_id = request.GET.get('launch_id')
         if launch_id:
             try:
-                from kebrit_api.models import ExamLaunch
-                launch = ExamLaunch.objects.get(uuid=launch_id, quiz_id=quiz.id)
+                # توکن امضاشده launch بدون query بررسی می‌شود؛ UUID قدیمی از ExamLaunch خوانده می‌شود
+                launch_tokens.resolve(launch_id, quiz.id)
                 # اگر launch پیدا شد و متعلق به این quiz است، اجازه دسترسی بده
             except Exception:
                 # اگر launch پیدا نشد، به بررسی‌های معمول برو
@@ -749,9 +606,10 @@ class QuizViewSet(viewsets.ModelViewSet):
         else:
             # بررسی دسترسی - پشتیبانی از هر دو نوع احراز هویت (JWT و ClientToken)
             # اگر با ClientToken احراز هویت شده باشد
-            if hasattr(request, 'auth_company') and request.auth_company:
+            principal = get_principal(request)
+            if principal.is_client:
                 # بررسی اینکه کوئیز متعلق به همان شرکت مشتری باشد
-                if quiz.user.company_id != request.auth_company.id:
+                if quiz.user.company_id != principal.company_id:
                     return Response(
                         {'error': 'دسترسی به این کوئیز ندارید'},
                         status=status.HTTP_403_FORBIDDEN
@@ -760,14 +618,11 @@ class QuizViewSet(viewsets.ModelViewSet):
             elif hasattr(request.user, 'id'):
                 # بررسی دسترسی کاربر عادی
                 if quiz.user_id != request.user.id:
-                    if hasattr(request.user, 'company_id'):
-                        user_roles = request.user.user_roles.all()
-                        is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-                        if not is_admin:
-                            return Response(
-                                {'error': 'دسترسی به این کوئیز ندارید'},
-                                status=status.HTTP_403_FORBIDDEN
-                            )
+                    if principal.is_authenticated and not principal.is_admin:
+                        return Response(
+                            {'error': 'دسترسی به این کوئیز ندارید'},
+                            status=status.HTTP_403_FORBIDDEN
+                        )
             else:
                 # اگر هیچ نوع احراز هویتی وجود نداشت، بررسی کن که آیا quiz متعلق به یک launch است
                 from kebrit_api.models import ExamLaunch
@@ -784,27 +639,9 @@ class QuizViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # محاسبه آمار
-        responses = quiz.responses.all()
-        total_questions = responses.count()
-        correct_count = sum(1 for r in responses if r.score and r.score > 0)
-        wrong_count = total_questions - correct_count
-        total_score = sum(r.score or 0.0 for r in responses)
-        percentage = (correct_count / total_questions * 100) if total_questions > 0 else 0
-        
-        result_data = {
-            'quiz_id': quiz.id,
-            'total_questions': total_questions,
-            'correct_answers': correct_count,
-            'wrong_answers': wrong_count,
-            'percentage': round(percentage, 2),
-            'total_score': round(total_score, 2),
-            'is_accept': quiz.is_accept,
-            'accept_score': quiz.evaluation.accept_score,
-            'start_at': quiz.start_at,
-            'end_at': quiz.end_at,
-            'responses': QuizResponseSerializer(responses, many=True).data
-        }
+        # خلاصه نتیجه هنگام نمره‌دهی ذخیره شده است (برای کوئیزهای قدیمی همین‌جا ساخته می‌شود)
+        summary = get_summary(quiz)
+        result_data = result_payload(quiz, summary)
         
         return Response(result_data, status=status.HTTP_200_OK)
 
@@ -815,15 +652,16 @@ class QuizViewSet(viewsets.ModelViewSet):
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PUT'), name='update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PATCH'), name='partial_update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='DELETE'), name='destroy')
-class QuizResponseViewSet(viewsets.ModelViewSet):
+class QuizResponseViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = QuizResponse.objects.select_related('quiz', 'quiz__user', 'quiz__user__company', 'question').all()
     serializer_class = QuizResponseSerializer
     permission_classes = [CompanyPermission]
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(quiz__user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(quiz__user__company_id=principal.company_id)
         return queryset
 
 
@@ -833,22 +671,26 @@ class QuizResponseViewSet(viewsets.ModelViewSet):
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PUT'), name='update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='PATCH'), name='partial_update')
 @method_decorator(ratelimit(key='ip', rate='50/h', method='DELETE'), name='destroy')
-class QuizResponseEvaluationViewSet(viewsets.ModelViewSet):
+class QuizResponseEvaluationViewSet(ExpandableViewSetMixin, viewsets.ModelViewSet):
     queryset = QuizResponseEvaluation.objects.select_related('user', 'user__company', 'quiz', 'quiz__evaluation', 'quiz__user').all()
     serializer_class = QuizResponseEvaluationSerializer
+    list_serializer_class = QuizResponseEvaluationListSerializer
     permission_classes = [CompanyPermission]
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
+        if self.action == 'list':
+            queryset = annotate_report_cards(queryset, self.request.user, self.requested_expand())
         return queryset
 
 
 @api_view(['POST'])
 @authentication_classes([ClientTokenAuthentication])
 @permission_classes([IsClientTokenAuthenticated])
-@method_decorator(ratelimit(key='ip', rate='50/h', method='POST'))
+@ratelimit(key='ip', rate='50/h', method='POST')
 def mission_student_report(request):
     """
     دریافت کارنامه دانشجو در یک ماموریت مشخص بر اساس:
@@ -886,44 +728,8 @@ def mission_student_report(request):
 
     mission = evaluation.mission
 
-    # پیدا کردن تمام evaluation های مرتبط با این ماموریت
-    evaluations = Evaluation.objects.filter(mission=mission, is_active=True).order_by('id')
-
-    if not evaluations.exists():
-        empty_report = MissionReportSerializer({
-            'mission_id': mission.id,
-            'mobile': mobile,
-            'user_id': user.id,
-            'attempts': [],
-        })
-        return Response(empty_report.data, status=status.HTTP_200_OK)
-
-    # همه کوئیزهای تمام‌شده دانشجو روی این ماموریت (ممکن است چند evaluation داشته باشد)
-    quizzes = (
-        Quiz.objects.filter(evaluation__in=evaluations, user=user, end_at__isnull=False)
-        .select_related('evaluation')
-        .order_by('start_at')
-    )
-
-    attempts = []
-    for quiz in quizzes:
-        qre = (
-            QuizResponseEvaluation.objects.filter(user=user, quiz=quiz)
-            .order_by('-id')
-            .first()
-        )
-        percentage = qre.score if qre and qre.score is not None else None
-
-        attempts.append({
-            'evaluation_id': quiz.evaluation_id,
-            'quiz_id': quiz.id,
-            'percentage': round(percentage, 2) if percentage is not None else None,
-            'total_score': round(quiz.score, 2) if quiz.score is not None else None,
-            'is_accept': bool(quiz.is_accept) if quiz.is_accept is not None else None,
-            'accept_score': quiz.evaluation.accept_score,
-            'start_at': quiz.start_at,
-            'end_at': quiz.end_at,
-        })
+    # همه کوئیزهای تمام‌شده دانشجو روی evaluation های فعال این ماموریت، همراه درصد هر کوئیز (یک query)
+    attempts = student_attempts(mission.id, user.id)
 
     report = MissionReportSerializer({
         'mission_id': mission.id,
@@ -933,3 +739,49 @@ def mission_student_report(request):
     })
 
     return Response(report.data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@authentication_classes([ClientTokenAuthentication])
+@permission_classes([IsClientTokenAuthenticated])
+@ratelimit(key='ip', rate='50/h', method='POST')
+def mission_students_report(request):
+    """
+    کارنامه چند دانشجو در یک ماموریت (حالت دسته‌ای mission_student_report):
+    - mobiles: لیست شماره موبایل دانشجویان، یا
+    - all_students: همه دانشجویان شرکت که در آزمون‌های ماموریت شرکت کرده‌اند
+    با ?output=ndjson کارنامه‌ها به صورت stream (هر خط یک دانشجو) برگردانده می‌شوند.
+    """
+    req_serializer = MissionBulkReportRequestSerializer(data=request.data)
+    if not req_serializer.is_valid():
+        return Response({'error': req_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    output = request.query_params.get('output', 'json')
+    if output not in ('json', 'ndjson'):
+        return Response({'error': 'output باید json یا ndjson باشد'}, status=status.HTTP_400_BAD_REQUEST)
+
+    company = getattr(request, 'auth_company', None)
+    if company is None:
+        return Response({'error': 'توکن مشتری نامعتبر است'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    try:
+        evaluation = Evaluation.objects.get(
+            id=req_serializer.validated_data['erul'],
+            is_active=True,
+            mission__company_id=company.id,
+        )
+    except Evaluation.DoesNotExist:
+        return Response({'error': 'آزمون یافت نشد یا متعلق به این شرکت نیست'}, status=status.HTTP_404_NOT_FOUND)
+
+    mobiles = None if req_serializer.validated_data['all_students'] else req_serializer.validated_data['mobiles']
+    reports = iter_mission_reports(evaluation.mission_id, company.id, mobiles=mobiles)
+
+    if output == 'ndjson':
+        return StreamingHttpResponse(ndjson_stream(reports), content_type='application/x-ndjson; charset=utf-8')
+
+    reports = list(reports)
+    return Response({
+        'mission_id': evaluation.mission_id,
+        'reports': [r for r in reports if 'error' not in r],
+        'not_found': [r['mobile'] for r in reports if 'error' in r],
+    }, status=status.HTTP_200_OK)
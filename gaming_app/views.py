@@ -9,6 +9,7 @@ from .serializers import (
     UserBadgeSerializer, UserPointSerializer, UserActionSerializer
 )
 from users_app.permissions import CompanyPermission
+from users_app.principal import get_principal
 
 
 @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'), name='list')
@@ -24,8 +25,9 @@ class LevelViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(company_id=principal.company_id)
         queryset = queryset.order_by('order')
         return queryset
 
@@ -43,8 +45,9 @@ class UserLevelViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         queryset = queryset.order_by('-reachedat', '-id')
         return queryset
 
@@ -62,8 +65,9 @@ class BadgeViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(company_id=principal.company_id)
         queryset = queryset.order_by('id')
         return queryset
 
@@ -81,8 +85,9 @@ class UserBadgeViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         queryset = queryset.order_by('-earnedat', '-id')
         return queryset
 
@@ -100,8 +105,9 @@ class UserPointViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         queryset = queryset.order_by('-totalpoints', '-id')
         return queryset
 
@@ -119,7 +125,8 @@ class UserActionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         queryset = queryset.order_by('-createdat', '-id')
         return queryset
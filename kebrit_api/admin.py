@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import ClientApiToken, ExamLaunch
+from .models import ClientApiToken, ExamLaunch, GradingJob, QuizPool, QuizResultSummary
 
 
 @admin.register(ClientApiToken)
@@ -17,3 +17,29 @@ class ExamLaunchAdmin(admin.ModelAdmin):
     list_filter = ("state", "company_id")
     search_fields = ("uuid", "student_uuid", "student_mobile")
 
+
+
+@admin.register(QuizPool)
+class QuizPoolAdmin(admin.ModelAdmin):
+    list_display = ("evaluation_id", "size", "is_active", "ready_sets", "created_at")
+    list_filter = ("is_active",)
+    search_fields = ("evaluation_id",)
+
+    def ready_sets(self, obj):
+        return obj.sets.count()
+
+    ready_sets.short_description = "Ready sets"
+
+
+@admin.register(QuizResultSummary)
+class QuizResultSummaryAdmin(admin.ModelAdmin):
+    list_display = ("quiz_id", "user_id", "evaluation_id", "percentage", "total_score", "graded_percentage", "updated_at")
+    search_fields = ("quiz_id", "user_id", "evaluation_id")
+    exclude = ("responses",)
+
+
+@admin.register(GradingJob)
+class GradingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "quiz_id", "state", "apply_rules", "finalize", "attempts", "created_at", "finished_at")
+    list_filter = ("state", "apply_rules", "finalize")
+    search_fields = ("quiz_id",)
@@ -5,3 +5,6 @@ class KebritApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'kebrit_api'
 
+    def ready(self):
+        # ثبت signal های نامعتبرسازی کش توکن کلاینت
+        from . import signals  # noqa: F401
@@ -3,7 +3,7 @@ import uuid
 from rest_framework.authentication import BaseAuthentication
 from rest_framework import exceptions
 
-from kebrit_api.models import ClientApiToken
+from kebrit_api.client_tokens import company_of, get_token
 
 
 class ClientPrincipal:
@@ -53,18 +53,16 @@ class ClientTokenAuthentication(BaseAuthentication):
         except Exception:
             raise exceptions.AuthenticationFailed("Invalid client token format")
 
-        try:
-            api_token = (
-                ClientApiToken.objects.select_related("company")
-                .get(uuid=token_uuid, is_active=True)
-            )
-        except ClientApiToken.DoesNotExist:
+        # Slim cached record (client_tokens.py) instead of a query per request
+        api_token = get_token(token_uuid)
+        if api_token is None or not api_token.is_active:
             raise exceptions.AuthenticationFailed("Invalid or inactive client token")
 
         # Attach company for easy access in views
-        request.auth_company = api_token.company
+        company = company_of(api_token)
+        request.auth_company = company
         request.auth_client_token = api_token
 
-        principal = ClientPrincipal(api_token.company, token_uuid=str(api_token.uuid))
-        return (principal, {"client_token": str(api_token.uuid), "company_id": api_token.company_id})
+        principal = ClientPrincipal(company, token_uuid=api_token.uuid)
+        return (principal, {"client_token": api_token.uuid, "company_id": api_token.company_id})
 
@@ -0,0 +1,133 @@
+"""
+Two-tier cache of client API tokens for ClientTokenAuthentication.
+
+Looking a token up is the most frequent query of the API. Tokens are kept
+as slim records (company id and name, allowed callback hosts, is_active):
+- in a process-local LRU for CLIENT_TOKEN_LOCAL_TTL seconds (no I/O);
+- in the Django cache for CLIENT_TOKEN_CACHE_TTL seconds, shared by workers.
+
+Saving or deleting a ClientApiToken (or renaming its Company) deletes the
+shared entry and the local entry of the current process (signals.py); other
+processes drop their local entries when the local TTL expires. With a shared
+cache backend (CACHE_URL) a deactivated token is therefore refused
+everywhere within CLIENT_TOKEN_LOCAL_TTL seconds. With the per-process
+default cache the deletion only reaches the saving process, and other
+processes may accept the token for up to CLIENT_TOKEN_LOCAL_TTL +
+CLIENT_TOKEN_CACHE_TTL seconds (both default to 30). Unknown tokens are
+never cached.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users_app.models import Company
+from .models import ClientApiToken
+
+
+TOKEN_KEY = "client_token:{uuid}"
+
+ClientTokenRecord = namedtuple(
+    "ClientTokenRecord", ["uuid", "company_id", "company_name", "allowed_callback_hosts", "is_active"]
+)
+
+
+class _LRU:
+    """Thread-safe LRU of (expires_at, ClientTokenRecord) entries."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, record, ttl, max_size):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, record)
+            self._data.move_to_end(key)
+            while len(self._data) > max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_tokens = _LRU()
+
+
+def _local_ttl():
+    return getattr(settings, "CLIENT_TOKEN_LOCAL_TTL", 30)
+
+
+def _local_size():
+    return getattr(settings, "CLIENT_TOKEN_LOCAL_SIZE", 1024)
+
+
+def _shared_ttl():
+    return getattr(settings, "CLIENT_TOKEN_CACHE_TTL", 30)
+
+
+def _load(token_uuid):
+    row = (
+        ClientApiToken.objects.filter(uuid=token_uuid)
+        .values_list("uuid", "company_id", "company__name", "allowed_callback_hosts", "is_active")
+        .first()
+    )
+    if row is None:
+        return None
+    return ClientTokenRecord(str(row[0]), *row[1:])
+
+
+def get_token(token_uuid):
+    """ClientTokenRecord of a token (active or not), or None if it does not exist."""
+    key = TOKEN_KEY.format(uuid=token_uuid)
+
+    record = _local_tokens.get(key)
+    if record is not None:
+        return record
+
+    record = cache.get(key)
+    if record is None:
+        record = _load(token_uuid)
+        if record is None:
+            return None
+        cache.set(key, record, _shared_ttl())
+
+    _local_tokens.set(key, record, _local_ttl(), _local_size())
+    return record
+
+
+def invalidate(token_uuid):
+    key = TOKEN_KEY.format(uuid=token_uuid)
+    cache.delete(key)
+    _local_tokens.discard(key)
+
+
+def invalidate_company(company_id):
+    for token_uuid in ClientApiToken.objects.filter(company_id=company_id).values_list("uuid", flat=True):
+        invalidate(token_uuid)
+
+
+def clear_local_cache():
+    _local_tokens.clear()
+
+
+def company_of(record):
+    """Unsaved Company carrying the cached id and name (request.auth_company)."""
+    return Company(id=record.company_id, name=record.company_name)
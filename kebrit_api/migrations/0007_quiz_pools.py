@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:10
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kebrit_api', '0006_fix_admin_log_user_foreign_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizPool',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluation_id', models.IntegerField(unique=True)),
+                ('size', models.IntegerField(default=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'quiz_pool',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizPoolSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('evaluation_id', models.IntegerField()),
+                ('question_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sets', to='kebrit_api.quizpool')),
+            ],
+            options={
+                'db_table': 'quiz_pool_set',
+                'indexes': [models.Index(fields=['evaluation_id', 'id'], name='idx_quizPoolSet_evalId')],
+            },
+        ),
+    ]
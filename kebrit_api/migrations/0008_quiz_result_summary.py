@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:16
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kebrit_api', '0007_quiz_pools'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResultSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_id', models.IntegerField(unique=True)),
+                ('user_id', models.IntegerField()),
+                ('evaluation_id', models.IntegerField()),
+                ('total_questions', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('wrong_answers', models.IntegerField(default=0)),
+                ('percentage', models.FloatField(default=0)),
+                ('total_score', models.FloatField(default=0)),
+                ('graded_percentage', models.FloatField(blank=True, null=True)),
+                ('responses', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'quiz_result_summary',
+                'indexes': [models.Index(fields=['user_id', 'evaluation_id'], name='idx_quizResult_userEval')],
+            },
+        ),
+    ]
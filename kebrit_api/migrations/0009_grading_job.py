@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kebrit_api', '0008_quiz_result_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quiz_id', models.IntegerField()),
+                ('scores', models.JSONField(blank=True, default=dict)),
+                ('apply_rules', models.BooleanField(default=False)),
+                ('finalize', models.BooleanField(default=False)),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'grading_job',
+                'indexes': [models.Index(fields=['state', 'id'], name='idx_gradingJob_state'), models.Index(fields=['quiz_id'], name='idx_gradingJob_quizId')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 import uuid
 
+from django.contrib.postgres.fields import ArrayField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from users_app.models import Company
@@ -71,3 +73,125 @@ class ExamLaunch(models.Model):
     def __str__(self):
         return f"Launch {self.uuid} (quiz={self.quiz_id})"
 
+
+
+class QuizPool(models.Model):
+    """
+    Optional pre-generation mode of one evaluation.
+    While active, `manage.py pregenerate_quiz_sets` keeps `size` randomized
+    question sets ready, so quiz starts claim a set instead of sampling.
+    """
+
+    evaluation_id = models.IntegerField(unique=True)
+    size = models.IntegerField(default=100)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'quiz_pool'
+        app_label = 'kebrit_api'
+
+    def __str__(self):
+        return f"QuizPool (eurl={self.evaluation_id}, size={self.size})"
+
+
+class QuizPoolSet(models.Model):
+    """
+    One pre-generated question set; claimed (deleted) by exactly one quiz start.
+    """
+
+    pool = models.ForeignKey(QuizPool, on_delete=models.CASCADE, related_name='sets')
+    evaluation_id = models.IntegerField()
+    question_ids = ArrayField(models.IntegerField())
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'quiz_pool_set'
+        app_label = 'kebrit_api'
+        indexes = [
+            models.Index(fields=['evaluation_id', 'id'], name='idx_quizPoolSet_evalId'),
+        ]
+
+    def __str__(self):
+        return f"QuizPoolSet {self.id} (eurl={self.evaluation_id})"
+
+
+class QuizResultSummary(models.Model):
+    """
+    Result of a finished quiz, frozen when it is graded (exam_app/result_summaries.py).
+    get_result and mission_student_report read this row instead of
+    recomputing from every QuizResponse; it is rebuilt when a response's
+    score is changed by manual grading.
+    """
+
+    # We store raw ids to avoid cross-schema FK complexities
+    quiz_id = models.IntegerField(unique=True)
+    user_id = models.IntegerField()
+    evaluation_id = models.IntegerField()
+
+    total_questions = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    wrong_answers = models.IntegerField(default=0)
+    percentage = models.FloatField(default=0)
+    total_score = models.FloatField(default=0)
+    # QuizResponseEvaluation.score (percentage of multiple-choice questions)
+    graded_percentage = models.FloatField(null=True, blank=True)
+
+    # Optional precomputed QuizResponseSerializer output
+    responses = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'quiz_result_summary'
+        app_label = 'kebrit_api'
+        indexes = [
+            models.Index(fields=['user_id', 'evaluation_id'], name='idx_quizResult_userEval'),
+        ]
+
+    def __str__(self):
+        return f"QuizResultSummary (quiz={self.quiz_id})"
+
+
+class GradingJob(models.Model):
+    """
+    Queued (re)grading of one finished quiz, run by `manage.py grading_worker`
+    (exam_app/grading_queue.py).
+    `scores` holds grader-posted scores as {"<question_id>": score}.
+    """
+
+    STATE_QUEUED = 'queued'
+    STATE_RUNNING = 'running'
+    STATE_DONE = 'done'
+    STATE_FAILED = 'failed'
+
+    STATE_CHOICES = [
+        (STATE_QUEUED, 'Queued'),
+        (STATE_RUNNING, 'Running'),
+        (STATE_DONE, 'Done'),
+        (STATE_FAILED, 'Failed'),
+    ]
+
+    quiz_id = models.IntegerField()
+    scores = models.JSONField(default=dict, blank=True)
+    # Run EXAM_GRADING_RULES on descriptive answers without a posted score
+    apply_rules = models.BooleanField(default=False)
+    # Move a pending quiz to completed once graded
+    finalize = models.BooleanField(default=False)
+
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=STATE_QUEUED)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'grading_job'
+        app_label = 'kebrit_api'
+        indexes = [
+            models.Index(fields=['state', 'id'], name='idx_gradingJob_state'),
+            models.Index(fields=['quiz_id'], name='idx_gradingJob_quizId'),
+        ]
+
+    def __str__(self):
+        return f"GradingJob {self.id} (quiz={self.quiz_id}, {self.state})"
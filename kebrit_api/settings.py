@@ -179,10 +179,98 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100,
 }
 
+# Django cache. The default local-memory cache is per process: entries that
+# are meant to be shared by workers (client tokens, answer keys, answer
+# buffer, item analysis) are then only shared within one process, and
+# invalidations only reach the process that made them. Set CACHE_URL to a
+# shared backend in production, e.g. redis://host:6379/0 (needs the redis
+# package) or dbcache://kebrit_cache (after `manage.py createcachetable`).
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Client token cache (kebrit_api/client_tokens.py), seconds. A revoked token
+# may still be accepted for up to LOCAL_TTL with a shared CACHE_URL, and up to
+# LOCAL_TTL + CACHE_TTL with the per-process default cache.
+CLIENT_TOKEN_LOCAL_TTL = env.int('CLIENT_TOKEN_LOCAL_TTL', default=30)
+CLIENT_TOKEN_LOCAL_SIZE = env.int('CLIENT_TOKEN_LOCAL_SIZE', default=1024)
+CLIENT_TOKEN_CACHE_TTL = env.int('CLIENT_TOKEN_CACHE_TTL', default=30)
+
+# Seconds a user row stays cached for JWT requests whose request.user is
+# built from token claims (users_app/user_cache.py)
+USER_CACHE_TTL = env.int('USER_CACHE_TTL', default=60)
+
+# Students written per transaction by the bulk provisioning endpoint
+# (users_app/provisioning.py)
+USER_BULK_BATCH_SIZE = env.int('USER_BULK_BATCH_SIZE', default=1000)
+
+# Sampled request tracing (kebrit_api/tracing.py): share of requests traced
+# (0 disables), JSON-lines file written by a background thread, and the
+# in-memory queue size beyond which events are dropped.
+TRACE_SAMPLE_RATE = env.float('TRACE_SAMPLE_RATE', default=0.0)
+TRACE_FILE = env('TRACE_FILE', default=str(BASE_DIR / 'trace.log'))
+TRACE_QUEUE_SIZE = env.int('TRACE_QUEUE_SIZE', default=10000)
+
 # Exam frontend base URL used for returning exam_url in integration launch endpoint.
 # Example: https://app.ayareto.ir/exam
 EXAM_FRONT_BASE_URL = env('EXAM_FRONT_BASE_URL', default='')
 
+# Lifetime (seconds) of signed launch tokens (exam_app/launch_tokens.py)
+EXAM_LAUNCH_TOKEN_TTL = env.int('EXAM_LAUNCH_TOKEN_TTL', default=86400)
+
+# Seconds past start_at + Evaluation.duration before `manage.py expire_quizzes`
+# auto-submits an open quiz (exam_app/expiry.py)
+EXAM_EXPIRY_GRACE = env.int('EXAM_EXPIRY_GRACE', default=60)
+
+# Answer key cache used for grading quizzes (exam_app/answer_keys.py)
+# SIZE: number of evaluations kept per process, TTL: seconds,
+# SHARED: also keep built keys in the Django cache for other workers.
+# Edits to questions reach other workers right away only with a shared
+# CACHE_URL; with the per-process default they may grade with the old key
+# for up to TTL seconds.
+EXAM_ANSWER_KEY_CACHE_SIZE = env.int('EXAM_ANSWER_KEY_CACHE_SIZE', default=256)
+EXAM_ANSWER_KEY_CACHE_TTL = env.int('EXAM_ANSWER_KEY_CACHE_TTL', default=300)
+EXAM_ANSWER_KEY_SHARED_CACHE = env.bool('EXAM_ANSWER_KEY_SHARED_CACHE', default=False)
+
+# Question sampling (exam_app/sampling.py): banks up to POOL_MAX_SIZE questions
+# are sampled from a cached id array, larger banks are sampled in PostgreSQL.
+EXAM_QUESTION_POOL_MAX_SIZE = env.int('EXAM_QUESTION_POOL_MAX_SIZE', default=5000)
+EXAM_QUESTION_POOL_TTL = env.int('EXAM_QUESTION_POOL_TTL', default=3600)
+
+# Serialized question fragments (exam_app/question_fragments.py), seconds
+EXAM_QUESTION_FRAGMENT_TTL = env.int('EXAM_QUESTION_FRAGMENT_TTL', default=3600)
+
+# Write-behind buffer for autosaved answers (exam_app/answer_buffer.py).
+# Only enable with a cache shared by all workers. MAX_AGE / FLUSH_INTERVAL
+# are seconds: the longest an answer stays buffered before an inline flush,
+# and the age at which `manage.py flush_answer_buffer` picks it up.
+EXAM_ANSWER_BUFFER_ENABLED = env.bool('EXAM_ANSWER_BUFFER_ENABLED', default=False)
+EXAM_ANSWER_BUFFER_CACHE = env('EXAM_ANSWER_BUFFER_CACHE', default='default')
+EXAM_ANSWER_BUFFER_MAX_AGE = env.int('EXAM_ANSWER_BUFFER_MAX_AGE', default=30)
+EXAM_ANSWER_BUFFER_MAX_ENTRIES = env.int('EXAM_ANSWER_BUFFER_MAX_ENTRIES', default=200)
+EXAM_ANSWER_BUFFER_FLUSH_INTERVAL = env.int('EXAM_ANSWER_BUFFER_FLUSH_INTERVAL', default=5)
+EXAM_ANSWER_BUFFER_TTL = env.int('EXAM_ANSWER_BUFFER_TTL', default=86400)
+
+# Store the serialized response breakdown in quiz result summaries
+# (exam_app/result_summaries.py); otherwise get_result serializes it per call.
+EXAM_RESULT_SUMMARY_RESPONSES = env.bool('EXAM_RESULT_SUMMARY_RESPONSES', default=True)
+
+# Grading queue (exam_app/grading_queue.py, `manage.py grading_worker`).
+# RULES: dotted paths of callables that score descriptive answers.
+EXAM_GRADING_RULES = env.list('EXAM_GRADING_RULES', default=[])
+EXAM_GRADING_MAX_ATTEMPTS = env.int('EXAM_GRADING_MAX_ATTEMPTS', default=3)
+EXAM_GRADING_JOB_TIMEOUT = env.int('EXAM_GRADING_JOB_TIMEOUT', default=600)
+
+# Rows fetched per server-side cursor round trip in the results export
+EXAM_RESULTS_EXPORT_CHUNK_SIZE = env.int('EXAM_RESULTS_EXPORT_CHUNK_SIZE', default=2000)
+# ... and in the bulk mission student report (exam_app/student_reports.py)
+EXAM_STUDENT_REPORT_CHUNK_SIZE = env.int('EXAM_STUDENT_REPORT_CHUNK_SIZE', default=2000)
+
+# Item analysis (exam_app/item_analysis.py, needs numpy): cache TTL in
+# seconds and QuizResponse rows loaded per chunk
+EXAM_ITEM_ANALYSIS_TTL = env.int('EXAM_ITEM_ANALYSIS_TTL', default=86400)
+EXAM_ITEM_ANALYSIS_CHUNK_SIZE = env.int('EXAM_ITEM_ANALYSIS_CHUNK_SIZE', default=5000)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users_app.models import Company
+from .client_tokens import invalidate, invalidate_company
+from .models import ClientApiToken
+
+
+@receiver(post_save, sender=ClientApiToken)
+@receiver(post_delete, sender=ClientApiToken)
+def invalidate_client_token(sender, instance, **kwargs):
+    """Deactivated or deleted tokens must stop authenticating."""
+    invalidate(instance.uuid)
+
+
+@receiver(post_save, sender=Company)
+def invalidate_company_tokens(sender, instance, **kwargs):
+    """Cached token records carry the company name."""
+    invalidate_company(instance.id)
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+from django.test import override_settings
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework import status
+
+from users_app.authentication import CustomJWTAuthentication
+from users_app.models import Company
+from kebrit_api import client_tokens, tracing
+from kebrit_api.models import ClientApiToken
+
+
+class ClientTokenCacheTests(APITestCase):
+    """
+    توکن کلاینت بدون query احراز می‌شود و غیرفعال‌سازی آن فوراً اعمال می‌شود.
+    """
+
+    def setUp(self):
+        client_tokens.clear_local_cache()
+        self.client = APIClient()
+        self.company = Company.objects.create(name="Token Cache Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Cached Token")
+        self.token_uuid = str(self.client_token.uuid)
+
+    def test_token_record_is_cached(self):
+        record = client_tokens.get_token(self.token_uuid)
+        self.assertEqual((record.company_id, record.company_name, record.is_active), (self.company.id, "Token Cache Company", True))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(client_tokens.get_token(self.token_uuid), record)
+
+        # لایه مشترک بدون لایه محلی هم بدون query پاسخ می‌دهد
+        client_tokens.clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(client_tokens.get_token(self.token_uuid), record)
+
+    def test_deactivated_token_is_refused(self):
+        headers = {"HTTP_X_CLIENT_TOKEN": self.token_uuid}
+        payload = {"mobile": "09120000001"}
+        self.client.post("/api/user-missions/", data=payload, format="json", **headers)
+
+        self.client_token.is_active = False
+        self.client_token.save()
+
+        response = self.client.post("/api/user-missions/", data=payload, format="json", **headers)
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_company_rename_refreshes_record(self):
+        client_tokens.get_token(self.token_uuid)
+        self.company.name = "Renamed Company"
+        self.company.save()
+
+        self.assertEqual(client_tokens.get_token(self.token_uuid).company_name, "Renamed Company")
+
+
+class TracingTests(APITestCase):
+    """
+    رویدادهای trace فقط برای درخواست‌های نمونه‌برداری‌شده و در thread پس‌زمینه نوشته می‌شوند.
+    """
+
+    def setUp(self):
+        tracing.shutdown()
+        self.addCleanup(tracing.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.trace_file = os.path.join(directory.name, "trace.log")
+
+    def test_unsampled_requests_are_not_traced(self):
+        with override_settings(TRACE_SAMPLE_RATE=0.0, TRACE_FILE=self.trace_file):
+            self.client.get("/api/quizzes/0/questions/")
+            tracing.shutdown()
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_sampled_request_events_share_a_trace_id(self):
+        request = APIRequestFactory().get("/api/quizzes/0/questions/", HTTP_AUTHORIZATION="Bearer invalid")
+        with override_settings(TRACE_SAMPLE_RATE=1.0, TRACE_FILE=self.trace_file):
+            self.assertIsNone(CustomJWTAuthentication().authenticate(request))
+            tracing.shutdown()
+
+        with open(self.trace_file, encoding="utf-8") as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(
+            [event["message"] for event in events],
+            ["authenticate method called", "Checking for JWT token in request", "Authentication failed"],
+        )
+        self.assertEqual({event["trace_id"] for event in events}, {request._trace_id})
@@ -0,0 +1,120 @@
+"""
+Sampled request tracing.
+
+`trace(request, message, **data)` records a structured event for a sampled
+share (TRACE_SAMPLE_RATE) of requests; the sampling decision is taken once
+per request, so a traced request keeps all of its events under one
+trace_id. Events are put on a bounded in-memory queue by a QueueHandler and
+written as JSON lines to TRACE_FILE by a QueueListener thread: the request
+thread never formats or writes anything to disk. When the queue is full
+(TRACE_QUEUE_SIZE) events are dropped and counted in `dropped`.
+
+With the default rate of 0 tracing costs one attribute lookup per call.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+
+_logger = logging.getLogger("kebrit.trace")
+_logger.propagate = False
+_logger.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_listener = None
+_handler = None
+dropped = 0
+
+
+def _sample_rate():
+    return getattr(settings, "TRACE_SAMPLE_RATE", 0.0)
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, default=str, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler that neither formats in the caller thread nor blocks on a full queue."""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        global dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped += 1
+
+
+def _start():
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return
+        events = queue.Queue(maxsize=getattr(settings, "TRACE_QUEUE_SIZE", 10000))
+        sink = logging.FileHandler(getattr(settings, "TRACE_FILE", "trace.log"), delay=True, encoding="utf-8")
+        sink.setFormatter(_JsonFormatter())
+        _listener = QueueListener(events, sink)
+        _listener.start()
+        _handler = _DroppingQueueHandler(events)
+        _logger.addHandler(_handler)
+
+
+def shutdown():
+    """Write the queued events and stop the writer thread (also run at exit)."""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        _logger.removeHandler(_handler)
+        _listener.stop()
+        for sink in _listener.handlers:
+            sink.close()
+        _listener = _handler = None
+
+
+atexit.register(shutdown)
+
+
+def sampled(request):
+    """Trace id of a sampled request, or None. Decided on the first call per request."""
+    try:
+        return request._trace_id
+    except AttributeError:
+        pass
+    rate = _sample_rate()
+    trace_id = uuid.uuid4().hex if rate > 0 and random.random() < rate else None
+    try:
+        request._trace_id = trace_id
+    except AttributeError:
+        pass
+    return trace_id
+
+
+def trace(request, message, **data):
+    """Record an event for request if it is sampled."""
+    trace_id = sampled(request)
+    if trace_id is None:
+        return
+    if _listener is None:
+        _start()
+    _logger.info(
+        {
+            "trace_id": trace_id,
+            "message": message,
+            "path": getattr(request, "path", None),
+            "data": data,
+            "timestamp": int(time.time() * 1000),
+        }
+    )
@@ -41,12 +41,14 @@ from gaming_app.views import (
 from exam_app.integration_views import (
     ClientExamInfoView,
     ClientExamLaunchView,
+    ClientExamResultsExportView,
     LaunchDetailView,
     LaunchAnswerView,
+    LaunchAnswersView,
     LaunchSubmitView,
     LaunchRedirectView,
 )
-from exam_app.views import mission_student_report
+from exam_app.views import mission_student_report, mission_students_report
 
 
 
@@ -132,16 +134,19 @@ urlpatterns = [
     path('api/login/', csrf_exempt(login), name='login'),
     # Customer integration endpoints (client token in header)
     path('api/integration/exams/<int:eurl>/', csrf_exempt(ClientExamInfoView.as_view()), name='integration_exam_info'),
+    path('api/integration/exams/<int:eurl>/results/export/', csrf_exempt(ClientExamResultsExportView.as_view()), name='integration_exam_results_export'),
     path('api/integration/exams/launch/', csrf_exempt(ClientExamLaunchView.as_view()), name='integration_exam_launch'),
     # Student quiz endpoints (quiz_id in URL)
     path('api/quiz/<int:quiz_id>/', csrf_exempt(LaunchDetailView.as_view()), name='quiz_detail'),
     path('api/quiz/<int:quiz_id>/answer/', csrf_exempt(LaunchAnswerView.as_view()), name='quiz_answer'),
+    path('api/quiz/<int:quiz_id>/answers/', csrf_exempt(LaunchAnswersView.as_view()), name='quiz_answers'),
     path('api/quiz/<int:quiz_id>/submit/', csrf_exempt(LaunchSubmitView.as_view()), name='quiz_submit'),
     path('api/quiz/<int:quiz_id>/redirect/', csrf_exempt(LaunchRedirectView.as_view()), name='quiz_redirect'),
     # Roadmap app custom endpoints
     path('api/user-missions/', csrf_exempt(get_user_missions), name='user_missions'),
     # Mission student report
     path('api/mission-student-report/', csrf_exempt(mission_student_report), name='mission_student_report'),
+    path('api/mission-student-report/bulk/', csrf_exempt(mission_students_report), name='mission_students_report'),
     # Swagger/OpenAPI Documentation (Read-only - نمایش مستندات بدون امکان اجرا)
     re_path(r'^doc(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('doc/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
@@ -4,6 +4,7 @@ from django.utils.decorators import method_decorator
 from .models import File, Tag, FileTag
 from .serializers import FileSerializer, TagSerializer, FileTagSerializer
 from users_app.permissions import CompanyPermission
+from users_app.principal import get_principal
 
 
 @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'), name='list')
@@ -19,8 +20,9 @@ class FileViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(company_id=principal.company_id)
         return queryset
 
 
@@ -49,6 +51,7 @@ class FileTagViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(file__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(file__company_id=principal.company_id)
         return queryset
@@ -10,6 +10,7 @@ from .serializers import (
     MissionResultSerializer, AbilitySerializer, UserMissionQuerySerializer
 )
 from users_app.permissions import CompanyPermission
+from users_app.principal import get_principal
 from users_app.models import User, Company
 from kebrit_api.authentication_client import ClientTokenAuthentication
 from kebrit_api.permissions import IsClientTokenAuthenticated
@@ -29,8 +30,9 @@ class MissionViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         # احراز هویت فقط با Client Token انجام می‌شود
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(company_id=principal.company_id)
         return queryset
     
     def get_serializer_context(self):
@@ -53,8 +55,9 @@ class MissionRelationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(mission__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(mission__company_id=principal.company_id)
         return queryset
 
 
@@ -71,8 +74,9 @@ class MissionResultViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(user__company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         return queryset
 
 
@@ -89,8 +93,9 @@ class AbilityViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request, 'auth_company') and self.request.auth_company:
-            queryset = queryset.filter(company_id=self.request.auth_company.id)
+        principal = get_principal(self.request)
+        if principal.is_client:
+            queryset = queryset.filter(company_id=principal.company_id)
         return queryset
 
 
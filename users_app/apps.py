@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersAppConfig(AppConfig):
     name = 'users_app'
+
+    def ready(self):
+        # ثبت signal های نامعتبرسازی کش کاربر
+        from . import signals  # noqa: F401
@@ -3,7 +3,8 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import UntypedToken
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from .models import User
+from kebrit_api.tracing import sampled, trace
+from .models import ClaimsUser
 
 
 class CustomJWTAuthentication(JWTAuthentication):
@@ -17,30 +18,16 @@ class CustomJWTAuthentication(JWTAuthentication):
         Extracts the header containing the JSON web token from the given
         request. Also checks cookies as fallback.
         """
-        # #region agent log
-        import json
-        import os
-        try:
-            with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                log_entry = json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "C",
-                    "location": "authentication.py:15",
-                    "message": "Checking for JWT token in request",
-                    "data": {
-                        "has_authorization_header": bool(request.META.get('HTTP_AUTHORIZATION')),
-                        "has_token_query_param": bool(request.GET.get('token')),
-                        "has_launch_id_query_param": bool(request.GET.get('launch_id')),
-                        "has_access_token_cookie": bool(request.COOKIES.get(settings.SIMPLE_JWT.get('AUTH_COOKIE', 'access_token'))),
-                        "path": request.path
-                    },
-                    "timestamp": int(__import__('time').time() * 1000)
-                }) + "\n"
-                f.write(log_entry)
-        except Exception:
-            pass
-        # #endregion
+        if sampled(request):
+            cookie_name = getattr(settings, 'SIMPLE_JWT', {}).get('AUTH_COOKIE', 'access_token')
+            trace(
+                request,
+                "Checking for JWT token in request",
+                has_authorization_header=bool(request.META.get('HTTP_AUTHORIZATION')),
+                has_token_query_param=bool(request.GET.get('token')),
+                has_launch_id_query_param=bool(request.GET.get('launch_id')),
+                has_access_token_cookie=bool(request.COOKIES.get(cookie_name)),
+            )
         
         header = super().get_header(request)
         if header:
@@ -64,137 +51,41 @@ class CustomJWTAuthentication(JWTAuthentication):
         """
         Authenticate using JWT token from header or cookie.
         """
-        # #region agent log
-        import json
-        try:
-            with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                log_entry = json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "C",
-                    "location": "authentication.py:32",
-                    "message": "authenticate method called",
-                    "data": {
-                        "path": request.path,
-                        "method": request.method
-                    },
-                    "timestamp": int(__import__('time').time() * 1000)
-                }) + "\n"
-                f.write(log_entry)
-        except Exception:
-            pass
-        # #endregion
+        trace(request, "authenticate method called", method=request.method)
         
         header = self.get_header(request)
         if header is None:
-            # #region agent log
-            try:
-                with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                    log_entry = json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "C",
-                        "location": "authentication.py:45",
-                        "message": "No header found, returning None",
-                        "data": {},
-                        "timestamp": int(__import__('time').time() * 1000)
-                    }) + "\n"
-                    f.write(log_entry)
-            except Exception:
-                pass
-            # #endregion
+            trace(request, "No header found, returning None")
             return None
         
         raw_token = self.get_raw_token(header)
         if raw_token is None:
-            # #region agent log
-            try:
-                with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                    log_entry = json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "C",
-                        "location": "authentication.py:55",
-                        "message": "No raw token extracted, returning None",
-                        "data": {},
-                        "timestamp": int(__import__('time').time() * 1000)
-                    }) + "\n"
-                    f.write(log_entry)
-            except Exception:
-                pass
-            # #endregion
+            trace(request, "No raw token extracted, returning None")
             return None
         
         try:
             validated_token = self.get_validated_token(raw_token)
             user = self.get_user(validated_token)
-            # #region agent log
-            try:
-                with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                    log_entry = json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "C",
-                        "location": "authentication.py:70",
-                        "message": "Authentication successful",
-                        "data": {
-                            "user_id": user.id if hasattr(user, 'id') else None,
-                            "user_type": type(user).__name__
-                        },
-                        "timestamp": int(__import__('time').time() * 1000)
-                    }) + "\n"
-                    f.write(log_entry)
-            except Exception:
-                pass
-            # #endregion
+            trace(request, "Authentication successful", user_id=getattr(user, 'id', None), user_type=type(user).__name__)
             return (user, validated_token)
         except Exception as e:
-            # #region agent log
-            try:
-                with open('/Users/hajrezvan/Desktop/Projects/Kebrit/api/.cursor/debug.log', 'a') as f:
-                    log_entry = json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "C",
-                        "location": "authentication.py:85",
-                        "message": "Authentication failed",
-                        "data": {
-                            "error": str(e),
-                            "error_type": type(e).__name__
-                        },
-                        "timestamp": int(__import__('time').time() * 1000)
-                    }) + "\n"
-                    f.write(log_entry)
-            except Exception:
-                pass
-            # #endregion
+            trace(request, "Authentication failed", error=str(e), error_type=type(e).__name__)
             return None
     
     def get_user(self, validated_token):
         """
-        Attempts to find and return a user using the given validated token.
+        Returns a user built from the token claims, without a query.
         Adds custom claims to user object for easy access in permissions.
+        Fields that are not claims are loaded on first access (ClaimsUser).
         """
-        try:
-            user_id = validated_token['user_id']
-        except KeyError:
+        if 'user_id' not in validated_token:
             raise InvalidToken('Token contained no recognizable user identification')
         
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            raise InvalidToken('User not found')
-        
-        # Note: is_active is a property that always returns True
-        # since the column doesn't exist in the database
-        if not getattr(user, 'is_active', True):
-            raise InvalidToken('User is inactive')
+        user = ClaimsUser.from_claims(validated_token)
         
         # Add custom claims to user object for easy access in permissions
         user.roles = validated_token.get('roles', [])
         user.is_admin = validated_token.get('is_admin', False)
         user.permissions = validated_token.get('permissions', [])
-        user.company_id = validated_token.get('company_id')
         
         return user
-
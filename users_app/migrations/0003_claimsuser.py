@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0002_alter_company_table_alter_role_table_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimsUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('users_app.user',),
+        ),
+    ]
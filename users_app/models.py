@@ -1,5 +1,5 @@
 from pickle import FALSE
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models, router
 from django.contrib.auth.models import BaseUserManager
 from django.conf import settings
 from django.utils.crypto import salted_hmac
@@ -97,16 +97,27 @@ class User(models.Model):
         """Always return True since is_active column doesn't exist in DB"""
         return True
     
+    def role_titles(self):
+        """
+        Titles of the user's roles: JWT claims (set by CustomJWTAuthentication),
+        prefetched user_roles or one joined query. Memoized on the instance.
+        """
+        if not hasattr(self, '_role_titles'):
+            claims = getattr(self, 'roles', None)
+            if claims is not None:
+                titles = list(claims)
+            elif hasattr(self, '_prefetched_objects_cache') and 'user_roles' in self._prefetched_objects_cache:
+                titles = [ur.role.title for ur in self._prefetched_objects_cache['user_roles']]
+            else:
+                titles = list(self.user_roles.values_list('role__title', flat=True))
+            self._role_titles = tuple(titles)
+        return self._role_titles
+
     @property
     def is_staff(self):
         """Check if user has admin role (required for Django admin access)"""
         try:
-            # Check if user_roles is already prefetched or cached
-            if hasattr(self, '_prefetched_objects_cache') and 'user_roles' in self._prefetched_objects_cache:
-                user_roles = self._prefetched_objects_cache['user_roles']
-            else:
-                user_roles = self.user_roles.select_related('role').all()
-            return any(ur.role.title.lower() == 'admin' for ur in user_roles)
+            return any(title.lower() == 'admin' for title in self.role_titles())
         except (AttributeError, Exception):
             return False
     
@@ -179,6 +190,41 @@ class User(models.Model):
         return self.name
 
 
+class ClaimsUser(User):
+    """
+    User built from JWT claims by CustomJWTAuthentication, without a query.
+
+    Only id and the claim fields are loaded; the other fields are deferred.
+    Reading any of them loads all of them at once from users_app.user_cache
+    (a short-TTL cache of user rows) instead of one query per field.
+    """
+
+    CLAIM_FIELDS = ('company_id', 'name', 'mobile')
+
+    class Meta:
+        proxy = True
+        app_label = 'users_app'
+
+    @classmethod
+    def from_claims(cls, token):
+        claims = {'id': token['user_id']}
+        claims.update((field, token[field]) for field in cls.CLAIM_FIELDS if field in token)
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        return cls.from_db(router.db_for_read(cls) or DEFAULT_DB_ALIAS, field_names, [claims[f] for f in field_names])
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is None or from_queryset is not None or not deferred.issuperset(fields):
+            return super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+        from .user_cache import get_user_row
+        row = get_user_row(self.pk)
+        if row is None:
+            raise User.DoesNotExist(f"User {self.pk} not found")
+        for attname in deferred:
+            setattr(self, attname, row[attname])
+
+
 class Session(models.Model):
     uuid = models.UUIDField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='userid', related_name='sessions')
@@ -0,0 +1,31 @@
+import csv
+import io
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class StudentCSVParser(BaseParser):
+    """
+    text/csv body of UserViewSet.bulk_create_students: a header row with
+    name, uuid and mobile columns, one student per line.
+    Parsed as {"students": [{"name", "uuid", "mobile"}, ...]}.
+    """
+
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            text = stream.read().decode('utf-8-sig')
+        except UnicodeDecodeError as exc:
+            raise ParseError(f'CSV parse error - {exc}')
+
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {'name', 'uuid', 'mobile'} <= {f.strip() for f in reader.fieldnames}:
+            raise ParseError('CSV باید ستون‌های name، uuid و mobile را داشته باشد')
+
+        students = []
+        for record in reader:
+            record = {key.strip(): (value or '').strip() for key, value in record.items() if key is not None}
+            students.append({'name': record['name'], 'uuid': record['uuid'], 'mobile': record['mobile']})
+        return {'students': students}
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .principal import get_principal
+
 
 class CompanyPermission(permissions.BasePermission):
     """
@@ -20,28 +22,27 @@ class CompanyPermission(permissions.BasePermission):
         return True
     
     def has_object_permission(self, request, view, obj):
+        principal = get_principal(request)
+
         # Handle ClientToken authentication (ClientPrincipal)
-        if hasattr(request, 'auth_company') and request.auth_company:
+        if principal.is_client:
             # For client token auth, check if object belongs to the client's company
             if hasattr(obj, 'company'):
-                return obj.company_id == request.auth_company.id
+                return obj.company_id == principal.company_id
             elif hasattr(obj, 'companyId'):
-                return obj.companyId == request.auth_company.id
+                return obj.companyId == principal.company_id
             elif hasattr(obj, 'user'):
                 # For user-related objects, check if user belongs to client's company
-                return obj.user.company_id == request.auth_company.id
+                return obj.user.company_id == principal.company_id
             return False
         
         # Handle JWT authentication (User objects)
-        # Check if user has admin role
-        if hasattr(request.user, 'user_roles'):
-            user_roles = request.user.user_roles.all()
-            for user_role in user_roles:
-                if user_role.role.title.lower() == 'admin':
-                    return True
+        # Admin role has access to everything
+        if principal.is_admin:
+            return True
         
         # For non-admin users, check companyId match
-        user_company_id = getattr(request.user, 'company_id', None)
+        user_company_id = principal.company_id
         if not user_company_id:
             return False
         
@@ -53,7 +54,7 @@ class CompanyPermission(permissions.BasePermission):
             # For user-related objects, check if it's the same user or same company
             if obj.user.company_id == user_company_id:
                 return True
-            return obj.user_id == request.user.id
+            return obj.user_id == principal.user_id
         
         return False
 
@@ -71,20 +72,13 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        # Check if user has admin role
-        if hasattr(request.user, 'user_roles'):
-            user_roles = request.user.user_roles.all()
-            for user_role in user_roles:
-                if user_role.role.title.lower() == 'admin':
-                    return True
-        
-        return False
+        return get_principal(request).is_admin
 
 
 def HasPermission(required_permission):
     """
     Permission class factory that checks if user has a specific permission.
-    Permissions are read from JWT token claims to avoid database queries.
+    Permissions are read from the request principal (JWT claims when present).
     
     Usage:
         permission_classes = [HasPermission('admin.write')]
@@ -95,25 +89,8 @@ def HasPermission(required_permission):
             if not request.user or not request.user.is_authenticated:
                 return False
             
-            # Try to get permissions from JWT token first (faster, no DB query)
-            if hasattr(request, 'auth') and request.auth:
-                token_permissions = request.auth.get('permissions', [])
-                if required_permission in token_permissions:
-                    return True
-            
-            # Fallback: Check permissions from user roles (database query)
-            if hasattr(request.user, 'user_roles'):
-                user_roles = request.user.user_roles.select_related('role').all()
-                for user_role in user_roles:
-                    role_title = user_role.role.title.lower()
-                    if role_title == 'admin':
-                        # Admin has all permissions
-                        admin_permissions = ['admin.read', 'admin.write', 'admin.delete']
-                        if required_permission in admin_permissions:
-                            return True
-                    # Add more role-based permission checks as needed
-            
-            return False
+            # Permissions come from JWT claims or the user's roles (admin has all admin.* permissions)
+            return get_principal(request).has_permission(required_permission)
     
     return PermissionChecker
 
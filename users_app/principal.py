@@ -0,0 +1,98 @@
+"""
+Request-scoped principal: who is calling, resolved once per request.
+
+Permission classes and views read is_admin, company_id and the permission
+set from `get_principal(request)` instead of walking user.user_roles (one
+query per check, plus one per role). The principal is built from:
+- the client token (request.auth_company): company scope, no roles;
+- JWT claims (company_id, roles, is_admin, permissions) when present;
+- otherwise the user's role titles, read with one joined query;
+and memoized on the request.
+"""
+from dataclasses import dataclass
+
+
+ADMIN_ROLE = "admin"
+
+# Permissions granted by a role title (lower case); also issued as JWT claims
+ROLE_PERMISSIONS = {
+    ADMIN_ROLE: ("admin.read", "admin.write", "admin.delete"),
+}
+
+
+def permissions_for_roles(roles):
+    permissions = set()
+    for title in roles:
+        permissions.update(ROLE_PERMISSIONS.get(title.lower(), ()))
+    return permissions
+
+
+def is_admin_role(roles):
+    return any(title.lower() == ADMIN_ROLE for title in roles)
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int = None
+    company_id: int = None
+    is_admin: bool = False
+    is_client: bool = False
+    roles: tuple = ()
+    permissions: frozenset = frozenset()
+
+    @property
+    def is_authenticated(self):
+        return self.is_client or self.user_id is not None
+
+    def has_permission(self, permission):
+        return permission in self.permissions
+
+
+ANONYMOUS = Principal()
+
+
+def _from_claims(user, token):
+    roles = tuple(token.get("roles") or ())
+    return Principal(
+        user_id=getattr(user, "id", None),
+        company_id=token.get("company_id", getattr(user, "company_id", None)),
+        is_admin=bool(token.get("is_admin")) or is_admin_role(roles),
+        roles=roles,
+        permissions=frozenset(token.get("permissions") or ()) | permissions_for_roles(roles),
+    )
+
+
+def _load(request):
+    # request.user runs DRF authentication, which sets auth_company
+    user = request.user
+    if not user or not getattr(user, "is_authenticated", False):
+        return ANONYMOUS
+
+    company = getattr(request, "auth_company", None)
+    if company:
+        return Principal(company_id=company.id, is_client=True)
+
+    token = getattr(request, "auth", None)
+    if token is not None and hasattr(token, "get") and token.get("roles") is not None:
+        return _from_claims(user, token)
+
+    role_titles = getattr(user, "role_titles", None)
+    roles = tuple(role_titles()) if role_titles else ()
+    return Principal(
+        user_id=getattr(user, "id", None),
+        company_id=getattr(user, "company_id", None),
+        is_admin=is_admin_role(roles),
+        roles=roles,
+        permissions=frozenset(permissions_for_roles(roles)),
+    )
+
+
+def get_principal(request):
+    """Principal of request, built on first use and memoized on it."""
+    try:
+        return request._principal
+    except AttributeError:
+        pass
+    principal = _load(request)
+    request._principal = principal
+    return principal
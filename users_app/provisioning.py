@@ -0,0 +1,129 @@
+"""
+Bulk student provisioning (UserViewSet.bulk_create_students).
+
+A batch is checked with set-based queries instead of per-student lookups:
+uuids already used in the company (idx_user_company_uuid_unique), mobiles
+already registered (idx_user_mobile, as UserCreateSerializer.validate_mobile)
+and duplicates inside the batch. Accepted students are written in chunks of
+USER_BULK_BATCH_SIZE, each in its own transaction: the users with one
+multi-row INSERT ... RETURNING id and their API tokens with one more INSERT.
+If a student of the chunk was created concurrently by another request, the
+INSERT fails on idx_user_company_uuid_unique and the chunk is inserted row
+by row instead, each row in its own savepoint: the conflicting students are
+left untouched and reported as uuid_exists. Results are yielded chunk by
+chunk as they are committed, so the issued tokens can be streamed to the
+client.
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from . import user_cache
+from .models import Token, User
+
+
+def _batch_size():
+    return getattr(settings, "USER_BULK_BATCH_SIZE", 1000)
+
+
+def check_students(company_id, students):
+    """
+    Split students (dicts with name, uuid, mobile) into (accepted, rejected).
+    Items of both are (row, student, error); error is None for accepted rows.
+    """
+    taken_uuids = set(
+        User.objects.filter(company_id=company_id, uuid__in={s["uuid"] for s in students}).values_list(
+            "uuid", flat=True
+        )
+    )
+    taken_mobiles = set(
+        User.objects.filter(mobile__in={s["mobile"] for s in students}).values_list("mobile", flat=True)
+    )
+
+    accepted = []
+    rejected = []
+    seen_uuids = set()
+    seen_mobiles = set()
+    for row, student in enumerate(students):
+        if student["uuid"] in taken_uuids:
+            error = "uuid_exists"
+        elif student["mobile"] in taken_mobiles:
+            error = "mobile_exists"
+        elif student["uuid"] in seen_uuids:
+            error = "duplicate_uuid"
+        elif student["mobile"] in seen_mobiles:
+            error = "duplicate_mobile"
+        else:
+            error = None
+        seen_uuids.add(student["uuid"])
+        seen_mobiles.add(student["mobile"])
+        (rejected if error else accepted).append((row, student, error))
+    return accepted, rejected
+
+
+def _insert_users(company_id, chunk):
+    """
+    Insert the chunk's students; returns (created, conflicts) where created
+    holds (row, student, user) with the ids returned by the INSERT.
+    """
+    def new_user(student):
+        return User(company_id=company_id, uuid=student["uuid"], mobile=student["mobile"], name=student["name"])
+
+    users = [new_user(student) for _, student, _ in chunk]
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=len(users))
+        return [(row, student, user) for (row, student, _), user in zip(chunk, users)], []
+    except IntegrityError:
+        pass
+
+    # Some students were created concurrently since check_students
+    created = []
+    conflicts = []
+    for row, student, _ in chunk:
+        user = new_user(student)
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            conflicts.append((row, student))
+        else:
+            created.append((row, student, user))
+    return created, conflicts
+
+
+def _provision_chunk(company_id, chunk):
+    with transaction.atomic():
+        created, conflicts = _insert_users(company_id, chunk)
+        tokens = [Token(uuid=uuid.uuid4(), user_id=user.id) for _, _, user in created]
+        if tokens:
+            Token.objects.bulk_create(tokens, batch_size=len(tokens))
+    user_cache.invalidate_many([user.id for _, _, user in created])
+
+    for row, student in conflicts:
+        yield {"row": row, "uuid": student["uuid"], "mobile": student["mobile"], "error": "uuid_exists"}
+    for (row, student, user), token in zip(created, tokens):
+        yield {
+            "row": row,
+            "uuid": student["uuid"],
+            "mobile": student["mobile"],
+            "user_id": user.id,
+            "token": str(token.uuid),
+        }
+
+
+def iter_provisioned(company_id, accepted, rejected):
+    """Yield rejected rows ({"row", "uuid", "mobile", "error"}), then created students with their token."""
+    for row, student, error in rejected:
+        yield {"row": row, "uuid": student["uuid"], "mobile": student["mobile"], "error": error}
+
+    size = _batch_size()
+    for start in range(0, len(accepted), size):
+        yield from _provision_chunk(company_id, accepted[start:start + size])
+
+
+def ndjson_stream(results):
+    for result in results:
+        yield json.dumps(result, ensure_ascii=False) + "\n"
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import Company, User, Session, Token, Role, UserRole
+from .principal import is_admin_role, permissions_for_roles
 
 
 class CompanySerializer(serializers.ModelSerializer):
@@ -35,6 +36,22 @@ class UserCreateSerializer(serializers.Serializer):
         return value
 
 
+class StudentProvisionSerializer(serializers.Serializer):
+    """One student of a bulk provisioning request (company comes from the client token)."""
+    name = serializers.CharField(max_length=100, required=True)
+    uuid = serializers.CharField(max_length=255, required=True)
+    mobile = serializers.CharField(max_length=20, required=True)
+
+
+class BulkStudentProvisionSerializer(serializers.Serializer):
+    students = serializers.ListField(
+        child=StudentProvisionSerializer(),
+        allow_empty=False,
+        max_length=10000,
+        help_text="دانشجویان (name، uuid، mobile)",
+    )
+
+
 class UserLoginSerializer(serializers.Serializer):
     """Serializer for token-based login (passwordless)."""
     mobile = serializers.CharField(max_length=20, required=True)
@@ -110,18 +127,14 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         refresh['mobile'] = user.mobile
         
         # Add role information
-        user_roles = user.user_roles.select_related('role').all()
-        roles = [ur.role.title for ur in user_roles]
+        roles = list(user.role_titles())
         refresh['role'] = roles[0] if roles else None
         refresh['roles'] = roles
-        refresh['is_admin'] = 'admin' in [r.lower() for r in roles]
+        refresh['is_admin'] = is_admin_role(roles)
         
         # Add permissions (using role-based permissions for now)
         # Since we don't use Django Groups/Permissions, we'll use role-based permissions
-        permissions = []
-        if refresh['is_admin']:
-            permissions.extend(['admin.read', 'admin.write', 'admin.delete'])
-        refresh['permissions'] = list(set(permissions))  # Remove duplicates
+        refresh['permissions'] = sorted(permissions_for_roles(roles))
         
         data = {}
         data['refresh'] = str(refresh)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ClaimsUser, User
+from .user_cache import invalidate
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+@receiver(post_delete, sender=ClaimsUser)
+def invalidate_user_row(sender, instance, **kwargs):
+    """Cached rows back request.user of JWT requests."""
+    invalidate(instance.pk)
@@ -1,3 +1,164 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users_app.authentication import CustomJWTAuthentication
+from users_app.models import Company, Role, Token, User, UserRole
+from users_app import provisioning, user_cache
+from users_app.principal import get_principal
+from exam_app.models import Quiz
+from kebrit_api.models import ClientApiToken
+
+
+class PrincipalTests(APITestCase):
+    """
+    نقش‌ها و دسترسی‌های کاربر یک بار برای هر درخواست بارگذاری می‌شوند.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Principal Company")
+        self.admin = User.objects.create(
+            uuid="principal-uuid",
+            username="principal-admin",
+            company=self.company,
+            mobile="09124444444",
+            name="Principal Admin",
+        )
+        UserRole.objects.create(user=self.admin, role=Role.objects.create(title="Admin", company=self.company))
+        UserRole.objects.create(user=self.admin, role=Role.objects.create(title="Teacher", company=self.company))
+
+    def test_roles_are_loaded_once_per_request(self):
+        request = APIRequestFactory().get("/api/users/")
+        request.user = User.objects.get(id=self.admin.id)
+
+        with self.assertNumQueries(1):
+            principal = get_principal(request)
+            self.assertIs(get_principal(request), principal)
+
+        self.assertTrue(principal.is_admin)
+        self.assertEqual(principal.company_id, self.company.id)
+        self.assertTrue(principal.has_permission("admin.write"))
+
+    def test_jwt_claims_need_no_query(self):
+        request = APIRequestFactory().get("/api/users/")
+        request.user = self.admin
+        request.auth = {"company_id": self.company.id, "roles": ["Teacher"], "is_admin": False, "permissions": []}
+
+        with self.assertNumQueries(0):
+            principal = get_principal(request)
+
+        self.assertFalse(principal.is_admin)
+        self.assertFalse(principal.has_permission("admin.read"))
+
+
+class ClaimsUserTests(APITestCase):
+    """
+    کاربر JWT از claim های توکن ساخته می‌شود و ردیف کاربر فقط در صورت نیاز (از کش) خوانده می‌شود.
+    """
+
+    def setUp(self):
+        self.company = Company.objects.create(name="Claims Company")
+        self.user = User.objects.create(
+            uuid="claims-uuid",
+            username="claims-user",
+            company=self.company,
+            mobile="09126666666",
+            name="Claims User",
+        )
+        user_cache.invalidate(self.user.id)
+        self.token = AccessToken.for_user(self.user)
+        self.token["company_id"] = self.company.id
+        self.token["name"] = self.user.name
+        self.token["mobile"] = self.user.mobile
+        self.token["roles"] = []
+        self.token["is_admin"] = False
+        self.token["permissions"] = []
+
+    def test_claims_need_no_user_query(self):
+        with self.assertNumQueries(0):
+            user = CustomJWTAuthentication().get_user(self.token)
+            self.assertEqual((user.id, user.company_id, user.name), (self.user.id, self.company.id, "Claims User"))
+            self.assertFalse(user.is_staff)
+
+        # فیلدهای غیر claim با یک query بارگذاری و سپس از کش خوانده می‌شوند
+        with self.assertNumQueries(1):
+            self.assertEqual((user.username, user.uuid), ("claims-user", "claims-uuid"))
+        with self.assertNumQueries(0):
+            self.assertEqual(CustomJWTAuthentication().get_user(self.token).username, "claims-user")
+
+        self.assertEqual(Quiz.objects.filter(user=user).count(), 0)
+
+    def test_saved_user_is_reloaded(self):
+        CustomJWTAuthentication().get_user(self.token).username
+        self.user.username = "renamed-user"
+        self.user.save()
+
+        self.assertEqual(CustomJWTAuthentication().get_user(self.token).username, "renamed-user")
+
+
+class BulkStudentProvisionTests(APITestCase):
+    """
+    تست‌های endpoint:
+    POST /api/users/bulk-create/
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.company = Company.objects.create(name="Provision Company")
+        self.client_token = ClientApiToken.objects.create(company=self.company, name="Provision Token")
+        self.auth_headers = {"HTTP_X_CLIENT_TOKEN": str(self.client_token.uuid)}
+        self.url = "/api/users/bulk-create/"
+        User.objects.create(uuid="existing", company=self.company, mobile="09127000000", name="Existing")
+
+    def _results(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_students_are_created_with_tokens_and_conflicts_reported(self):
+        students = [{"name": f"Student {i}", "uuid": f"s-{i}", "mobile": f"0912710{i:04d}"} for i in range(50)]
+        students += [
+            {"name": "Existing", "uuid": "existing", "mobile": "09127999999"},
+            {"name": "Duplicate", "uuid": "s-0", "mobile": "09127888888"},
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            results = self._results(
+                self.client.post(self.url, {"students": students}, format="json", **self.auth_headers)
+            )
+        # اعتبارسنجی و درج با تعداد ثابتی query (مستقل از تعداد دانشجویان)
+        self.assertLessEqual(len(ctx.captured_queries), 10)
+
+        errors = {r["row"]: r["error"] for r in results if "error" in r}
+        self.assertEqual(errors, {50: "uuid_exists", 51: "duplicate_uuid"})
+        created = [r for r in results if "token" in r]
+        self.assertEqual(len(created), 50)
+        self.assertEqual(
+            Token.objects.filter(uuid__in=[r["token"] for r in created], user__company=self.company).count(), 50
+        )
+
+    def test_student_created_concurrently_is_reported_not_overwritten(self):
+        # دانشجویی که پس از اعتبارسنجی توسط درخواست دیگری ساخته شده است
+        chunk = [
+            (0, {"name": "Other", "uuid": "existing", "mobile": "09127222222"}, None),
+            (1, {"name": "New", "uuid": "new-1", "mobile": "09127333333"}, None),
+        ]
+
+        results = list(provisioning._provision_chunk(self.company.id, chunk))
+
+        self.assertEqual(results[0], {"row": 0, "uuid": "existing", "mobile": "09127222222", "error": "uuid_exists"})
+        self.assertEqual(results[1]["user_id"], User.objects.get(company=self.company, uuid="new-1").id)
+        existing = User.objects.get(company=self.company, uuid="existing")
+        self.assertEqual((existing.name, existing.mobile), ("Existing", "09127000000"))
+        self.assertFalse(Token.objects.filter(user=existing).exists())
+
+    def test_csv_body(self):
+        body = "name,uuid,mobile\nCSV Student,csv-1,09127111111\n"
+        response = self.client.post(self.url, data=body, content_type="text/csv", **self.auth_headers)
+
+        results = self._results(response)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(User.objects.filter(company=self.company, uuid="csv-1", id=results[0]["user_id"]).exists())
@@ -0,0 +1,40 @@
+"""
+Short-TTL cache of user rows for JWT-authenticated requests.
+
+CustomJWTAuthentication builds request.user from the token claims
+(models.ClaimsUser), so most requests never read the user row. When a
+non-claim field is needed the row's field values are taken from the Django
+cache, where they stay for USER_CACHE_TTL seconds. Saving or deleting a
+User drops its entry (signals.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import User
+
+
+USER_KEY = "user_row:{id}"
+
+
+def _ttl():
+    return getattr(settings, "USER_CACHE_TTL", 60)
+
+
+def get_user_row(user_id):
+    """{attname: value} of a user's concrete fields, or None if the user does not exist."""
+    key = USER_KEY.format(id=user_id)
+    row = cache.get(key)
+    if row is None:
+        row = User.objects.filter(id=user_id).values(*[f.attname for f in User._meta.concrete_fields]).first()
+        if row is None:
+            return None
+        cache.set(key, row, _ttl())
+    return row
+
+
+def invalidate(user_id):
+    cache.delete(USER_KEY.format(id=user_id))
+
+
+def invalidate_many(user_ids):
+    cache.delete_many([USER_KEY.format(id=user_id) for user_id in user_ids])
@@ -1,7 +1,9 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
+from django.http import StreamingHttpResponse
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
 import uuid
@@ -9,9 +11,13 @@ from .models import Company, User, Session, Token, Role, UserRole
 from .serializers import (
     CompanySerializer, UserSerializer, SessionSerializer,
     TokenSerializer, RoleSerializer, UserRoleSerializer,
-    UserCreateSerializer, UserLoginSerializer
+    UserCreateSerializer, UserLoginSerializer, BulkStudentProvisionSerializer
 )
+from .parsers import StudentCSVParser
 from .permissions import CompanyPermission, IsAdminOrReadOnly
+from .principal import get_principal, is_admin_role, permissions_for_roles
+from .provisioning import check_students, iter_provisioned, ndjson_stream
+from kebrit_api.permissions import IsClientTokenAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
@@ -41,11 +47,9 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         # Filter by companyId for non-admin users
-        if hasattr(self.request.user, 'company_id'):
-            user_roles = self.request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                queryset = queryset.filter(company_id=self.request.user.company_id)
+        principal = get_principal(self.request)
+        if principal.is_authenticated and not principal.is_admin:
+            queryset = queryset.filter(company_id=principal.company_id)
         return queryset
     
     @action(detail=False, methods=['post'], url_path='create', permission_classes=[AllowAny])
@@ -116,6 +120,38 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk-create',
+        permission_classes=[IsClientTokenAuthenticated],
+        parser_classes=[JSONParser, StudentCSVParser],
+    )
+    @method_decorator(ratelimit(key='ip', rate='20/h', method='POST'))
+    def bulk_create_students(self, request):
+        """
+        ایجاد دسته‌ای دانشجویان شرکت توکن مشتری و صدور توکن برای هر کدام
+        
+        Body (application/json):
+        {"students": [{"name": "...", "uuid": "...", "mobile": "..."}, ...]}
+        یا text/csv با ستون‌های name,uuid,mobile
+        
+        پاسخ به صورت stream (application/x-ndjson) است؛ هر خط یک دانشجو:
+        ردیف‌های رد شده با error و سپس دانشجویان ایجاد شده همراه با token.
+        """
+        serializer = BulkStudentProvisionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        company_id = request.auth_company.id
+        # بررسی تکراری بودن uuid و mobile با query های مجموعه‌ای (نه یک query برای هر دانشجو)
+        accepted, rejected = check_students(company_id, serializer.validated_data['students'])
+        results = iter_provisioned(company_id, accepted, rejected)
+        return StreamingHttpResponse(ndjson_stream(results), content_type='application/x-ndjson; charset=utf-8')
+    
     @action(detail=False, methods=['get'], url_path='company/(?P<company_id>[^/.]+)')
     @method_decorator(ratelimit(key='ip', rate='100/h', method='GET'))
     def list_by_company(self, request, company_id=None):
@@ -134,10 +170,9 @@ class UserViewSet(viewsets.ModelViewSet):
             )
         
         # بررسی دسترسی
-        if hasattr(request.user, 'company_id'):
-            user_roles = request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin and request.user.company_id != int(company_id):
+        principal = get_principal(request)
+        if principal.is_authenticated:
+            if not principal.is_admin and principal.company_id != int(company_id):
                 return Response(
                     {'error': 'دسترسی به این سازمان ندارید'},
                     status=status.HTTP_403_FORBIDDEN
@@ -224,19 +259,13 @@ def login(request):
     refresh['mobile'] = user.mobile
     
     # Add role and permissions to token
-    user_roles = user.user_roles.select_related('role').all()
-    roles = [ur.role.title for ur in user_roles]
+    roles = list(user.role_titles())
     refresh['role'] = roles[0] if roles else None
     refresh['roles'] = roles
-    refresh['is_admin'] = 'admin' in [r.lower() for r in roles]
+    refresh['is_admin'] = is_admin_role(roles)
     
     # Add permissions based on roles
-    permissions = []
-    for user_role in user_roles:
-        role_title = user_role.role.title.lower()
-        if role_title == 'admin':
-            permissions.extend(['admin.read', 'admin.write', 'admin.delete'])
-    refresh['permissions'] = list(set(permissions))
+    refresh['permissions'] = sorted(permissions_for_roles(roles))
     
     response = Response({
         'access': str(refresh.access_token),
@@ -289,11 +318,9 @@ class SessionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request.user, 'company_id'):
-            user_roles = self.request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                queryset = queryset.filter(user__company_id=self.request.user.company_id)
+        principal = get_principal(self.request)
+        if principal.is_authenticated and not principal.is_admin:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         return queryset
 
 
@@ -310,11 +337,9 @@ class TokenViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request.user, 'company_id'):
-            user_roles = self.request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                queryset = queryset.filter(user__company_id=self.request.user.company_id)
+        principal = get_principal(self.request)
+        if principal.is_authenticated and not principal.is_admin:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         return queryset
 
 
@@ -331,11 +356,9 @@ class RoleViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request.user, 'company_id'):
-            user_roles = self.request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                queryset = queryset.filter(company_id=self.request.user.company_id)
+        principal = get_principal(self.request)
+        if principal.is_authenticated and not principal.is_admin:
+            queryset = queryset.filter(company_id=principal.company_id)
         return queryset
 
 
@@ -352,9 +375,7 @@ class UserRoleViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        if hasattr(self.request.user, 'company_id'):
-            user_roles = self.request.user.user_roles.all()
-            is_admin = any(ur.role.title.lower() == 'admin' for ur in user_roles)
-            if not is_admin:
-                queryset = queryset.filter(user__company_id=self.request.user.company_id)
+        principal = get_principal(self.request)
+        if principal.is_authenticated and not principal.is_admin:
+            queryset = queryset.filter(user__company_id=principal.company_id)
         return queryset